@@ -1,19 +1,41 @@
 #!/usr/bin/env python3
+import time
+
+STARTED_AT = time.perf_counter()
+
 import os
 import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import Optional
+import html
 import re
 
 from aiogram import Bot, Dispatcher, F, Router
-from aiogram.filters import Command, StateFilter
+from aiogram.dispatcher.middlewares.error import ErrorsMiddleware
+from aiogram.filters import Command, CommandObject, ExceptionTypeFilter, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from aiogram.types import Message, CallbackQuery, ErrorEvent, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, BufferedInputFile
 from dotenv import load_dotenv
-from supabase import create_client, Client
+
+from clients import LazyClient
+from dashboard import LiveDashboard
+from fsmstore import ExpiringMemoryStorage
+from export import EXPORT_FORMATS, EXPORT_TABLES, export_table, iter_pages
+from idempotency import IdempotencyMiddleware
+from scheduler import LaneScheduler, SchedulerMiddleware
+from notify import RateLimiter, send_all
+from profiler import LoopLagMonitor, SamplingProfiler
+from proofs import ProofPipeline
+from recorder import UpdateRecorder
+from reconcile import reconcile_file
+from readmodel import ACTIVE_STATUSES, TX_TRANSITIONS, TransactionCache, TransactionMirror
+from singleflight import SingleFlight
+import templates
+from templates import Markup, render_list, static_keyboard
+from tracing import TelegramTracingMiddleware, Tracer, TracingMiddleware
+from transport import DatabaseUnavailableError, DbTransport, PooledAiohttpSession, install_postgrest_pool
 
 load_dotenv()
 
@@ -26,15 +48,94 @@ SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
-bot = Bot(token=TOKEN)
-storage = MemoryStorage()
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "8"))
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "100"))
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", "30"))
+SLOW_UPDATE_MS = float(os.getenv("SLOW_UPDATE_MS", "2000"))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+SLOW_LOG_PATH = os.getenv("SLOW_LOG_PATH", "logs/slow_updates.jsonl")
+EXPORT_PROGRESS_EVERY = 10000
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "32"))
+MAX_PENDING_UPDATES = int(os.getenv("MAX_PENDING_UPDATES", "1000"))
+MAX_LANE_PENDING = int(os.getenv("MAX_LANE_PENDING", "20"))
+ADMIN_CACHE_TTL = 300
+DASHBOARD_INTERVAL = float(os.getenv("DASHBOARD_INTERVAL", "5"))
+DASHBOARD_MAX_ITEMS = 8
+TX_MIRROR_RETENTION_DAYS = int(os.getenv("TX_MIRROR_RETENTION_DAYS", "7")) or None
+TX_MIRROR_SYNC_INTERVAL = float(os.getenv("TX_MIRROR_SYNC_INTERVAL", "15"))
+TX_CACHE_SIZE = int(os.getenv("TX_CACHE_SIZE", "2000"))
+PAYMENT_METHODS_CACHE_TTL = 60
+BULK_PAGE_SIZE = 20
+BULK_CHUNK_SIZE = 100
+NOTIFY_RATE = float(os.getenv("NOTIFY_RATE", "25"))
+EXPIRY_TTL_HOURS = {
+    "pending": float(os.getenv("EXPIRE_PENDING_HOURS", "48")),
+    "approved": float(os.getenv("EXPIRE_APPROVED_HOURS", "24")),
+}
+EXPIRY_SWEEP_INTERVAL = float(os.getenv("EXPIRY_SWEEP_INTERVAL", "300"))
+EXPIRY_BATCH_SIZE = 200
+PERF_DEFAULT_SECONDS = 30
+PERF_MAX_SECONDS = 300
+PERF_TOP_N = 15
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "250"))
+RECORD_UPDATES_PATH = os.getenv("RECORD_UPDATES_PATH")
+IDEMPOTENCY_STATE_PATH = os.getenv("IDEMPOTENCY_STATE_PATH", "logs/last_update_id.json")
+RECORD_SALT = os.getenv("RECORD_SALT")
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+RECONCILE_WINDOW_BEFORE_HOURS = float(os.getenv("RECONCILE_WINDOW_BEFORE_HOURS", "24"))
+RECONCILE_WINDOW_AFTER_HOURS = float(os.getenv("RECONCILE_WINDOW_AFTER_HOURS", "1"))
+BANK_UTC_OFFSET_HOURS = float(os.getenv("BANK_UTC_OFFSET_HOURS", "7"))
+RECONCILE_LIST_MAX = 10
+FSM_DEFAULT_TIMEOUT_MINUTES = float(os.getenv("FSM_DEFAULT_TIMEOUT_MINUTES", "60"))
+FSM_FORMAT_TIMEOUT_MINUTES = float(os.getenv("FSM_FORMAT_TIMEOUT_MINUTES", "15"))
+FSM_PROOF_TIMEOUT_MINUTES = float(os.getenv("FSM_PROOF_TIMEOUT_MINUTES", "30"))
+FSM_MAX_ENTRIES = int(os.getenv("FSM_MAX_ENTRIES", "100000"))
+FSM_REAP_INTERVAL = 30
+FSM_EXPIRY_NOTICE = os.getenv("FSM_EXPIRY_NOTICE", "1") == "1"
+
+PROOFS_DIR = "proofs"
+os.makedirs(PROOFS_DIR, exist_ok=True)
+
+tracer = Tracer("rekber-bot", slow_ms=SLOW_UPDATE_MS, sample_rate=TRACE_SAMPLE_RATE, slow_log_path=SLOW_LOG_PATH)
+
+bot = Bot(token=TOKEN, session=PooledAiohttpSession(limit=TELEGRAM_POOL_SIZE, timeout=TELEGRAM_TIMEOUT))
+bot.session.middleware(TelegramTracingMiddleware(tracer))
+storage = ExpiringMemoryStorage(default_timeout=FSM_DEFAULT_TIMEOUT_MINUTES * 60, max_entries=FSM_MAX_ENTRIES)
 dp = Dispatcher(storage=storage)
 router = Router()
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+idempotency = IdempotencyMiddleware()
+update_scheduler: Optional[LaneScheduler] = None
 
-PROOFS_DIR = "proofs"
-os.makedirs(PROOFS_DIR, exist_ok=True)
+
+def create_supabase_client():
+    from supabase import create_client
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    install_postgrest_pool(client, db_transport)
+    return client
+
+
+db_transport = DbTransport(max_connections=SUPABASE_POOL_SIZE, deadline=SUPABASE_TIMEOUT)
+supabase = LazyClient(create_supabase_client)
+read_flight = SingleFlight()
+proof_pipeline = ProofPipeline()
+tx_mirror = TransactionMirror(retention_days=TX_MIRROR_RETENTION_DAYS)
+tx_cache = TransactionCache(max_size=TX_CACHE_SIZE)
+notify_limiter = RateLimiter(rate=NOTIFY_RATE, burst=int(NOTIFY_RATE))
+profiler = SamplingProfiler()
+loop_monitor = LoopLagMonitor(threshold=LOOP_LAG_THRESHOLD_MS / 1000)
+perf_task: Optional[asyncio.Task] = None
+admin_jobs = set()
+update_recorder = UpdateRecorder(
+    RECORD_UPDATES_PATH,
+    is_admin=lambda user_id: user_id in admin_cache["ids"],
+    salt=RECORD_SALT.encode() if RECORD_SALT else None,
+) if RECORD_UPDATES_PATH else None
+
+admin_cache = {"ids": set(), "loaded_at": None}
+tx_write_listeners = []
+payment_methods_cache = {"rows": None, "loaded_at": None}
 
 
 class TransactionStates(StatesGroup):
@@ -50,6 +151,13 @@ class AdminStates(StatesGroup):
     unban_user = State()
     add_admin = State()
     remove_admin = State()
+    reconcile = State()
+
+
+storage.timeouts.update({
+    TransactionStates.waiting_format.state: FSM_FORMAT_TIMEOUT_MINUTES * 60,
+    TransactionStates.waiting_payment_proof.state: FSM_PROOF_TIMEOUT_MINUTES * 60,
+})
 
 
 def gen_tx_code():
@@ -57,9 +165,9 @@ def gen_tx_code():
 
 
 async def get_or_create_user(user_id: int, username: str = None, full_name: str = None):
-    result = supabase.table("users").select("*").eq("id", user_id).maybe_single().execute()
+    result = await db_exec(supabase.table("users").select("*").eq("id", user_id).maybe_single(), idempotent=True)
     if result.data:
-        supabase.table("users").update({"last_active": datetime.utcnow().isoformat()}).eq("id", user_id).execute()
+        await db_exec(supabase.table("users").update({"last_active": datetime.utcnow().isoformat()}).eq("id", user_id))
         return result.data
 
     user_data = {
@@ -69,18 +177,169 @@ async def get_or_create_user(user_id: int, username: str = None, full_name: str
         "is_banned": False,
         "is_admin": user_id == ADMIN_ID
     }
-    result = supabase.table("users").insert(user_data).execute()
+    result = await db_exec(supabase.table("users").insert(user_data))
     return result.data[0] if result.data else None
 
 
 async def is_user_banned(user_id: int) -> bool:
-    result = supabase.table("users").select("is_banned").eq("id", user_id).maybe_single().execute()
+    result = await db_exec(supabase.table("users").select("is_banned").eq("id", user_id).maybe_single(), idempotent=True)
     return result.data.get("is_banned", False) if result.data else False
 
 
 async def is_user_admin(user_id: int) -> bool:
-    result = supabase.table("users").select("is_admin").eq("id", user_id).maybe_single().execute()
-    return result.data.get("is_admin", False) if result.data else False
+    loaded_at = admin_cache["loaded_at"]
+    if loaded_at is None or time.monotonic() - loaded_at > ADMIN_CACHE_TTL:
+        await refresh_admin_ids()
+    return user_id in admin_cache["ids"]
+
+
+async def refresh_admin_ids():
+    result = await db_read(("admin_ids",), supabase.table("users").select("id").eq("is_admin", True))
+    admin_cache["ids"] = {u["id"] for u in result.data or []} | {ADMIN_ID}
+    admin_cache["loaded_at"] = time.monotonic()
+
+
+async def db_exec(query, idempotent: bool = False):
+    with tracer.span(f"supabase {query.http_method} {query.path}"):
+        return await db_transport.run(query.execute, idempotent=idempotent)
+
+
+async def tx_write(query):
+    result = await db_exec(query)
+    remember_tx_rows(result.data)
+    return result
+
+
+def remember_tx_rows(rows):
+    """Record rows the database just returned for a write as the current state."""
+    tx_mirror.upsert_many(rows)
+    tx_cache.put_many(rows)
+    for listener in tx_write_listeners:
+        listener(rows)
+
+
+def apply_remote_tx_rows(rows):
+    """Fold transaction rows written by another shard into this process's caches."""
+    tx_mirror.upsert_many(rows)
+    tx_cache.put_many(rows)
+    proof_pipeline.load(rows)
+    admin_dashboard.mark_dirty()
+
+
+async def db_read(key, query):
+    return await read_flight.do(key, lambda: db_exec(query, idempotent=True))
+
+
+async def db_page(query):
+    """Run one page of a paginated scan; pages are never shared, so no singleflight."""
+    return await db_exec(query, idempotent=True)
+
+
+def cached_transaction(tx_code: str) -> Optional[dict]:
+    return tx_mirror.get(tx_code) or tx_cache.get(tx_code)
+
+
+async def fetch_transaction(tx_code: str) -> Optional[dict]:
+    tx = cached_transaction(tx_code)
+    if tx is not None:
+        return tx
+
+    result = await db_read(
+        ("transaction", tx_code),
+        supabase.table("transactions").select("*").eq("tx_code", tx_code).maybe_single()
+    )
+    if result and result.data:
+        tx_cache.put(result.data)
+    return result.data if result else None
+
+
+async def refresh_transaction(tx_code: str) -> Optional[dict]:
+    """Re-read a transaction from Supabase and replace the mirrored and cached copies."""
+    tx_cache.invalidate(tx_code)
+    result = await db_exec(
+        supabase.table("transactions").select("*").eq("tx_code", tx_code).maybe_single(),
+        idempotent=True
+    )
+    tx = result.data if result else None
+    if tx:
+        tx_mirror.upsert(tx)
+        tx_cache.put(tx)
+    return tx
+
+
+async def fetch_transaction_in(tx_code: str, statuses) -> Optional[dict]:
+    """Like fetch_transaction, but a local copy in another status is re-read once before it is believed.
+
+    The mirror and cache can lag a change made by another process, so only
+    the database gets to say a transaction has moved on.
+    """
+    tx = cached_transaction(tx_code)
+    if tx is None:
+        return await fetch_transaction(tx_code)
+    if tx["status"] in statuses:
+        return tx
+    return await refresh_transaction(tx_code)
+
+
+async def transition_transaction(tx_code: str, status: str, fields: dict = None):
+    """Move a transaction to `status`; return (updated row or None, row as last known).
+
+    A cached row in the wrong status is re-read once and refused only if
+    the database agrees. The UPDATE is guarded by the allowed statuses, so
+    a stale cache can't let an invalid transition through either; on a
+    miss the row is re-read to tell "not found" from "already moved on".
+    """
+    allowed = TX_TRANSITIONS[status]
+    known = cached_transaction(tx_code)
+    if known is not None and known["status"] not in allowed:
+        known = await refresh_transaction(tx_code)
+        if known is None or known["status"] not in allowed:
+            return None, known
+
+    result = await tx_write(supabase.table("transactions").update({
+        "status": status,
+        "updated_at": datetime.utcnow().isoformat(),
+        **(fields or {})
+    }).eq("tx_code", tx_code).in_("status", allowed))
+    if result.data:
+        return result.data[0], result.data[0]
+
+    return None, await refresh_transaction(tx_code)
+
+
+def transition_error(tx: Optional[dict]) -> str:
+    if tx is None:
+        return "❌ Transaksi tidak ditemukan"
+    return f"⚠️ Transaksi sudah berstatus {tx['status']}"
+
+
+async def fetch_active_transactions() -> list:
+    txs = tx_mirror.active()
+    if txs is None:
+        result = await db_exec(
+            supabase.table("transactions").select("*").in_("status", ACTIVE_STATUSES).order("created_at", desc=True),
+            idempotent=True
+        )
+        txs = result.data or []
+    return txs
+
+
+async def fetch_active_payment_methods() -> list:
+    loaded_at = payment_methods_cache["loaded_at"]
+    if loaded_at is not None and time.monotonic() - loaded_at < PAYMENT_METHODS_CACHE_TTL:
+        return payment_methods_cache["rows"]
+
+    result = await db_read(
+        ("payment_methods", "active"),
+        supabase.table("payment_methods").select("*").eq("is_active", True)
+    )
+    payment_methods_cache["rows"] = result.data or []
+    payment_methods_cache["loaded_at"] = time.monotonic()
+    return payment_methods_cache["rows"]
+
+
+def invalidate_payment_methods():
+    payment_methods_cache["loaded_at"] = None
 
 
 async def check_channel_membership(user_id: int) -> bool:
@@ -91,32 +350,51 @@ async def check_channel_membership(user_id: int) -> bool:
         return False
 
 
+# Keyboards without per-message data are built once and shared.
+MAIN_MENU_KEYBOARD = static_keyboard(
+    [InlineKeyboardButton(text="📝 Buat Transaksi Baru", callback_data="new_transaction")],
+    [InlineKeyboardButton(text="📊 Riwayat Transaksi", callback_data="my_transactions")],
+    [InlineKeyboardButton(text="💳 Lihat Metode Pembayaran", callback_data="view_payments")],
+    [InlineKeyboardButton(text="❓ Bantuan", callback_data="help")]
+)
+ADMIN_PANEL_KEYBOARD = static_keyboard(
+    [InlineKeyboardButton(text="📋 Transaksi Pending", callback_data="admin_pending")],
+    [InlineKeyboardButton(text="💳 Kelola Payment", callback_data="admin_payments")],
+    [InlineKeyboardButton(text="📢 Broadcast", callback_data="admin_broadcast")],
+    [InlineKeyboardButton(text="👥 Kelola User", callback_data="admin_users")],
+    [InlineKeyboardButton(text="📊 Statistik", callback_data="admin_stats")],
+    [InlineKeyboardButton(text="❌ Tutup", callback_data="close")]
+)
+BACK_TO_MENU_KEYBOARD = static_keyboard(
+    [InlineKeyboardButton(text="🏠 Menu Utama", callback_data="main_menu")]
+)
+BACK_TO_ADMIN_KEYBOARD = static_keyboard(
+    [InlineKeyboardButton(text="⬅️ Kembali", callback_data="admin_panel")]
+)
+CANCEL_KEYBOARD = static_keyboard(
+    [InlineKeyboardButton(text="❌ Batal", callback_data="main_menu")]
+)
+TX_STATUS_EMOJI = {
+    "pending": "⏳",
+    "approved": "✅",
+    "paid": "💰",
+    "delivered": "📦",
+    "completed": "🎉",
+    "rejected": "❌",
+    "cancelled": "🚫"
+}
+
+
 def main_menu_keyboard():
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📝 Buat Transaksi Baru", callback_data="new_transaction")],
-        [InlineKeyboardButton(text="📊 Riwayat Transaksi", callback_data="my_transactions")],
-        [InlineKeyboardButton(text="💳 Lihat Metode Pembayaran", callback_data="view_payments")],
-        [InlineKeyboardButton(text="❓ Bantuan", callback_data="help")]
-    ])
-    return keyboard
+    return MAIN_MENU_KEYBOARD
 
 
 def admin_panel_keyboard():
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📋 Transaksi Pending", callback_data="admin_pending")],
-        [InlineKeyboardButton(text="💳 Kelola Payment", callback_data="admin_payments")],
-        [InlineKeyboardButton(text="📢 Broadcast", callback_data="admin_broadcast")],
-        [InlineKeyboardButton(text="👥 Kelola User", callback_data="admin_users")],
-        [InlineKeyboardButton(text="📊 Statistik", callback_data="admin_stats")],
-        [InlineKeyboardButton(text="❌ Tutup", callback_data="close")]
-    ])
-    return keyboard
+    return ADMIN_PANEL_KEYBOARD
 
 
 def back_to_menu_keyboard():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🏠 Menu Utama", callback_data="main_menu")]
-    ])
+    return BACK_TO_MENU_KEYBOARD
 
 
 @router.message(Command("start"))
@@ -144,11 +422,7 @@ async def cmd_start(message: Message, state: FSMContext):
         )
         return
 
-    welcome_text = (
-        f"👋 Selamat datang <b>{user.full_name}</b>!\n\n"
-        f"🛡️ <b>Rekber Bot</b> - Sistem Rekening Bersama yang Aman\n\n"
-        f"Silakan pilih menu di bawah:"
-    )
+    welcome_text = templates.WELCOME.render(full_name=user.full_name)
 
     await message.answer(welcome_text, reply_markup=main_menu_keyboard(), parse_mode="HTML")
 
@@ -166,14 +440,190 @@ async def cmd_admin(message: Message):
     )
 
 
+def start_admin_job(coro) -> asyncio.Task:
+    """Run a long admin job outside the update scheduler.
+
+    Updates from one admin share a lane, so a broadcast or export handled
+    inline would hold back every button that admin presses until it ends.
+    """
+    task = asyncio.create_task(coro)
+    admin_jobs.add(task)
+    task.add_done_callback(finish_admin_job)
+    return task
+
+
+def finish_admin_job(task: asyncio.Task):
+    admin_jobs.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        log.error("Admin job failed", exc_info=task.exception())
+
+
+@router.message(Command("perf"))
+async def cmd_perf(message: Message, command: CommandObject):
+    global perf_task
+    if not await is_user_admin(message.from_user.id):
+        await message.answer("⛔ Anda tidak memiliki akses admin.")
+        return
+
+    try:
+        seconds = int(command.args or PERF_DEFAULT_SECONDS)
+    except ValueError:
+        seconds = 0
+    if not 1 <= seconds <= PERF_MAX_SECONDS:
+        await message.answer(
+            f"❌ Format perintah salah.\n\nGunakan: <code>/perf [1-{PERF_MAX_SECONDS} detik]</code>",
+            parse_mode="HTML"
+        )
+        return
+
+    if profiler.running:
+        await message.answer("⏳ Profiler sedang berjalan, tunggu hasilnya dulu.")
+        return
+
+    # Sample in the background so the admin can reproduce the slowness
+    # with the bot while the profile is being taken.
+    profiler.start()
+    status_msg = await message.answer(f"⏱️ Profiling selama {seconds} detik...")
+    perf_task = asyncio.create_task(send_perf_report(message.chat.id, status_msg, seconds))
+
+
+async def send_perf_report(chat_id: int, status_msg: Message, seconds: int):
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+
+    total = profiler.total or 1
+    busy = profiler.total - profiler.idle_samples()
+    lag = loop_monitor.stats()
+    lines = [
+        f"{own * 100 / total:5.1f}% {incl * 100 / total:5.1f}%  {label}"
+        for label, own, incl in profiler.top(PERF_TOP_N)
+    ]
+    text = (
+        f"📈 <b>PROFIL {profiler.duration:.0f} DETIK</b>\n\n"
+        f"Sampel: {profiler.total} (sibuk: {busy * 100 / total:.1f}%)\n"
+        f"Event loop macet: {lag['stalls']}x, lag maks {lag['max_lag_ms']:.0f} ms\n\n"
+        f"<pre> self  total  fungsi\n{html.escape(chr(10).join(lines)) or '-'}</pre>"
+    )
+
+    try:
+        await bot.send_document(
+            chat_id,
+            BufferedInputFile(
+                profiler.collapsed().encode(),
+                filename=f"perf_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.collapsed"
+            ),
+            caption="🔥 Collapsed stacks (flamegraph.pl / speedscope)"
+        )
+        await status_msg.edit_text(text, parse_mode="HTML")
+    except Exception as e:
+        log.error(f"Failed to send profile: {e}")
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject):
+    if not await is_user_admin(message.from_user.id):
+        await message.answer("⛔ Anda tidak memiliki akses admin.")
+        return
+
+    args = (command.args or "").split()
+    table = args[0] if args else "transactions"
+    fmt = args[1] if len(args) > 1 else "csv"
+
+    if table not in EXPORT_TABLES or fmt not in EXPORT_FORMATS:
+        await message.answer(
+            "❌ Format perintah salah.\n\n"
+            f"Gunakan: <code>/export [{'|'.join(EXPORT_TABLES)}] [{'|'.join(EXPORT_FORMATS)}]</code>",
+            parse_mode="HTML"
+        )
+        return
+
+    status_msg = await message.answer(f"⏳ Mengekspor <b>{table}</b>...", parse_mode="HTML")
+    start_admin_job(run_export(message.chat.id, status_msg, table, fmt))
+
+
+async def run_export(chat_id: int, status_msg: Message, table: str, fmt: str):
+    last_reported = 0
+
+    async def report_progress(count: int):
+        nonlocal last_reported
+        if count - last_reported < EXPORT_PROGRESS_EVERY:
+            return
+        last_reported = count
+        try:
+            await status_msg.edit_text(f"⏳ Mengekspor <b>{table}</b>... {count} baris", parse_mode="HTML")
+        except Exception:
+            pass
+
+    try:
+        file_path, count = await export_table(supabase, table, fmt, progress=report_progress, execute=db_page)
+    except Exception as e:
+        log.error(f"Export {table} failed: {e}")
+        await status_msg.edit_text(f"❌ Ekspor <b>{table}</b> gagal.", parse_mode="HTML")
+        return
+
+    try:
+        await bot.send_document(
+            chat_id,
+            FSInputFile(file_path),
+            caption=f"📦 Ekspor {table} ({fmt}, gzip) - {count} baris"
+        )
+        await status_msg.edit_text(f"✅ Ekspor <b>{table}</b> selesai: {count} baris", parse_mode="HTML")
+    finally:
+        os.remove(file_path)
+
+
+@router.message(Command("dashboard"))
+async def cmd_dashboard(message: Message):
+    if not await is_user_admin(message.from_user.id):
+        await message.answer("⛔ Anda tidak memiliki akses admin.")
+        return
+
+    if admin_dashboard.active_for(message.from_user.id):
+        admin_dashboard.detach(message.from_user.id)
+        await message.answer("📴 Dashboard live dimatikan. Notifikasi kembali dikirim per pesan.")
+        return
+
+    await admin_dashboard.attach(message.from_user.id)
+
+
+async def render_admin_dashboard():
+    txs = await fetch_active_transactions()
+
+    by_status = {status: [tx for tx in txs if tx["status"] == status] for status in ACTIVE_STATUSES}
+
+    text = (
+        f"📊 <b>DASHBOARD ADMIN</b>\n\n"
+        f"⏳ Pending: {len(by_status['pending'])}\n"
+        f"✅ Disetujui: {len(by_status['approved'])}\n"
+        f"💰 Dibayar: {len(by_status['paid'])}\n"
+        f"📦 Dikirim: {len(by_status['delivered'])}\n"
+    )
+
+    buttons = []
+    for tx in by_status["pending"][:DASHBOARD_MAX_ITEMS]:
+        buttons.append([
+            InlineKeyboardButton(text=f"✅ {tx['tx_code']}", callback_data=f"approve_{tx['tx_code']}"),
+            InlineKeyboardButton(text="❌ Tolak", callback_data=f"reject_{tx['tx_code']}")
+        ])
+    for tx in by_status["paid"][:DASHBOARD_MAX_ITEMS]:
+        buttons.append([
+            InlineKeyboardButton(text=f"📦 Seller {tx['tx_code']}", callback_data=f"notify_seller_{tx['tx_code']}")
+        ])
+
+    text += f"\n🕒 Diperbarui: {datetime.utcnow().strftime('%H:%M:%S')} UTC"
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+admin_dashboard = LiveDashboard(bot, render_admin_dashboard, interval=DASHBOARD_INTERVAL)
+
+
 @router.callback_query(F.data == "check_join")
 async def check_join_callback(callback: CallbackQuery):
     if await check_channel_membership(callback.from_user.id):
-        welcome_text = (
-            f"✅ Terima kasih sudah join!\n\n"
-            f"👋 Selamat datang <b>{callback.from_user.full_name}</b>!\n\n"
-            f"🛡️ <b>Rekber Bot</b> - Sistem Rekening Bersama yang Aman\n\n"
-            f"Silakan pilih menu di bawah:"
+        welcome_text = templates.JOIN_THANKS.render(
+            welcome=templates.WELCOME.render(full_name=callback.from_user.full_name)
         )
         await callback.message.edit_text(welcome_text, reply_markup=main_menu_keyboard(), parse_mode="HTML")
     else:
@@ -204,16 +654,12 @@ async def new_transaction_callback(callback: CallbackQuery, state: FSMContext):
         "📌 Copy format di atas dan isi sesuai data transaksi Anda."
     )
 
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="❌ Batal", callback_data="main_menu")]
-    ])
-
-    await callback.message.edit_text(format_text, reply_markup=keyboard, parse_mode="HTML")
+    await callback.message.edit_text(format_text, reply_markup=CANCEL_KEYBOARD, parse_mode="HTML")
     await state.set_state(TransactionStates.waiting_format)
     await callback.answer()
 
 
-@router.message(TransactionStates.waiting_format)
+@router.message(TransactionStates.waiting_format, F.text)
 async def process_transaction_format(message: Message, state: FSMContext):
     text = message.text
 
@@ -254,25 +700,16 @@ async def process_transaction_format(message: Message, state: FSMContext):
         "status": "pending"
     }
 
-    result = supabase.table("transactions").insert(tx_data).execute()
+    result = await tx_write(supabase.table("transactions").insert(tx_data))
 
-    supabase.table("transaction_logs").insert({
+    await db_exec(supabase.table("transaction_logs").insert({
         "transaction_id": result.data[0]["id"],
         "action": "created",
         "actor_id": message.from_user.id,
         "notes": "Transaction created"
-    }).execute()
-
-    admin_text = (
-        f"🆕 <b>TRANSAKSI BARU</b>\n\n"
-        f"📋 Kode: <code>{tx_code}</code>\n"
-        f"👤 Seller: {seller}\n"
-        f"👤 Buyer: {buyer}\n"
-        f"📦 Barang: {item}\n"
-        f"💰 Harga: {price}\n"
-        f"📝 Ref: {reference}\n\n"
-        f"Status: ⏳ Menunggu Persetujuan"
-    )
+    }))
+
+    admin_text = templates.NEW_TRANSACTION_ADMIN.fill(tx_data)
 
     admin_keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
@@ -281,16 +718,16 @@ async def process_transaction_format(message: Message, state: FSMContext):
         ]
     ])
 
-    try:
-        await bot.send_message(ADMIN_ID, admin_text, reply_markup=admin_keyboard, parse_mode="HTML")
-    except Exception as e:
-        log.error(f"Failed to send admin notification: {e}")
+    if admin_dashboard.active_for(ADMIN_ID):
+        admin_dashboard.mark_dirty()
+    else:
+        try:
+            await bot.send_message(ADMIN_ID, admin_text, reply_markup=admin_keyboard, parse_mode="HTML")
+        except Exception as e:
+            log.error(f"Failed to send admin notification: {e}")
 
     await message.answer(
-        f"✅ <b>Transaksi Berhasil Dibuat!</b>\n\n"
-        f"📋 Kode Transaksi: <code>{tx_code}</code>\n\n"
-        f"⏳ Menunggu persetujuan admin...\n"
-        f"Anda akan mendapat notifikasi setelah admin menyetujui.",
+        templates.TRANSACTION_CREATED.render(tx_code=tx_code),
         reply_markup=back_to_menu_keyboard(),
         parse_mode="HTML"
     )
@@ -298,6 +735,27 @@ async def process_transaction_format(message: Message, state: FSMContext):
     await state.clear()
 
 
+async def notify_buyer_approved(tx: dict):
+    tx_code = tx["tx_code"]
+    buyer_text = templates.BUYER_APPROVED.fill(tx)
+
+    buyer_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="💳 Lihat Metode Pembayaran", callback_data=f"payment_methods_{tx_code}")],
+        [InlineKeyboardButton(text="📤 Kirim Bukti Transfer", callback_data=f"send_proof_{tx_code}")]
+    ])
+
+    await bot.send_message(tx["buyer_id"], buyer_text, reply_markup=buyer_keyboard, parse_mode="HTML")
+
+
+async def notify_buyer_rejected(tx: dict):
+    await bot.send_message(
+        tx["buyer_id"],
+        templates.BUYER_REJECTED.fill(tx),
+        reply_markup=back_to_menu_keyboard(),
+        parse_mode="HTML"
+    )
+
+
 @router.callback_query(F.data.startswith("approve_"))
 async def approve_transaction(callback: CallbackQuery):
     if not await is_user_admin(callback.from_user.id):
@@ -306,49 +764,30 @@ async def approve_transaction(callback: CallbackQuery):
 
     tx_code = callback.data.replace("approve_", "")
 
-    result = supabase.table("transactions").update({
-        "status": "approved",
-        "updated_at": datetime.utcnow().isoformat()
-    }).eq("tx_code", tx_code).execute()
+    tx, current = await transition_transaction(tx_code, "approved")
 
-    if not result.data:
-        await callback.answer("❌ Transaksi tidak ditemukan", show_alert=True)
+    if not tx:
+        await callback.answer(transition_error(current), show_alert=True)
         return
 
-    tx = result.data[0]
-
-    supabase.table("transaction_logs").insert({
+    await db_exec(supabase.table("transaction_logs").insert({
         "transaction_id": tx["id"],
         "action": "approved",
         "actor_id": callback.from_user.id,
         "notes": "Approved by admin"
-    }).execute()
-
-    buyer_text = (
-        f"✅ <b>TRANSAKSI DISETUJUI</b>\n\n"
-        f"📋 Kode: <code>{tx_code}</code>\n"
-        f"💰 Harga: {tx['price']}\n\n"
-        f"📌 Langkah selanjutnya:\n"
-        f"1. Lihat metode pembayaran\n"
-        f"2. Transfer ke rekening yang ditentukan\n"
-        f"3. Kirim bukti transfer ke bot ini\n\n"
-        f"Klik tombol di bawah untuk melihat metode pembayaran:"
-    )
-
-    buyer_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="💳 Lihat Metode Pembayaran", callback_data=f"payment_methods_{tx_code}")],
-        [InlineKeyboardButton(text="📤 Kirim Bukti Transfer", callback_data=f"send_proof_{tx_code}")]
-    ])
+    }))
 
     try:
-        await bot.send_message(tx["buyer_id"], buyer_text, reply_markup=buyer_keyboard, parse_mode="HTML")
+        await notify_buyer_approved(tx)
     except Exception as e:
         log.error(f"Failed to notify buyer: {e}")
 
-    await callback.message.edit_text(
-        f"{callback.message.text}\n\n✅ <b>DISETUJUI</b> oleh admin",
-        parse_mode="HTML"
-    )
+    admin_dashboard.mark_dirty()
+    if not admin_dashboard.owns(callback.message):
+        await callback.message.edit_text(
+            f"{callback.message.html_text}\n\n✅ <b>DISETUJUI</b> oleh admin",
+            parse_mode="HTML"
+        )
     await callback.answer("✅ Transaksi disetujui")
 
 
@@ -360,75 +799,413 @@ async def reject_transaction(callback: CallbackQuery):
 
     tx_code = callback.data.replace("reject_", "")
 
-    result = supabase.table("transactions").update({
-        "status": "rejected",
-        "updated_at": datetime.utcnow().isoformat()
-    }).eq("tx_code", tx_code).execute()
+    tx, current = await transition_transaction(tx_code, "rejected")
 
-    if not result.data:
-        await callback.answer("❌ Transaksi tidak ditemukan", show_alert=True)
+    if not tx:
+        await callback.answer(transition_error(current), show_alert=True)
         return
 
-    tx = result.data[0]
-
-    supabase.table("transaction_logs").insert({
+    await db_exec(supabase.table("transaction_logs").insert({
         "transaction_id": tx["id"],
         "action": "rejected",
         "actor_id": callback.from_user.id,
         "notes": "Rejected by admin"
-    }).execute()
+    }))
 
     try:
-        await bot.send_message(
-            tx["buyer_id"],
-            f"❌ <b>TRANSAKSI DITOLAK</b>\n\n"
-            f"📋 Kode: <code>{tx_code}</code>\n\n"
-            f"Transaksi Anda telah ditolak oleh admin.\n"
-            f"Silakan hubungi admin untuk informasi lebih lanjut.",
-            reply_markup=back_to_menu_keyboard(),
-            parse_mode="HTML"
-        )
+        await notify_buyer_rejected(tx)
     except Exception as e:
         log.error(f"Failed to notify buyer: {e}")
 
+    admin_dashboard.mark_dirty()
+    if not admin_dashboard.owns(callback.message):
+        await callback.message.edit_text(
+            f"{callback.message.html_text}\n\n❌ <b>DITOLAK</b> oleh admin",
+            parse_mode="HTML"
+        )
+    await callback.answer("❌ Transaksi ditolak")
+
+
+BULK_ACTIONS = {
+    "approve": ("approved", "Approved by admin (bulk)", notify_buyer_approved),
+    "reject": ("rejected", "Rejected by admin (bulk)", notify_buyer_rejected),
+}
+
+
+async def bulk_transition(tx_codes, action: str, actor_id: int):
+    """Move pending transactions to the action's status.
+
+    Each chunk is one UPDATE guarded by status = 'pending' and one log
+    INSERT, so transactions handled elsewhere in the meantime are skipped.
+    Buyers are notified concurrently under the shared rate limit.
+    """
+    status, notes, notify = BULK_ACTIONS[action]
+    tx_codes = list(dict.fromkeys(tx_codes))
+    updated = []
+
+    for i in range(0, len(tx_codes), BULK_CHUNK_SIZE):
+        chunk = tx_codes[i:i + BULK_CHUNK_SIZE]
+        result = await tx_write(supabase.table("transactions").update({
+            "status": status,
+            "updated_at": datetime.utcnow().isoformat()
+        }).in_("tx_code", chunk).eq("status", "pending"))
+        if not result.data:
+            continue
+        await db_exec(supabase.table("transaction_logs").insert([
+            {"transaction_id": tx["id"], "action": status, "actor_id": actor_id, "notes": notes}
+            for tx in result.data
+        ]))
+        updated.extend(result.data)
+
+    sent, failed = await send_all([lambda tx=tx: notify(tx) for tx in updated], notify_limiter)
+    if updated:
+        admin_dashboard.mark_dirty()
+    return updated, sent, failed
+
+
+def bulk_result_text(action: str, requested: int, updated: list, failed: int) -> str:
+    label = "disetujui" if action == "approve" else "ditolak"
+    text = (
+        f"✅ <b>AKSI MASSAL SELESAI</b>\n\n"
+        f"{len(updated)} dari {requested} transaksi {label}."
+    )
+    if len(updated) < requested:
+        text += f"\n⚠️ {requested - len(updated)} dilewati (sudah bukan pending)."
+    if failed:
+        text += f"\n⚠️ {failed} notifikasi buyer gagal terkirim."
+    return text
+
+
+async def render_bulk_menu(callback: CallbackQuery, state: FSMContext):
+    pending = [tx for tx in await fetch_active_transactions() if tx["status"] == "pending"]
+    selected = set((await state.get_data()).get("bulk_selected", []))
+
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"{'☑️' if tx['tx_code'] in selected else '⬜'} {tx['tx_code']} - {tx['price']}",
+            callback_data=f"bulk_toggle_{tx['tx_code']}"
+        )]
+        for tx in pending[:BULK_PAGE_SIZE]
+    ]
+    buttons.append([
+        InlineKeyboardButton(text=f"✅ Setujui ({len(selected)})", callback_data="bulk_apply_approve"),
+        InlineKeyboardButton(text=f"❌ Tolak ({len(selected)})", callback_data="bulk_apply_reject")
+    ])
+    buttons.append([InlineKeyboardButton(text=f"✅ Setujui Semua Pending ({len(pending)})", callback_data="bulk_all_confirm")])
+    buttons.append([InlineKeyboardButton(text="⬅️ Kembali", callback_data="admin_pending")])
+
     await callback.message.edit_text(
-        f"{callback.message.text}\n\n❌ <b>DITOLAK</b> oleh admin",
+        f"☑️ <b>AKSI MASSAL</b>\n\n"
+        f"Pending: {len(pending)} transaksi\n"
+        f"Pilih transaksi lalu tekan Setujui atau Tolak.",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
         parse_mode="HTML"
     )
-    await callback.answer("❌ Transaksi ditolak")
 
 
-@router.callback_query(F.data.startswith("payment_methods_"))
-async def show_payment_methods(callback: CallbackQuery):
-    tx_code = callback.data.replace("payment_methods_", "")
+@router.callback_query(F.data == "bulk_menu")
+async def bulk_menu_callback(callback: CallbackQuery, state: FSMContext):
+    if not await is_user_admin(callback.from_user.id):
+        await callback.answer("⛔ Akses ditolak", show_alert=True)
+        return
 
-    result = supabase.table("payment_methods").select("*").eq("is_active", True).execute()
+    await state.update_data(bulk_selected=[])
+    await render_bulk_menu(callback, state)
+    await callback.answer()
 
-    if not result.data:
-        await callback.answer("❌ Belum ada metode pembayaran tersedia", show_alert=True)
+
+@router.callback_query(F.data.startswith("bulk_toggle_"))
+async def bulk_toggle_callback(callback: CallbackQuery, state: FSMContext):
+    if not await is_user_admin(callback.from_user.id):
+        await callback.answer("⛔ Akses ditolak", show_alert=True)
         return
 
-    banks = [pm for pm in result.data if pm["type"] == "bank"]
-    ewallets = [pm for pm in result.data if pm["type"] == "ewallet"]
+    tx_code = callback.data.replace("bulk_toggle_", "")
+    selected = (await state.get_data()).get("bulk_selected", [])
+    if tx_code in selected:
+        selected.remove(tx_code)
+    else:
+        selected.append(tx_code)
+    await state.update_data(bulk_selected=selected)
 
-    text = "💳 <b>METODE PEMBAYARAN</b>\n\n"
+    await render_bulk_menu(callback, state)
+    await callback.answer()
 
-    if banks:
-        text += "🏦 <b>BANK:</b>\n"
-        for bank in banks:
-            text += f"• {bank['name']}\n"
-            text += f"  {bank['account_number']}\n"
-            text += f"  a/n {bank['account_name']}\n\n"
 
-    if ewallets:
-        text += "📱 <b>E-WALLET:</b>\n"
-        for ew in ewallets:
-            text += f"• {ew['name']}\n"
-            text += f"  {ew['account_number']}\n"
-            text += f"  a/n {ew['account_name']}\n\n"
+@router.callback_query(F.data == "bulk_all_confirm")
+async def bulk_all_confirm_callback(callback: CallbackQuery, state: FSMContext):
+    if not await is_user_admin(callback.from_user.id):
+        await callback.answer("⛔ Akses ditolak", show_alert=True)
+        return
 
-    text += "⚠️ <b>PENTING:</b>\n"
-    text += "Setelah transfer, segera kirim bukti transfer!"
+    # Approve exactly what the admin was shown, not whatever is pending by the time they confirm.
+    tx_codes = [tx["tx_code"] for tx in await fetch_active_transactions() if tx["status"] == "pending"]
+    if not tx_codes:
+        await callback.answer("ℹ️ Tidak ada transaksi pending", show_alert=True)
+        return
+    await state.update_data(bulk_all=tx_codes)
+
+    await callback.message.edit_text(
+        f"⚠️ <b>SETUJUI SEMUA PENDING</b>\n\n"
+        f"{len(tx_codes)} transaksi pending akan disetujui dan buyer-nya diberi tahu.\n"
+        f"Lanjutkan?",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=f"✅ Ya, setujui {len(tx_codes)} transaksi", callback_data="bulk_all_approve")],
+            [InlineKeyboardButton(text="⬅️ Batal", callback_data="bulk_menu")]
+        ]),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@router.callback_query(
+    F.data.startswith("bulk_apply_") | F.data.startswith("bulk_command_") | (F.data == "bulk_all_approve")
+)
+async def bulk_apply_callback(callback: CallbackQuery, state: FSMContext):
+    if not await is_user_admin(callback.from_user.id):
+        await callback.answer("⛔ Akses ditolak", show_alert=True)
+        return
+
+    if callback.data == "bulk_all_approve":
+        action, key = "approve", "bulk_all"
+    elif callback.data.startswith("bulk_command_"):
+        action, key = callback.data.replace("bulk_command_", ""), "bulk_command"
+    else:
+        action, key = callback.data.replace("bulk_apply_", ""), "bulk_selected"
+    tx_codes = (await state.get_data()).get(key, [])
+
+    if action not in BULK_ACTIONS or not tx_codes:
+        await callback.answer("❌ Tidak ada transaksi dipilih", show_alert=True)
+        return
+
+    await callback.answer("⏳ Memproses...")
+    await state.update_data({key: []})
+    start_admin_job(run_bulk_apply(callback.message, tx_codes, action, callback.from_user.id))
+
+
+async def run_bulk_apply(message: Message, tx_codes: list, action: str, actor_id: int):
+    updated, sent, failed = await bulk_transition(tx_codes, action, actor_id)
+    await message.edit_text(
+        bulk_result_text(action, len(tx_codes), updated, failed),
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="⬅️ Kembali", callback_data="admin_pending")]
+        ]),
+        parse_mode="HTML"
+    )
+
+
+@router.message(Command("bulk"))
+async def cmd_bulk(message: Message, command: CommandObject, state: FSMContext):
+    if not await is_user_admin(message.from_user.id):
+        await message.answer("⛔ Anda tidak memiliki akses admin.")
+        return
+
+    args = (command.args or "").split(maxsplit=1)
+    action = args[0] if args else ""
+    keyword = args[1].lower() if len(args) > 1 else ""
+
+    if action not in BULK_ACTIONS:
+        await message.answer(
+            "❌ Format perintah salah.\n\n"
+            "Gunakan: <code>/bulk [approve|reject] [kata kunci]</code>\n"
+            "Kata kunci dicocokkan ke kode, seller, buyer, dan barang. "
+            "Tanpa kata kunci, semua transaksi pending diproses.",
+            parse_mode="HTML"
+        )
+        return
+
+    tx_codes = [
+        tx["tx_code"] for tx in await fetch_active_transactions()
+        if tx["status"] == "pending" and keyword in " ".join(
+            str(tx.get(field) or "") for field in ("tx_code", "seller_username", "buyer_username", "item_description")
+        ).lower()
+    ]
+    if not tx_codes:
+        await message.answer("ℹ️ Tidak ada transaksi pending yang cocok.")
+        return
+
+    # Like the menu's approve-all, act only on what the admin confirmed seeing.
+    await state.update_data(bulk_command=tx_codes)
+    verb = "disetujui" if action == "approve" else "ditolak"
+    await message.answer(
+        f"⚠️ <b>BULK {action.upper()}</b>\n\n"
+        f"{len(tx_codes)} transaksi pending akan {verb} dan buyer-nya diberi tahu.\n"
+        f"Lanjutkan?",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=f"✅ Ya, proses {len(tx_codes)} transaksi", callback_data=f"bulk_command_{action}")],
+            [InlineKeyboardButton(text="⬅️ Batal", callback_data="admin_panel")]
+        ]),
+        parse_mode="HTML"
+    )
+
+
+@router.message(Command("reconcile"))
+async def cmd_reconcile(message: Message, state: FSMContext):
+    if not await is_user_admin(message.from_user.id):
+        await message.answer("⛔ Anda tidak memiliki akses admin.")
+        return
+
+    await state.set_state(AdminStates.reconcile)
+    await message.answer(
+        "🧾 <b>REKONSILIASI MUTASI</b>\n\n"
+        "Kirim file CSV mutasi rekening/e-wallet (export dari internet banking).\n"
+        "Hanya mutasi masuk (kredit) yang dicocokkan ke transaksi berstatus dibayar.",
+        reply_markup=BACK_TO_ADMIN_KEYBOARD,
+        parse_mode="HTML"
+    )
+
+
+def reconcile_result_text(result: dict) -> str:
+    limit = RECONCILE_LIST_MAX
+    details = render_list(templates.RECONCILE_MATCHED_ITEM, (
+        {**tx, "line": mutation["line"]} for mutation, tx in result["matched"][:limit]
+    )) + render_list(templates.RECONCILE_AMBIGUOUS_ITEM, (
+        {**mutation, "candidates": ", ".join(tx["tx_code"] for tx in txs[:3])}
+        for mutation, txs in result["ambiguous"][:limit]
+    ))
+    return templates.RECONCILE_RESULT.render(
+        rows=result["rows"],
+        matched=len(result["matched"]),
+        ambiguous=len(result["ambiguous"]),
+        unmatched=len(result["unmatched"]),
+        unpaid=len(result["unpaid"]),
+        unpriced=len(result["unpriced"]),
+        details=Markup(details + "\n" if details else ""),
+    )
+
+
+@router.message(AdminStates.reconcile, F.document)
+async def process_reconcile(message: Message, state: FSMContext):
+    if not await is_user_admin(message.from_user.id):
+        return
+
+    status_msg = await message.answer("⏳ Mencocokkan mutasi...")
+    paid = [tx for tx in await fetch_active_transactions() if tx["status"] == "paid"]
+    file_path = os.path.join(PROOFS_DIR, f"mutasi_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.csv")
+    try:
+        file = await bot.get_file(message.document.file_id)
+        await bot.download_file(file.file_path, file_path)
+        # Parsing tens of thousands of rows would stall the event loop.
+        result = await asyncio.to_thread(
+            reconcile_file, file_path, paid,
+            before=timedelta(hours=RECONCILE_WINDOW_BEFORE_HOURS),
+            after=timedelta(hours=RECONCILE_WINDOW_AFTER_HOURS),
+            utc_offset=timedelta(hours=BANK_UTC_OFFSET_HOURS)
+        )
+    except Exception as e:
+        log.error(f"Reconciliation failed: {e}")
+        await status_msg.edit_text("❌ File mutasi tidak bisa dibaca. Pastikan formatnya CSV.")
+        return
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    matched = [tx["tx_code"] for _, tx in result["matched"]]
+    await state.set_state(None)
+    await state.update_data(reconcile_matched=matched)
+
+    buttons = []
+    if matched:
+        buttons.append([InlineKeyboardButton(
+            text=f"✅ Konfirmasi {len(matched)} ke Seller", callback_data="reconcile_confirm"
+        )])
+    buttons.append([InlineKeyboardButton(text="⬅️ Kembali", callback_data="admin_panel")])
+    await status_msg.edit_text(
+        reconcile_result_text(result),
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
+        parse_mode="HTML"
+    )
+
+
+async def confirm_payments(tx_codes, actor_id: int):
+    """Tell the sellers of still-paid transactions that their funds are safe, in bulk.
+
+    Sellers are looked up with one query per chunk and notified under the
+    shared rate limit; each confirmation is logged for the audit trail.
+    Returns (confirmed, sent, unregistered).
+    """
+    wanted = set(tx_codes)
+    txs = [tx for tx in await fetch_active_transactions() if tx["status"] == "paid" and tx["tx_code"] in wanted]
+    usernames = list({tx["seller_username"].replace("@", "") for tx in txs if tx.get("seller_username")})
+
+    seller_ids = {}
+    for i in range(0, len(usernames), BULK_CHUNK_SIZE):
+        result = await db_exec(
+            supabase.table("users").select("id, username").in_("username", usernames[i:i + BULK_CHUNK_SIZE]),
+            idempotent=True
+        )
+        seller_ids.update({u["username"]: u["id"] for u in result.data or []})
+
+    for i in range(0, len(txs), BULK_CHUNK_SIZE):
+        await db_exec(supabase.table("transaction_logs").insert([
+            {"transaction_id": tx["id"], "action": "payment_verified", "actor_id": actor_id,
+             "notes": "Matched bank mutation (reconcile)"}
+            for tx in txs[i:i + BULK_CHUNK_SIZE]
+        ]))
+
+    jobs = [
+        lambda tx=tx, seller_id=seller_ids[name]: send_seller_funds_safe(seller_id, tx)
+        for tx in txs if (name := (tx.get("seller_username") or "").replace("@", "")) in seller_ids
+    ]
+    sent, _ = await send_all(jobs, notify_limiter)
+    return txs, sent, len(txs) - len(jobs)
+
+
+@router.callback_query(F.data == "reconcile_confirm")
+async def reconcile_confirm_callback(callback: CallbackQuery, state: FSMContext):
+    if not await is_user_admin(callback.from_user.id):
+        await callback.answer("⛔ Akses ditolak", show_alert=True)
+        return
+
+    tx_codes = (await state.get_data()).get("reconcile_matched", [])
+    if not tx_codes:
+        await callback.answer("❌ Tidak ada transaksi cocok untuk dikonfirmasi", show_alert=True)
+        return
+
+    await callback.answer("⏳ Memproses...")
+    await state.update_data(reconcile_matched=[])
+    start_admin_job(run_reconcile_confirm(callback.message, tx_codes, callback.from_user.id))
+
+
+async def run_reconcile_confirm(message: Message, tx_codes: list, actor_id: int):
+    confirmed, sent, unregistered = await confirm_payments(tx_codes, actor_id)
+    await message.edit_text(
+        templates.RECONCILE_CONFIRMED.render(
+            confirmed=len(confirmed),
+            requested=len(tx_codes),
+            sent=sent,
+            unregistered=unregistered,
+        ),
+        reply_markup=BACK_TO_ADMIN_KEYBOARD,
+        parse_mode="HTML"
+    )
+
+
+def payment_methods_text(methods: list, footer: str = "") -> str:
+    banks = [pm for pm in methods if pm["type"] == "bank"]
+    ewallets = [pm for pm in methods if pm["type"] == "ewallet"]
+    return templates.PAYMENT_METHODS.render(
+        banks=templates.PAYMENT_METHODS_BANKS.render(
+            items=render_list(templates.PAYMENT_METHOD_ITEM, banks)
+        ) if banks else Markup(),
+        ewallets=templates.PAYMENT_METHODS_EWALLETS.render(
+            items=render_list(templates.PAYMENT_METHOD_ITEM, ewallets)
+        ) if ewallets else Markup(),
+        footer=Markup(footer),
+    )
+
+
+@router.callback_query(F.data.startswith("payment_methods_"))
+async def show_payment_methods(callback: CallbackQuery):
+    tx_code = callback.data.replace("payment_methods_", "")
+
+    methods = await fetch_active_payment_methods()
+
+    if not methods:
+        await callback.answer("❌ Belum ada metode pembayaran tersedia", show_alert=True)
+        return
+
+    text = payment_methods_text(methods, templates.PAYMENT_METHODS_FOOTER)
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="📤 Kirim Bukti Transfer", callback_data=f"send_proof_{tx_code}")],
@@ -446,15 +1223,11 @@ async def request_payment_proof(callback: CallbackQuery, state: FSMContext):
     await state.update_data(tx_code=tx_code)
     await state.set_state(TransactionStates.waiting_payment_proof)
 
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="❌ Batal", callback_data="main_menu")]
-    ])
-
     await callback.message.edit_text(
         "📤 <b>KIRIM BUKTI TRANSFER</b>\n\n"
         "Silakan kirim foto atau file bukti transfer Anda.\n\n"
         "Format yang diterima: Foto (JPG/PNG) atau PDF",
-        reply_markup=keyboard,
+        reply_markup=CANCEL_KEYBOARD,
         parse_mode="HTML"
     )
     await callback.answer()
@@ -484,59 +1257,71 @@ async def process_payment_proof(message: Message, state: FSMContext):
         await message.answer("❌ Format file tidak didukung. Kirim foto atau PDF.")
         return
 
+    known = cached_transaction(tx_code)
+    if known is not None and known["status"] not in TX_TRANSITIONS["paid"]:
+        known = await refresh_transaction(tx_code)
+        if known is None or known["status"] not in TX_TRANSITIONS["paid"]:
+            await message.answer(transition_error(known))
+            await state.clear()
+            return
+
     file = await bot.get_file(file_id)
     file_path = os.path.join(PROOFS_DIR, f"{tx_code}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{file_ext}")
-    await bot.download_file(file.file_path, file_path)
+    with tracer.span("telegram download_file"):
+        await bot.download_file(file.file_path, file_path)
+
+    with tracer.span("proof process"):
+        proof, reused = await proof_pipeline.process(file_path, tx_code)
+
+    tx_update = {"proof_url": file_path}
+    if proof:
+        tx_update["proof_phash"] = proof["phash"]
 
-    result = supabase.table("transactions").update({
-        "status": "paid",
-        "proof_url": file_path,
-        "updated_at": datetime.utcnow().isoformat()
-    }).eq("tx_code", tx_code).execute()
+    tx, current = await transition_transaction(tx_code, "paid", tx_update)
 
-    if not result.data:
-        await message.answer("❌ Transaksi tidak ditemukan.")
+    if not tx:
+        await message.answer(transition_error(current))
         await state.clear()
         return
+    proof_pipeline.load([tx])
 
-    tx = result.data[0]
-
-    supabase.table("transaction_logs").insert({
+    await db_exec(supabase.table("transaction_logs").insert({
         "transaction_id": tx["id"],
         "action": "paid",
         "actor_id": message.from_user.id,
         "notes": "Payment proof uploaded"
-    }).execute()
-
-    admin_text = (
-        f"💰 <b>PEMBAYARAN DITERIMA</b>\n\n"
-        f"📋 Kode: <code>{tx_code}</code>\n"
-        f"👤 Seller: {tx['seller_username']}\n"
-        f"👤 Buyer: {tx['buyer_username']}\n"
-        f"📦 Barang: {tx['item_description']}\n"
-        f"💰 Harga: {tx['price']}\n\n"
-        f"✅ Bukti transfer telah diterima.\n"
-        f"Dana sudah aman."
-    )
+    }))
+
+    admin_text = templates.PAYMENT_RECEIVED_ADMIN.fill(tx)
+
+    if reused:
+        similar = render_list(
+            templates.PROOF_REUSED_ITEM,
+            ({"tx_code": code, "distance": distance} for distance, code in reused[:3]),
+            sep=", "
+        )
+        admin_text += templates.PROOF_REUSED.render(similar=similar)
 
     admin_keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="👁️ Lihat Bukti", callback_data=f"view_proof_{tx_code}")],
         [InlineKeyboardButton(text="✅ Konfirmasi ke Seller", callback_data=f"notify_seller_{tx_code}")]
     ])
 
-    try:
-        await bot.send_message(ADMIN_ID, admin_text, reply_markup=admin_keyboard, parse_mode="HTML")
-        if os.path.exists(file_path):
-            await bot.send_document(ADMIN_ID, FSInputFile(file_path), caption=f"Bukti transfer {tx_code}")
-    except Exception as e:
-        log.error(f"Failed to notify admin: {e}")
+    admin_dashboard.mark_dirty()
+    # A possibly reused proof is urgent and still gets its own message in dashboard mode.
+    if reused or not admin_dashboard.active_for(ADMIN_ID):
+        try:
+            await bot.send_message(ADMIN_ID, admin_text, reply_markup=admin_keyboard, parse_mode="HTML")
+            # An image proof goes out as its small thumbnail; "Lihat Bukti" sends the original.
+            if proof and os.path.exists(proof["thumb_path"]):
+                await bot.send_photo(ADMIN_ID, FSInputFile(proof["thumb_path"]), caption=f"Bukti transfer {tx_code}")
+            elif os.path.exists(file_path):
+                await bot.send_document(ADMIN_ID, FSInputFile(file_path), caption=f"Bukti transfer {tx_code}")
+        except Exception as e:
+            log.error(f"Failed to notify admin: {e}")
 
     await message.answer(
-        f"✅ <b>BUKTI TRANSFER DITERIMA</b>\n\n"
-        f"📋 Kode: <code>{tx_code}</code>\n\n"
-        f"Bukti transfer Anda telah diterima dan sedang diverifikasi oleh admin.\n"
-        f"Dana Anda sudah aman. Seller akan segera mengirimkan barang.\n\n"
-        f"Anda akan mendapat notifikasi selanjutnya.",
+        templates.PROOF_RECEIVED.render(tx_code=tx_code),
         reply_markup=back_to_menu_keyboard(),
         parse_mode="HTML"
     )
@@ -544,6 +1329,34 @@ async def process_payment_proof(message: Message, state: FSMContext):
     await state.clear()
 
 
+async def send_seller_funds_safe(seller_id: int, tx: dict):
+    await bot.send_message(
+        seller_id,
+        templates.SELLER_FUNDS_SAFE.fill(tx),
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="✅ Barang Sudah Dikirim", callback_data=f"seller_sent_{tx['tx_code']}")]
+        ]),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data.startswith("view_proof_"))
+async def view_proof(callback: CallbackQuery):
+    if not await is_user_admin(callback.from_user.id):
+        await callback.answer("⛔ Akses ditolak", show_alert=True)
+        return
+
+    tx_code = callback.data.replace("view_proof_", "")
+    tx = await fetch_transaction(tx_code)
+    proof_url = (tx or {}).get("proof_url")
+    if not proof_url or not os.path.exists(proof_url):
+        await callback.answer("❌ File bukti tidak ditemukan", show_alert=True)
+        return
+
+    await callback.answer()
+    await bot.send_document(callback.from_user.id, FSInputFile(proof_url), caption=f"Bukti transfer {tx_code}")
+
+
 @router.callback_query(F.data.startswith("notify_seller_"))
 async def notify_seller(callback: CallbackQuery):
     if not await is_user_admin(callback.from_user.id):
@@ -552,40 +1365,18 @@ async def notify_seller(callback: CallbackQuery):
 
     tx_code = callback.data.replace("notify_seller_", "")
 
-    result = supabase.table("transactions").select("*").eq("tx_code", tx_code).maybe_single().execute()
+    tx = await fetch_transaction_in(tx_code, ("paid",))
 
-    if not result.data:
-        await callback.answer("❌ Transaksi tidak ditemukan", show_alert=True)
+    if not tx or tx["status"] != "paid":
+        await callback.answer(transition_error(tx), show_alert=True)
         return
 
-    tx = result.data
-
-    seller_text = (
-        f"📦 <b>DANA SUDAH AMAN</b>\n\n"
-        f"📋 Kode: <code>{tx_code}</code>\n"
-        f"👤 Buyer: {tx['buyer_username']}\n"
-        f"📦 Barang: {tx['item_description']}\n"
-        f"💰 Harga: {tx['price']}\n\n"
-        f"✅ Pembayaran dari buyer telah diterima dan diverifikasi.\n"
-        f"Dana sudah aman di rekber.\n\n"
-        f"📌 <b>Langkah selanjutnya:</b>\n"
-        f"Silakan kirimkan barang/akun kepada buyer.\n"
-        f"Setelah buyer konfirmasi, dana akan ditransfer ke Anda.\n\n"
-        f"⚠️ <b>PERHATIAN:</b>\n"
-        f"Jika dalam 1 jam buyer tidak konfirmasi setelah Anda kirim barang,\n"
-        f"dana otomatis dicairkan ke Anda."
-    )
-
-    seller_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Barang Sudah Dikirim", callback_data=f"seller_sent_{tx_code}")]
-    ])
-
     seller_username_clean = tx['seller_username'].replace("@", "")
 
     try:
-        result_user = supabase.table("users").select("id").eq("username", seller_username_clean).maybe_single().execute()
+        result_user = await db_exec(supabase.table("users").select("id").eq("username", seller_username_clean).maybe_single(), idempotent=True)
         if result_user.data:
-            await bot.send_message(result_user.data["id"], seller_text, reply_markup=seller_keyboard, parse_mode="HTML")
+            await send_seller_funds_safe(result_user.data["id"], tx)
             await callback.answer("✅ Seller telah diberitahu")
         else:
             await callback.answer("⚠️ Seller belum terdaftar di bot. Hubungi seller secara manual.", show_alert=True)
@@ -598,33 +1389,20 @@ async def notify_seller(callback: CallbackQuery):
 async def seller_sent_item(callback: CallbackQuery):
     tx_code = callback.data.replace("seller_sent_", "")
 
-    result = supabase.table("transactions").update({
-        "status": "delivered",
-        "updated_at": datetime.utcnow().isoformat()
-    }).eq("tx_code", tx_code).execute()
+    tx, current = await transition_transaction(tx_code, "delivered")
 
-    if not result.data:
-        await callback.answer("❌ Transaksi tidak ditemukan", show_alert=True)
+    if not tx:
+        await callback.answer(transition_error(current), show_alert=True)
         return
 
-    tx = result.data[0]
-
-    supabase.table("transaction_logs").insert({
+    await db_exec(supabase.table("transaction_logs").insert({
         "transaction_id": tx["id"],
         "action": "delivered",
         "actor_id": callback.from_user.id,
         "notes": "Item delivered by seller"
-    }).execute()
-
-    buyer_text = (
-        f"📦 <b>BARANG TELAH DIKIRIM</b>\n\n"
-        f"📋 Kode: <code>{tx_code}</code>\n"
-        f"👤 Seller: {tx['seller_username']}\n"
-        f"📦 Barang: {tx['item_description']}\n\n"
-        f"Seller telah mengirimkan barang kepada Anda.\n"
-        f"Silakan cek dan verifikasi barang yang diterima.\n\n"
-        f"Jika sudah sesuai, klik tombol konfirmasi di bawah:"
-    )
+    }))
+
+    buyer_text = templates.BUYER_ITEM_SENT.fill(tx)
 
     buyer_keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Barang Sesuai - DONE", callback_data=f"buyer_confirm_{tx_code}")],
@@ -636,8 +1414,10 @@ async def seller_sent_item(callback: CallbackQuery):
     except Exception as e:
         log.error(f"Failed to notify buyer: {e}")
 
+    admin_dashboard.mark_dirty()
+
     await callback.message.edit_text(
-        f"{callback.message.text}\n\n"
+        f"{callback.message.html_text}\n\n"
         f"✅ Konfirmasi diterima. Menunggu buyer konfirmasi...",
         parse_mode="HTML"
     )
@@ -648,38 +1428,27 @@ async def seller_sent_item(callback: CallbackQuery):
 async def buyer_confirm_received(callback: CallbackQuery):
     tx_code = callback.data.replace("buyer_confirm_", "")
 
-    result = supabase.table("transactions").update({
-        "status": "completed",
-        "updated_at": datetime.utcnow().isoformat()
-    }).eq("tx_code", tx_code).execute()
+    tx, current = await transition_transaction(tx_code, "completed")
 
-    if not result.data:
-        await callback.answer("❌ Transaksi tidak ditemukan", show_alert=True)
+    if not tx:
+        await callback.answer(transition_error(current), show_alert=True)
         return
 
-    tx = result.data[0]
-
-    supabase.table("transaction_logs").insert({
+    await db_exec(supabase.table("transaction_logs").insert({
         "transaction_id": tx["id"],
         "action": "completed",
         "actor_id": callback.from_user.id,
         "notes": "Confirmed by buyer"
-    }).execute()
-
-    admin_text = (
-        f"✅ <b>TRANSAKSI SELESAI</b>\n\n"
-        f"📋 Kode: <code>{tx_code}</code>\n"
-        f"👤 Seller: {tx['seller_username']}\n"
-        f"👤 Buyer: {tx['buyer_username']}\n"
-        f"💰 Harga: {tx['price']}\n\n"
-        f"Buyer telah konfirmasi barang diterima dengan baik.\n"
-        f"Silakan cairkan dana ke seller."
-    )
+    }))
+
+    admin_text = templates.ADMIN_TX_COMPLETED.fill(tx)
 
     admin_keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="💸 Cairkan Dana", callback_data=f"release_funds_{tx_code}")]
     ])
 
+    # Funds waiting to be released are always pushed, also in dashboard mode.
+    admin_dashboard.mark_dirty()
     try:
         await bot.send_message(ADMIN_ID, admin_text, reply_markup=admin_keyboard, parse_mode="HTML")
     except Exception as e:
@@ -703,35 +1472,25 @@ async def release_funds(callback: CallbackQuery):
 
     tx_code = callback.data.replace("release_funds_", "")
 
-    result = supabase.table("transactions").select("*").eq("tx_code", tx_code).maybe_single().execute()
+    tx = await fetch_transaction_in(tx_code, ("completed",))
 
-    if not result.data:
-        await callback.answer("❌ Transaksi tidak ditemukan", show_alert=True)
+    if not tx or tx["status"] != "completed":
+        await callback.answer(transition_error(tx), show_alert=True)
         return
 
-    tx = result.data
-
-    seller_text = (
-        f"💸 <b>DANA TELAH DICAIRKAN</b>\n\n"
-        f"📋 Kode: <code>{tx_code}</code>\n"
-        f"💰 Jumlah: {tx['price']}\n\n"
-        f"✅ Dana telah ditransfer ke rekening Anda.\n"
-        f"Silakan cek mutasi rekening/e-wallet Anda.\n\n"
-        f"🎉 Terima kasih telah menggunakan layanan rekber kami!\n"
-        f"Selamat bertransaksi kembali! 🔥"
-    )
+    seller_text = templates.SELLER_FUNDS_RELEASED.fill(tx)
 
     seller_username_clean = tx['seller_username'].replace("@", "")
 
     try:
-        result_user = supabase.table("users").select("id").eq("username", seller_username_clean).maybe_single().execute()
+        result_user = await db_exec(supabase.table("users").select("id").eq("username", seller_username_clean).maybe_single(), idempotent=True)
         if result_user.data:
             await bot.send_message(result_user.data["id"], seller_text, parse_mode="HTML")
     except Exception as e:
         log.error(f"Failed to notify seller: {e}")
 
     await callback.message.edit_text(
-        f"{callback.message.text}\n\n"
+        f"{callback.message.html_text}\n\n"
         f"💸 <b>DANA DICAIRKAN</b>\n"
         f"Seller telah diberitahu.",
         parse_mode="HTML"
@@ -743,9 +1502,12 @@ async def release_funds(callback: CallbackQuery):
 async def my_transactions_callback(callback: CallbackQuery):
     user_id = callback.from_user.id
 
-    result = supabase.table("transactions").select("*").or_(f"buyer_id.eq.{user_id},seller_id.eq.{user_id}").order("created_at", desc=True).limit(10).execute()
+    txs = tx_mirror.user_history(user_id, 10)
+    if txs is None:
+        result = await db_exec(supabase.table("transactions").select("*").or_(f"buyer_id.eq.{user_id},seller_id.eq.{user_id}").order("created_at", desc=True).limit(10), idempotent=True)
+        txs = result.data
 
-    if not result.data:
+    if not txs:
         await callback.message.edit_text(
             "📊 <b>RIWAYAT TRANSAKSI</b>\n\n"
             "Anda belum memiliki transaksi.",
@@ -755,22 +1517,10 @@ async def my_transactions_callback(callback: CallbackQuery):
         await callback.answer()
         return
 
-    text = "📊 <b>RIWAYAT TRANSAKSI</b>\n\n"
-
-    for tx in result.data[:5]:
-        status_emoji = {
-            "pending": "⏳",
-            "approved": "✅",
-            "paid": "💰",
-            "delivered": "📦",
-            "completed": "🎉",
-            "rejected": "❌",
-            "cancelled": "🚫"
-        }
-
-        text += f"{status_emoji.get(tx['status'], '•')} <code>{tx['tx_code']}</code>\n"
-        text += f"   {tx['item_description'][:30]}...\n"
-        text += f"   {tx['price']} - {tx['status']}\n\n"
+    text = templates.TX_HISTORY.render(items=render_list(
+        templates.TX_HISTORY_ITEM,
+        ({**tx, "emoji": TX_STATUS_EMOJI.get(tx["status"], "•")} for tx in txs[:5])
+    ))
 
     await callback.message.edit_text(text, reply_markup=back_to_menu_keyboard(), parse_mode="HTML")
     await callback.answer()
@@ -778,9 +1528,9 @@ async def my_transactions_callback(callback: CallbackQuery):
 
 @router.callback_query(F.data == "view_payments")
 async def view_payments_callback(callback: CallbackQuery):
-    result = supabase.table("payment_methods").select("*").eq("is_active", True).execute()
+    methods = await fetch_active_payment_methods()
 
-    if not result.data:
+    if not methods:
         await callback.message.edit_text(
             "💳 <b>METODE PEMBAYARAN</b>\n\n"
             "Belum ada metode pembayaran tersedia.",
@@ -790,24 +1540,7 @@ async def view_payments_callback(callback: CallbackQuery):
         await callback.answer()
         return
 
-    banks = [pm for pm in result.data if pm["type"] == "bank"]
-    ewallets = [pm for pm in result.data if pm["type"] == "ewallet"]
-
-    text = "💳 <b>METODE PEMBAYARAN</b>\n\n"
-
-    if banks:
-        text += "🏦 <b>BANK:</b>\n"
-        for bank in banks:
-            text += f"• {bank['name']}\n"
-            text += f"  {bank['account_number']}\n"
-            text += f"  a/n {bank['account_name']}\n\n"
-
-    if ewallets:
-        text += "📱 <b>E-WALLET:</b>\n"
-        for ew in ewallets:
-            text += f"• {ew['name']}\n"
-            text += f"  {ew['account_number']}\n"
-            text += f"  a/n {ew['account_name']}\n\n"
+    text = payment_methods_text(methods)
 
     await callback.message.edit_text(text, reply_markup=back_to_menu_keyboard(), parse_mode="HTML")
     await callback.answer()
@@ -847,30 +1580,22 @@ async def admin_pending_transactions(callback: CallbackQuery):
         await callback.answer("⛔ Akses ditolak", show_alert=True)
         return
 
-    result = supabase.table("transactions").select("*").in_("status", ["pending", "approved", "paid", "delivered"]).order("created_at", desc=True).execute()
+    txs = await fetch_active_transactions()
 
-    if not result.data:
+    if not txs:
         await callback.message.edit_text(
             "📋 <b>TRANSAKSI AKTIF</b>\n\n"
             "Tidak ada transaksi aktif.",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="⬅️ Kembali", callback_data="admin_panel")]
-            ]),
+            reply_markup=BACK_TO_ADMIN_KEYBOARD,
             parse_mode="HTML"
         )
         await callback.answer()
         return
 
-    text = "📋 <b>TRANSAKSI AKTIF</b>\n\n"
-
-    for tx in result.data[:10]:
-        text += f"• <code>{tx['tx_code']}</code>\n"
-        text += f"  Status: {tx['status']}\n"
-        text += f"  {tx['price']}\n\n"
-
     await callback.message.edit_text(
-        text,
+        templates.ACTIVE_TRANSACTIONS.render(items=render_list(templates.ACTIVE_TRANSACTION_ITEM, txs[:10])),
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="☑️ Aksi Massal", callback_data="bulk_menu")],
             [InlineKeyboardButton(text="⬅️ Kembali", callback_data="admin_panel")]
         ]),
         parse_mode="HTML"
@@ -884,16 +1609,12 @@ async def admin_payments_menu(callback: CallbackQuery):
         await callback.answer("⛔ Akses ditolak", show_alert=True)
         return
 
-    result = supabase.table("payment_methods").select("*").execute()
+    result = await db_exec(supabase.table("payment_methods").select("*"), idempotent=True)
 
-    text = "💳 <b>KELOLA METODE PEMBAYARAN</b>\n\n"
-
-    if result.data:
-        for pm in result.data:
-            status = "✅" if pm["is_active"] else "❌"
-            text += f"{status} {pm['type']}: {pm['name']} - {pm['account_number']}\n"
-    else:
-        text += "Belum ada metode pembayaran.\n"
+    text = templates.ADMIN_PAYMENT_METHODS.render(items=render_list(
+        templates.ADMIN_PAYMENT_METHOD_ITEM,
+        ({**pm, "active": "✅" if pm["is_active"] else "❌"} for pm in result.data)
+    ) if result.data else "Belum ada metode pembayaran.\n")
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➕ Tambah Bank", callback_data="admin_add_bank")],
@@ -945,7 +1666,7 @@ async def admin_add_ewallet_request(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.message(AdminStates.add_payment)
+@router.message(AdminStates.add_payment, F.text)
 async def process_add_payment(message: Message, state: FSMContext):
     if not await is_user_admin(message.from_user.id):
         return
@@ -971,17 +1692,15 @@ async def process_add_payment(message: Message, state: FSMContext):
         "is_active": True
     }
 
-    supabase.table("payment_methods").insert(pm_data).execute()
+    await db_exec(supabase.table("payment_methods").insert(pm_data))
+    invalidate_payment_methods()
 
     await message.answer(
-        f"✅ Metode pembayaran berhasil ditambahkan!\n\n"
-        f"Type: {payment_type}\n"
-        f"Nama: {name}\n"
-        f"Nomor: {account_number}\n"
-        f"a/n: {account_name}",
+        templates.PAYMENT_METHOD_ADDED.fill(pm_data),
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🏠 Admin Panel", callback_data="admin_panel")]
-        ])
+        ]),
+        parse_mode="HTML"
     )
 
     await state.clear()
@@ -1009,9 +1728,15 @@ async def process_broadcast(message: Message, state: FSMContext):
     if not await is_user_admin(message.from_user.id):
         return
 
-    result = supabase.table("users").select("id").execute()
+    result = await db_exec(supabase.table("users").select("id"), idempotent=True)
     user_ids = [u["id"] for u in result.data] if result.data else []
 
+    await state.clear()
+    await message.answer(f"⏳ Broadcast ke {len(user_ids)} user dimulai...")
+    start_admin_job(run_broadcast(message, user_ids))
+
+
+async def run_broadcast(message: Message, user_ids: list):
     success = 0
     failed = 0
 
@@ -1037,8 +1762,6 @@ async def process_broadcast(message: Message, state: FSMContext):
         ])
     )
 
-    await state.clear()
-
 
 @router.callback_query(F.data == "admin_stats")
 async def admin_stats_callback(callback: CallbackQuery):
@@ -1046,8 +1769,8 @@ async def admin_stats_callback(callback: CallbackQuery):
         await callback.answer("⛔ Akses ditolak", show_alert=True)
         return
 
-    users_result = supabase.table("users").select("id", count="exact").execute()
-    tx_result = supabase.table("transactions").select("status", count="exact").execute()
+    users_result = await db_exec(supabase.table("users").select("id", count="exact"), idempotent=True)
+    tx_result = await db_exec(supabase.table("transactions").select("status", count="exact"), idempotent=True)
 
     total_users = users_result.count if users_result.count else 0
     total_tx = tx_result.count if tx_result.count else 0
@@ -1055,21 +1778,52 @@ async def admin_stats_callback(callback: CallbackQuery):
     completed = len([t for t in tx_result.data if t["status"] == "completed"]) if tx_result.data else 0
     pending = len([t for t in tx_result.data if t["status"] == "pending"]) if tx_result.data else 0
 
+    flight = read_flight.stats()
+
     text = (
         f"📊 <b>STATISTIK</b>\n\n"
         f"👥 Total User: {total_users}\n"
         f"📋 Total Transaksi: {total_tx}\n"
         f"✅ Selesai: {completed}\n"
-        f"⏳ Pending: {pending}"
+        f"⏳ Pending: {pending}\n\n"
+        f"⚡ Read hits: {flight['hits']} (coalesced: {flight['coalesced']})"
     )
-
-    await callback.message.edit_text(
-        text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="⬅️ Kembali", callback_data="admin_panel")]
-        ]),
-        parse_mode="HTML"
+    db = db_transport.stats()
+    tg = bot.session.stats()
+    text += (
+        f"\n🔌 Supabase: {db['in_flight']}/{db['pool_size']} koneksi "
+        f"(puncak: {db['peak_in_flight']}, gagal: {db['failures']}, circuit: {db['breaker']})"
+        f"\n📡 Telegram: {tg['in_flight']}/{tg['pool_size']} koneksi (puncak: {tg['peak_in_flight']})"
+    )
+    trace = tracer.stats()
+    text += f"\n🐢 Update lambat (>{SLOW_UPDATE_MS:.0f} ms): {trace['slow']} dari {trace['traces']}"
+    lag = loop_monitor.stats()
+    text += f"\n⏱️ Event loop macet (>{LOOP_LAG_THRESHOLD_MS:.0f} ms): {lag['stalls']}x, lag maks {lag['max_lag_ms']:.0f} ms"
+    mirror = tx_mirror.stats()
+    text += f"\n🗂️ Mirror transaksi: {mirror['rows']} baris (hit: {mirror['hits']}, miss: {mirror['misses']})"
+    cache = tx_cache.stats()
+    text += f"\n💾 Cache transaksi: {cache['rows']}/{cache['max_size']} (hit: {cache['hits']}, miss: {cache['misses']})"
+    fsm = storage.stats()
+    busiest = ", ".join(
+        f"{name.split(':')[-1]} {count}" for name, count in sorted(fsm["states"].items(), key=lambda item: -item[1])[:3]
     )
+    text += (
+        f"\n🧠 Sesi FSM: {fsm['live']}/{fsm['max_entries']} (puncak: {fsm['peak']}, "
+        f"kedaluwarsa: {fsm['expired']}, dibuang: {fsm['evicted']})"
+        + (f"\n   {html.escape(busiest)}" if busiest else "")
+    )
+    if admin_dashboard.messages:
+        dash = admin_dashboard.stats()
+        text += f"\n🖥️ Dashboard: {dash['marks']} event → {dash['edits']} edit"
+    if update_scheduler:
+        sched = update_scheduler.stats()
+        text += (
+            f"\n🧵 Antrian update: {sched['pending']} (jalan: {sched['running']}, "
+            f"puncak: {sched['peak_pending']}, lane terdalam: {sched['max_lane_depth']}, "
+            f"ditolak: {sched['refused']})"
+        )
+
+    await callback.message.edit_text(text, reply_markup=BACK_TO_ADMIN_KEYBOARD, parse_mode="HTML")
     await callback.answer()
 
 
@@ -1114,17 +1868,247 @@ async def close_callback(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-async def main():
+@dp.errors(ExceptionTypeFilter(DatabaseUnavailableError))
+async def database_unavailable_handler(event: ErrorEvent):
+    log.warning(f"Update {event.update.update_id} failed fast: {type(event.exception).__name__}")
+    text = "⚠️ Server sedang sibuk. Silakan coba lagi dalam beberapa saat."
+    try:
+        if event.update.callback_query:
+            await event.update.callback_query.answer(text, show_alert=True)
+        elif event.update.message:
+            await event.update.message.answer(text)
+    except Exception:
+        pass
+    return True
+
+
+async def ensure_main_admin():
+    await db_exec(supabase.table("users").upsert({"id": ADMIN_ID, "is_admin": True}))
+    await refresh_admin_ids()
+
+
+async def load_proof_hashes(page_size: int = 1000):
+    offset = 0
+    while True:
+        result = await db_exec(
+            supabase.table("transactions").select("tx_code, proof_phash")
+            .not_.is_("proof_phash", "null").order("id").range(offset, offset + page_size - 1),
+            idempotent=True
+        )
+        proof_pipeline.load(result.data or [])
+        if len(result.data or []) < page_size:
+            return
+        offset += page_size
+
+
+async def sync_tx_mirror(page_size: int = 1000):
+    if not tx_mirror.synced:
+        window_start = tx_mirror.window_start()
+        if window_start:
+            # Read only what the mirror keeps, so a large history never has to fit in memory.
+            scans = (
+                lambda query: query.in_("status", ACTIVE_STATUSES),
+                lambda query: query.gte("updated_at", window_start),
+            )
+        else:
+            scans = (None,)
+        for where in scans:
+            async for rows in iter_pages(supabase, "transactions", page_size, db_page, where):
+                tx_mirror.upsert_many(rows, advance_cursor=True)
+        tx_mirror.evict_expired()
+        tx_mirror.synced = True
+        log.info(f"Transaction mirror loaded: {len(tx_mirror)} rows")
+        return
+
+    while True:
+        cursor = tx_mirror.cursor
+        query = supabase.table("transactions").select("*").order("updated_at").limit(page_size)
+        if cursor:
+            query = query.gte("updated_at", cursor)
+        result = await db_exec(query, idempotent=True)
+        tx_mirror.upsert_many(result.data, advance_cursor=True)
+        # Rows sharing the cursor timestamp are re-read; stop once it no longer moves.
+        if len(result.data or []) < page_size or tx_mirror.cursor == cursor:
+            break
+    tx_mirror.evict_expired()
+
+
+async def tx_mirror_loop():
+    while True:
+        try:
+            await sync_tx_mirror()
+        except Exception as e:
+            log.error(f"Transaction mirror sync failed: {e}")
+        await asyncio.sleep(TX_MIRROR_SYNC_INTERVAL)
+
+
+async def notify_buyer_expired(tx: dict):
+    await bot.send_message(
+        tx["buyer_id"],
+        templates.BUYER_EXPIRED.fill(tx),
+        reply_markup=back_to_menu_keyboard(),
+        parse_mode="HTML"
+    )
+
+
+async def expire_stale_transactions() -> int:
+    """Cancel transactions stuck in a status longer than its TTL, one batch at a time.
+
+    Each batch is one expire_stale_transactions() call (a single UPDATE ...
+    RETURNING on the database side) followed by one bulk log insert.
+    """
+    expired = []
+    for status, hours in EXPIRY_TTL_HOURS.items():
+        if hours <= 0:
+            continue
+        cutoff = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+        while True:
+            result = await db_exec(supabase.rpc("expire_stale_transactions", {
+                "p_status": status,
+                "p_older_than": cutoff,
+                "p_limit": EXPIRY_BATCH_SIZE
+            }))
+            rows = result.data or []
+            if not rows:
+                break
+            remember_tx_rows(rows)
+            await db_exec(supabase.table("transaction_logs").insert([
+                {
+                    "transaction_id": tx["id"],
+                    "action": "cancelled",
+                    "actor_id": None,
+                    "notes": f"Expired after {hours:g}h in {status}"
+                }
+                for tx in rows
+            ]))
+            expired.extend(rows)
+            if len(rows) < EXPIRY_BATCH_SIZE:
+                break
+
+    if expired:
+        log.info(f"Expired {len(expired)} stale transaction(s)")
+        admin_dashboard.mark_dirty()
+        await send_all([lambda tx=tx: notify_buyer_expired(tx) for tx in expired], notify_limiter)
+    return len(expired)
+
+
+async def notify_session_expired(chat_id: int):
+    await bot.send_message(
+        chat_id,
+        "⌛ <b>SESI BERAKHIR</b>\n\n"
+        "Tidak ada aktivitas, jadi proses sebelumnya dibatalkan.\n"
+        "Silakan mulai lagi dari menu utama.",
+        reply_markup=back_to_menu_keyboard(),
+        parse_mode="HTML"
+    )
+
+
+async def fsm_reaper_loop():
+    while True:
+        await asyncio.sleep(FSM_REAP_INTERVAL)
+        expired = storage.reap()
+        if not expired:
+            continue
+        log.info(f"Reaped {len(expired)} idle conversation(s)")
+        if FSM_EXPIRY_NOTICE:
+            # Leftover data without a state (e.g. a bulk selection) isn't worth a message.
+            chats = {key.chat_id for key, state, _ in expired if state is not None}
+            await send_all([lambda chat_id=chat_id: notify_session_expired(chat_id) for chat_id in chats], notify_limiter)
+
+
+async def expiry_sweeper_loop():
+    while True:
+        await asyncio.sleep(EXPIRY_SWEEP_INTERVAL)
+        try:
+            await expire_stale_transactions()
+        except Exception as e:
+            log.error(f"Expiry sweep failed: {e}")
+
+
+async def timed(name: str, coro):
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        log.info(f"Warm-up {name}: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+async def warm_up():
+    # Polling starts only after this returns, so the first updates after a
+    # deploy are served from warm caches.
+    await asyncio.to_thread(supabase.get)
+    proof_pipeline.start()
+    me, *_ = await asyncio.gather(
+        timed("bot info", bot.me()),
+        timed("admins", ensure_main_admin()),
+        timed("payment methods", fetch_active_payment_methods()),
+        timed("proof hashes", load_proof_hashes()),
+    )
+    log.info(f"Warm-up done as @{me.username}, {len(admin_cache['ids'])} admin(s)")
+
+
+def setup_dispatcher():
+    global update_scheduler
     dp.include_router(router)
 
-    result = supabase.table("users").update({"is_admin": True}).eq("id", ADMIN_ID).execute()
-    if not result.data:
-        await get_or_create_user(ADMIN_ID)
-        supabase.table("users").update({"is_admin": True}).eq("id", ADMIN_ID).execute()
+    if update_recorder:
+        dp.update.outer_middleware(update_recorder)
+    update_scheduler = LaneScheduler(MAX_CONCURRENT_UPDATES, MAX_PENDING_UPDATES, MAX_LANE_PENDING)
+    # Duplicates are dropped before they are queued; a press on a transaction
+    # that already has one queued or running in its lane is a concurrent press.
+    idempotency.tx_busy = lambda tx_code: update_scheduler.depth(f"tx:{tx_code}") > 0
+    if IDEMPOTENCY_STATE_PATH:
+        idempotency.load(IDEMPOTENCY_STATE_PATH)
+    dp.update.outer_middleware(idempotency)
+    dp.update.outer_middleware(SchedulerMiddleware(update_scheduler))
+    dp.update.outer_middleware(TracingMiddleware(tracer))
+    # Scheduled handlers run after the dispatcher's own ErrorsMiddleware has
+    # returned, so errors handlers need a second one inside the scheduler.
+    dp.update.outer_middleware(ErrorsMiddleware(dp))
+
+
+def start_background_tasks(sweep_expired: bool = True):
+    tasks = [
+        asyncio.create_task(tx_mirror_loop()),
+        asyncio.create_task(loop_monitor.run()),
+        asyncio.create_task(fsm_reaper_loop()),
+    ]
+    if sweep_expired:
+        tasks.append(asyncio.create_task(expiry_sweeper_loop()))
+    return tasks
+
+
+async def shutdown(background_tasks):
+    for task in background_tasks:
+        task.cancel()
+    await update_scheduler.drain()
+    if IDEMPOTENCY_STATE_PATH:
+        idempotency.save(IDEMPOTENCY_STATE_PATH)
+    for task in list(admin_jobs):
+        task.cancel()
+    db_transport.shutdown()
+    proof_pipeline.shutdown()
+    if update_recorder:
+        update_recorder.flush()
+
+
+async def main():
+    setup_dispatcher()
+    await warm_up()
+    background_tasks = start_background_tasks()
 
-    log.info("🤖 Bot started successfully!")
-    await dp.start_polling(bot)
+    log.info(f"🤖 Bot started successfully! Ready in {(time.perf_counter() - STARTED_AT) * 1000:.0f} ms")
+    try:
+        # Updates are handed to update_scheduler, so polling itself stays sequential
+        # and blocks only when the scheduler is full.
+        await dp.start_polling(bot, handle_as_tasks=False)
+    finally:
+        await shutdown(background_tasks)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if BOT_WORKERS > 1:
+        from sharding import run_front
+        asyncio.run(run_front(TOKEN, BOT_WORKERS))
+    else:
+        asyncio.run(main())
@@ -0,0 +1,18 @@
+class LazyClient:
+    """Build the wrapped client on first attribute access instead of at import time."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+
+    @property
+    def ready(self) -> bool:
+        return self._client is not None
+
+    def get(self):
+        if self._client is None:
+            self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
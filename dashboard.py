@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+
+from aiogram.exceptions import TelegramBadRequest
+
+log = logging.getLogger(__name__)
+
+
+class LiveDashboard:
+    """One pinned message per admin, re-rendered at most once every `interval` seconds.
+
+    Events call `mark_dirty()`; all marks that arrive while a refresh is
+    pending collapse into that single refresh, which renders once and edits
+    every admin's message. Marks that arrive while it is rendering or
+    editing get one more refresh after it.
+
+    With several processes, the one holding an admin's dashboard tells the
+    others through `listeners` (called with admin_id, active) and they
+    record it with `set_remote()`, so every process knows not to send that
+    admin per-event messages.
+    """
+
+    def __init__(self, bot, render, interval: float = 5.0):
+        self.bot = bot
+        self.render = render
+        self.interval = interval
+        self.messages = {}
+        self.remote = set()
+        self.listeners = []
+        self._last_flush = 0.0
+        self._pending = None
+        self._dirty = False
+        self.marks = 0
+        self.edits = 0
+
+    def active_for(self, admin_id: int) -> bool:
+        return admin_id in self.messages or admin_id in self.remote
+
+    def set_remote(self, admin_id: int, active: bool):
+        if active:
+            self.remote.add(admin_id)
+        else:
+            self.remote.discard(admin_id)
+
+    def _announce(self, admin_id: int, active: bool):
+        for listener in self.listeners:
+            listener(admin_id, active)
+
+    def owns(self, message) -> bool:
+        return message is not None and self.messages.get(message.chat.id) == message.message_id
+
+    async def attach(self, admin_id: int):
+        text, markup = await self.render()
+        message = await self.bot.send_message(admin_id, text, reply_markup=markup, parse_mode="HTML")
+        try:
+            await self.bot.pin_chat_message(admin_id, message.message_id, disable_notification=True)
+        except TelegramBadRequest as e:
+            log.warning(f"Could not pin dashboard for {admin_id}: {e}")
+        self.messages[admin_id] = message.message_id
+        self.remote.discard(admin_id)
+        self._announce(admin_id, True)
+
+    def detach(self, admin_id: int):
+        self.messages.pop(admin_id, None)
+        self.remote.discard(admin_id)
+        self._announce(admin_id, False)
+
+    def mark_dirty(self):
+        if not self.messages:
+            return
+        self.marks += 1
+        self._dirty = True
+        if self._pending is None or self._pending.done():
+            self._pending = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        while self._dirty and self.messages:
+            delay = self._last_flush + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+            try:
+                await self.refresh()
+            except Exception as e:
+                log.error(f"Dashboard refresh failed: {e}")
+
+    async def refresh(self):
+        text, markup = await self.render()
+        for admin_id, message_id in list(self.messages.items()):
+            try:
+                await self.bot.edit_message_text(
+                    text, chat_id=admin_id, message_id=message_id, reply_markup=markup, parse_mode="HTML"
+                )
+                self.edits += 1
+            except TelegramBadRequest as e:
+                if "not modified" not in str(e):
+                    log.warning(f"Dashboard message for {admin_id} is gone, falling back to messages: {e}")
+                    self.detach(admin_id)
+
+    def stats(self) -> dict:
+        return {"admins": len(self.messages), "marks": self.marks, "edits": self.edits}
@@ -0,0 +1,90 @@
+import asyncio
+import csv
+import gzip
+import json
+import os
+from datetime import datetime
+
+EXPORTS_DIR = "exports"
+EXPORT_TABLES = ("transactions", "transaction_logs")
+EXPORT_FORMATS = ("csv", "jsonl")
+PAGE_SIZE = 1000
+
+
+async def _execute_in_thread(query):
+    return await asyncio.to_thread(query.execute)
+
+
+def _page_query(client, table: str, after: tuple, page_size: int, where=None):
+    query = client.table(table).select("*")
+    if where:
+        query = where(query)
+    query = query.order("created_at").order("id")
+    if after:
+        created_at, row_id = after
+        # The gte bound lets the (created_at, id) index seek to the page
+        # start; the OR alone is only a filter and rescans earlier rows.
+        query = query.gte("created_at", created_at).or_(
+            f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt.{row_id})'
+        )
+    return query.limit(page_size)
+
+
+async def iter_pages(client, table: str, page_size: int = PAGE_SIZE, execute=_execute_in_thread, where=None):
+    """Yield pages of `table` ordered by (created_at, id) using keyset pagination.
+
+    `execute` is a coroutine function that runs a query and returns its
+    response; by default the query runs on a plain worker thread. `where`
+    optionally adds filters to every page query.
+    """
+    after = None
+    while True:
+        result = await execute(_page_query(client, table, after, page_size, where))
+        rows = result.data or []
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
+        after = (last["created_at"], last["id"])
+
+
+async def export_table(
+    client, table: str, fmt: str = "csv", progress=None, page_size: int = PAGE_SIZE, execute=_execute_in_thread
+):
+    """Stream `table` into a gzip file under EXPORTS_DIR and return (path, row_count).
+
+    Only one page is held in memory at a time. `progress` is an optional
+    coroutine function called with the running row count after every page;
+    `execute` is passed on to iter_pages.
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown export table: {table}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    os.makedirs(EXPORTS_DIR, exist_ok=True)
+    path = os.path.join(EXPORTS_DIR, f"{table}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{fmt}.gz")
+
+    count = 0
+    writer = None
+    try:
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as fh:
+            async for rows in iter_pages(client, table, page_size, execute):
+                if fmt == "csv":
+                    if writer is None:
+                        writer = csv.DictWriter(fh, fieldnames=list(rows[0].keys()), extrasaction="ignore")
+                        writer.writeheader()
+                    writer.writerows(rows)
+                else:
+                    fh.write("".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows))
+                count += len(rows)
+                if progress:
+                    await progress(count)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    return path, count
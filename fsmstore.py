@@ -0,0 +1,131 @@
+import heapq
+import itertools
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+
+class ExpiringMemoryStorage(BaseStorage):
+    """In-memory FSM storage whose conversations time out and whose size is capped.
+
+    Every write (re)arms the entry's deadline from `timeouts` (per state
+    name, falling back to `default_timeout`); deadlines sit in a min-heap
+    so `reap()` only touches entries that are actually due. Stale heap
+    items are skipped lazily and the heap is rebuilt once they dominate.
+    Beyond `max_entries` the least recently used entry is dropped. Unlike
+    aiogram's MemoryStorage, reading a key that has no state or data
+    doesn't create a record for it.
+    """
+
+    def __init__(self, timeouts: Dict[str, float] = None, default_timeout: float = 3600,
+                 max_entries: int = 100000):
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self.max_entries = max_entries
+        # key -> [state, data, deadline], most recently used last.
+        self._entries = OrderedDict()
+        self._heap = []
+        self._seq = itertools.count()
+        self._states = Counter()
+        self.peak = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def close(self) -> None:
+        pass
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        entry = self._entries.get(key)
+        if entry is None:
+            if state is not None:
+                self._store(key, state, {})
+            return
+        self._count(entry[0], -1)
+        entry[0] = state
+        self._count(state, 1)
+        self._touch(key, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            if data:
+                self._store(key, None, data.copy())
+            return
+        entry[1] = data.copy()
+        self._touch(key, entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return {}
+        self._entries.move_to_end(key)
+        return entry[1].copy()
+
+    def _count(self, state: Optional[str], delta: int):
+        if state is not None:
+            self._states[state] += delta
+            if not self._states[state]:
+                del self._states[state]
+
+    def _store(self, key: StorageKey, state: Optional[str], data: dict):
+        entry = [state, data, 0.0]
+        self._entries[key] = entry
+        self._count(state, 1)
+        self._touch(key, entry)
+        while len(self._entries) > self.max_entries:
+            _, (old_state, _, _) = self._entries.popitem(last=False)
+            self._count(old_state, -1)
+            self.evicted += 1
+        self.peak = max(self.peak, len(self._entries))
+
+    def _touch(self, key: StorageKey, entry: list):
+        if entry[0] is None and not entry[1]:
+            # Cleared conversations (state.clear()) leave nothing behind.
+            del self._entries[key]
+            return
+        entry[2] = time.monotonic() + self.timeouts.get(entry[0], self.default_timeout)
+        self._entries.move_to_end(key)
+        heapq.heappush(self._heap, (entry[2], next(self._seq), key))
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(e[2], next(self._seq), k) for k, e in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def reap(self, now: float = None) -> list:
+        """Drop every entry past its deadline; return them as (key, state, data)."""
+        now = time.monotonic() if now is None else now
+        reaped = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is None or entry[2] != deadline:
+                continue
+            del self._entries[key]
+            self._count(entry[0], -1)
+            reaped.append((key, entry[0], entry[1]))
+        self.expired += len(reaped)
+        return reaped
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self._entries),
+            "max_entries": self.max_entries,
+            "peak": self.peak,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "heap": len(self._heap),
+            "states": dict(self._states),
+        }
@@ -0,0 +1,160 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+# Buttons meant to be pressed repeatedly, e.g. selection toggles.
+REPEATABLE_PREFIXES = ("bulk_toggle_",)
+
+TX_ACTION_PREFIXES = (
+    "approve_",
+    "reject_",
+    "notify_seller_",
+    "seller_sent_",
+    "buyer_confirm_",
+    "release_funds_",
+)
+
+
+class RecentKeys:
+    """Bounded set of keys that expire `window` seconds after they were added."""
+
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.max_size = max_size
+        self._keys = OrderedDict()
+
+    def seen(self, key) -> bool:
+        """Return True if `key` was added within the window, otherwise add it."""
+        now = time.monotonic()
+        self._expire(now)
+        if key in self._keys:
+            return True
+        self._keys[key] = now
+        while len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
+        return False
+
+    def _expire(self, now: float):
+        while self._keys:
+            key, added = next(iter(self._keys.items()))
+            if now - added < self.window:
+                break
+            self._keys.popitem(last=False)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def tx_code_from_callback(data: str):
+    for prefix in TX_ACTION_PREFIXES:
+        if data.startswith(prefix):
+            return data[len(prefix):]
+    return None
+
+
+class IdempotencyMiddleware(BaseMiddleware):
+    """Drop redelivered updates, double-tapped buttons and concurrent presses on one transaction.
+
+    In front of an update scheduler, `tx_busy(tx_code)` should report
+    whether a press on that transaction is already queued or running there;
+    without it, presses are tracked while the handler runs inline.
+    Seen update_ids live in memory. `save()` / `load()` carry the highest
+    one across a restart, so updates Telegram redelivers because their
+    offset was never confirmed aren't handled twice.
+    """
+
+    def __init__(self, window: float = 5.0, update_window: float = 300.0, max_size: int = 10000,
+                 tx_busy: Callable[[str], bool] = None):
+        self.updates = RecentKeys(window=update_window, max_size=max_size)
+        self.callbacks = RecentKeys(window=window, max_size=max_size)
+        self.tx_busy = tx_busy
+        self.tx_inflight = set()
+        self.floor = 0
+        self.last_update_id = 0
+        self.dropped = 0
+
+    def load(self, path: str, max_age: float = 86400.0):
+        """Drop updates up to the update_id a previous run saved to `path`.
+
+        Telegram picks update_ids at random after a week without updates,
+        so a saved id older than `max_age` seconds is ignored.
+        """
+        try:
+            with open(path) as fh:
+                saved = json.load(fh)
+        except (OSError, ValueError):
+            return
+        if time.time() - saved.get("saved_at", 0) < max_age:
+            self.floor = self.last_update_id = saved.get("update_id", 0)
+
+    def save(self, path: str):
+        """Write the highest update_id seen to `path`; call once every update has been handled."""
+        if not self.last_update_id:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w") as fh:
+            json.dump({"update_id": self.last_update_id, "saved_at": time.time()}, fh)
+        os.replace(path + ".tmp", path)
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        if event.update_id <= self.floor or self.updates.seen(event.update_id):
+            self.dropped += 1
+            return None
+        self.last_update_id = max(self.last_update_id, event.update_id)
+
+        callback = event.callback_query
+        if callback is None or not callback.data:
+            return await handler(event, data)
+
+        repeatable = callback.data.startswith(REPEATABLE_PREFIXES)
+        if not repeatable and self.callbacks.seen((callback.from_user.id, callback.data)):
+            self.dropped += 1
+            await self._answer_busy(callback)
+            return None
+
+        tx_code = tx_code_from_callback(callback.data)
+        if tx_code is None:
+            return await handler(event, data)
+
+        if self.tx_busy is not None:
+            if self.tx_busy(tx_code):
+                self.dropped += 1
+                await self._answer_busy(callback)
+                return None
+            return await handler(event, data)
+
+        if tx_code in self.tx_inflight:
+            self.dropped += 1
+            await self._answer_busy(callback)
+            return None
+
+        self.tx_inflight.add(tx_code)
+        try:
+            return await handler(event, data)
+        finally:
+            self.tx_inflight.discard(tx_code)
+
+    @staticmethod
+    async def _answer_busy(callback):
+        try:
+            await callback.answer("⏳ Sedang diproses...")
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "dropped": self.dropped,
+            "tracked_updates": len(self.updates),
+            "tracked_callbacks": len(self.callbacks),
+            "tx_inflight": len(self.tx_inflight),
+        }
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def send_all(jobs, limiter: RateLimiter, concurrency: int = 10):
+    """Run notification coroutine factories concurrently under `limiter`.
+
+    Returns (sent, failed); failures are logged, never raised.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                await job()
+                return True
+            except Exception as e:
+                log.error(f"Failed to send notification: {e}")
+                return False
+
+    results = await asyncio.gather(*(run(job) for job in jobs))
+    sent = sum(results)
+    return sent, len(results) - sent
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+log = logging.getLogger(__name__)
+
+# Leaf frames that mean the loop was waiting for I/O rather than running code.
+IDLE_FRAMES = ("select", "poll", "epoll", "kqueue", "_run_once")
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame) -> str:
+    """Root-to-leaf stack of `frame` in the folded format flamegraph.pl and speedscope read."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Statistical profiler for the event loop thread.
+
+    A daemon thread reads the loop thread's current stack every `interval`
+    seconds, so overhead is one stack walk per sample regardless of how much
+    code runs. Since the loop runs one task step at a time, each sample is
+    the stack of whichever coroutine (or the selector, when idle) held the
+    loop at that instant.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self.total = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._thread_id = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """Start sampling the calling thread; call this from the event loop."""
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        self.samples = Counter()
+        self.total = 0
+        self.started_at = time.monotonic()
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.duration = time.monotonic() - self.started_at
+
+    async def profile(self, seconds: float):
+        self.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.stop()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.samples[collapse_stack(frame)] += 1
+                self.total += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def top(self, n: int = 15):
+        """[(label, self_samples, inclusive_samples)] of the busiest non-idle functions."""
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in self.samples.items():
+            labels = stack.split(";")
+            if labels[-1].split(" ", 1)[0] in IDLE_FRAMES:
+                continue
+            own[labels[-1]] += count
+            for label in set(labels):
+                inclusive[label] += count
+        return [(label, count, inclusive[label]) for label, count in own.most_common(n)]
+
+    def idle_samples(self) -> int:
+        return sum(
+            count for stack, count in self.samples.items()
+            if stack.rsplit(";", 1)[-1].split(" ", 1)[0] in IDLE_FRAMES
+        )
+
+
+class LoopLagMonitor:
+    """Reports event loop stalls longer than `threshold` seconds.
+
+    A coroutine stamps a heartbeat every `interval`. A watchdog thread
+    notices when the stamp goes stale and grabs the loop thread's stack
+    while it is still blocked, which is the stack that caused the stall.
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.05, keep: int = 20):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = 0
+        self.max_lag_ms = 0.0
+        self.recent = deque(maxlen=keep)
+        self._beat = None
+        self._blocked = None
+        self._thread_id = None
+        self._stop = threading.Event()
+
+    async def run(self):
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        threading.Thread(target=self._watch, name="loop-lag-monitor", daemon=True).start()
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                lag = now - self._beat - self.interval
+                beat, self._beat = self._beat, now
+                self.max_lag_ms = max(self.max_lag_ms, lag * 1000)
+                stall = self._blocked
+                if stall is not None and stall["beat"] == beat:
+                    self._blocked = None
+                    stall["lag_ms"] = lag * 1000
+                    log.warning(f"Event loop was blocked for {stall['lag_ms']:.0f} ms")
+        finally:
+            self._stop.set()
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            if beat == reported or time.monotonic() - beat < self.threshold:
+                continue
+            reported = beat
+            frame = sys._current_frames().get(self._thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            stall = {"beat": beat, "at": datetime.now(timezone.utc), "lag_ms": None, "stack": stack}
+            self.stalls += 1
+            self.recent.append(stall)
+            self._blocked = stall
+            log.warning(f"Event loop blocked for more than {self.threshold * 1000:.0f} ms at:\n{stack}")
+
+    def stats(self) -> dict:
+        last = self.recent[-1] if self.recent else None
+        return {
+            "stalls": self.stalls,
+            "max_lag_ms": self.max_lag_ms,
+            "last_lag_ms": last["lag_ms"] if last else None,
+        }
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+log = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ("jpg", "jpeg", "png", "webp")
+THUMB_SIZE = (320, 320)
+THUMB_QUALITY = 70
+HASH_SIZE = 8
+# Workers must not be forked from the bot process: its threads (Supabase
+# pool, loop monitor) may hold locks that a forked child would inherit held.
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def thumb_path_for(path: str) -> str:
+    base, _ = os.path.splitext(path)
+    return f"{base}_thumb.jpg"
+
+
+def dhash(image) -> int:
+    """64-bit difference hash: compares neighbouring pixels of a 9x8 grayscale image."""
+    from PIL import Image
+
+    small = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def process_image(path: str) -> dict:
+    """Write a compressed thumbnail next to `path` and return it with the image's perceptual hash.
+
+    Runs in a worker process.
+    """
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.load()
+        phash = dhash(image)
+        thumb = image.convert("RGB")
+        thumb.thumbnail(THUMB_SIZE)
+        thumb_path = thumb_path_for(path)
+        thumb.save(thumb_path, "JPEG", quality=THUMB_QUALITY, optimize=True)
+    return {"thumb_path": thumb_path, "phash": f"{phash:016x}"}
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class HashIndex:
+    """BK-tree over 64-bit hashes for Hamming-distance nearest-neighbour lookups."""
+
+    def __init__(self):
+        self._root = None
+        self.size = 0
+
+    def add(self, value: int, tx_code: str):
+        node = [value, [tx_code], {}]
+        if self._root is None:
+            self._root = node
+            self.size += 1
+            return
+        current = self._root
+        while True:
+            distance = hamming(value, current[0])
+            if distance == 0:
+                if tx_code not in current[1]:
+                    current[1].append(tx_code)
+                return
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                self.size += 1
+                return
+            current = child
+
+    def search(self, value: int, max_distance: int):
+        """Return [(distance, tx_code)] within `max_distance`, closest first."""
+        found = []
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, tx_code) for tx_code in node[1])
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        found.sort()
+        return found
+
+
+class ProofPipeline:
+    """Thumbnail and hash payment proofs in a process pool and flag reused images.
+
+    A proof's hash joins the index through `load()` once its transaction
+    row has been written, so a rejected upload can't flag later ones.
+    """
+
+    def __init__(self, max_workers: int = 2, max_distance: int = 6):
+        self.max_workers = max_workers
+        self.max_distance = max_distance
+        self.index = HashIndex()
+        self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                self.max_workers, mp_context=multiprocessing.get_context(START_METHOD)
+            )
+        return self._executor
+
+    def start(self):
+        """Start the worker processes in the background instead of on the first upload."""
+        pool = self._pool()
+        for _ in range(self.max_workers):
+            pool.submit(os.getpid)
+
+    async def ready(self):
+        """Wait until the worker processes are up."""
+        await asyncio.get_running_loop().run_in_executor(self._pool(), os.getpid)
+
+    def load(self, rows):
+        for row in rows:
+            if row.get("proof_phash"):
+                self.index.add(int(row["proof_phash"], 16), row["tx_code"])
+
+    async def process(self, path: str, tx_code: str):
+        """Return (result, matches) for an uploaded proof, or (None, []) if it is not an image."""
+        if path.rsplit(".", 1)[-1].lower() not in IMAGE_EXTENSIONS:
+            return None, []
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._pool(), process_image, path)
+        except Exception as e:
+            log.error(f"Failed to process proof {path}: {e}")
+            return None, []
+
+        value = int(result["phash"], 16)
+        matches = [(d, code) for d, code in self.index.search(value, self.max_distance) if code != tx_code]
+        return result, matches
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
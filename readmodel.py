@@ -0,0 +1,189 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+ACTIVE_STATUSES = ("pending", "approved", "paid", "delivered")
+# Statuses a transaction may be in for the bot to move it to the key status.
+TX_TRANSITIONS = {
+    "approved": ("pending",),
+    "rejected": ("pending",),
+    "paid": ("approved", "paid"),
+    "delivered": ("paid",),
+    "completed": ("delivered",),
+}
+
+
+class TransactionMirror:
+    """In-memory, indexed copy of the `transactions` rows the bot reads most.
+
+    Holds every active transaction plus everything updated within
+    `retention_days`, or the whole table when that is None. It is fed from
+    the rows returned by the bot's own writes and from a periodic
+    incremental catch-up on `updated_at`. Only rows read by the catch-up
+    move its cursor: a write the bot made itself says nothing about rows
+    other writers changed before it.
+    Timestamps are compared as the ISO strings PostgREST returns, which
+    sort correctly as long as they share one UTC offset.
+    """
+
+    def __init__(self, retention_days: int = None):
+        self.retention = timedelta(days=retention_days) if retention_days else None
+        self.synced = False
+        self.cursor = None
+        self._by_id = {}
+        self._by_code = {}
+        self._by_user = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def window_start(self) -> str:
+        if self.retention is None:
+            return ""
+        return (datetime.now(timezone.utc) - self.retention).isoformat()
+
+    def upsert(self, row: dict, advance_cursor: bool = False):
+        old = self._by_id.get(row["id"])
+        if old is not None:
+            if (old.get("updated_at") or "") > (row.get("updated_at") or ""):
+                return
+            self._unindex(old)
+        self._by_id[row["id"]] = row
+        self._by_code[row["tx_code"]] = row
+        for user_id in (row.get("buyer_id"), row.get("seller_id")):
+            if user_id is not None:
+                self._by_user.setdefault(user_id, set()).add(row["id"])
+        updated_at = row.get("updated_at")
+        if advance_cursor and updated_at and (self.cursor is None or updated_at > self.cursor):
+            self.cursor = updated_at
+
+    def upsert_many(self, rows, advance_cursor: bool = False):
+        for row in rows or []:
+            self.upsert(row, advance_cursor)
+
+    def _unindex(self, row: dict):
+        self._by_code.pop(row["tx_code"], None)
+        for user_id in (row.get("buyer_id"), row.get("seller_id")):
+            ids = self._by_user.get(user_id)
+            if ids is not None:
+                ids.discard(row["id"])
+                if not ids:
+                    del self._by_user[user_id]
+
+    def evict_expired(self) -> int:
+        if self.retention is None:
+            return 0
+        cutoff = self.window_start()
+        expired = [
+            row for row in self._by_id.values()
+            if row["status"] not in ACTIVE_STATUSES and (row.get("updated_at") or "") < cutoff
+        ]
+        for row in expired:
+            self._unindex(row)
+            del self._by_id[row["id"]]
+        return len(expired)
+
+    def get(self, tx_code: str):
+        """Return the mirrored row, or None when the caller has to ask Supabase."""
+        row = self._by_code.get(tx_code) if self.synced else None
+        if row is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return row
+
+    def active(self):
+        """Active transactions, newest first, or None if the mirror is not synced yet."""
+        if not self.synced:
+            self.misses += 1
+            return None
+        self.hits += 1
+        rows = [row for row in self._by_id.values() if row["status"] in ACTIVE_STATUSES]
+        rows.sort(key=lambda row: row.get("created_at") or "", reverse=True)
+        return rows
+
+    def user_history(self, user_id: int, limit: int):
+        """Newest `limit` transactions of a user, or None if the mirror can't prove it has them all.
+
+        Every row created inside the retention window is mirrored, so with a
+        window the answer is complete only when at least `limit` of the
+        user's rows were created inside it.
+        """
+        if not self.synced:
+            self.misses += 1
+            return None
+        rows = sorted(
+            (self._by_id[row_id] for row_id in self._by_user.get(user_id, ())),
+            key=lambda row: row.get("created_at") or "",
+            reverse=True,
+        )[:limit]
+        if self.retention is not None:
+            if len(rows) < limit or (rows[-1].get("created_at") or "") < self.window_start():
+                self.misses += 1
+                return None
+        self.hits += 1
+        return rows
+
+    def stats(self) -> dict:
+        return {
+            "rows": len(self._by_id),
+            "synced": self.synced,
+            "cursor": self.cursor,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class TransactionCache:
+    """Bounded LRU of transaction rows, keyed by `tx_code`.
+
+    Filled from the rows PostgREST returns for the bot's own reads and
+    writes, so every transition leaves the new row behind. Like the mirror,
+    a row is never replaced by one with an older `updated_at`.
+    """
+
+    def __init__(self, max_size: int = 2000):
+        self.max_size = max_size
+        self._by_code = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._by_code)
+
+    def put(self, row: dict):
+        old = self._by_code.get(row["tx_code"])
+        if old is not None and (old.get("updated_at") or "") > (row.get("updated_at") or ""):
+            return
+        self._by_code[row["tx_code"]] = row
+        self._by_code.move_to_end(row["tx_code"])
+        while len(self._by_code) > self.max_size:
+            self._by_code.popitem(last=False)
+            self.evictions += 1
+
+    def put_many(self, rows):
+        for row in rows or []:
+            self.put(row)
+
+    def get(self, tx_code: str):
+        row = self._by_code.get(tx_code)
+        if row is None:
+            self.misses += 1
+            return None
+        self._by_code.move_to_end(tx_code)
+        self.hits += 1
+        return row
+
+    def invalidate(self, tx_code: str):
+        self._by_code.pop(tx_code, None)
+
+    def stats(self) -> dict:
+        return {
+            "rows": len(self._by_code),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
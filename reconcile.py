@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""Match bank / e-wallet mutation exports against paid transactions.
+
+A mutation CSV is streamed row by row; only incoming (credit) rows are
+considered. Each is matched against the `paid` transactions by amount,
+within a time window around when the proof was uploaded, using an index of
+paid transactions per amount sorted by time. A transaction code (RKB...)
+in the mutation's description, when present, is matched directly.
+`python reconcile.py` times a synthetic export.
+"""
+import bisect
+import csv
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+
+TX_CODE_RE = re.compile(r"RKB\d{14}", re.IGNORECASE)
+ISO_FRACTION = re.compile(r"\.(\d+)")
+ISO_SHORT_OFFSET = re.compile(r"(:\d\d(?:\.\d+)?[+-]\d\d)$")
+DATE_FORMATS = (
+    "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y",
+    "%d-%m-%Y %H:%M:%S", "%d-%m-%Y %H:%M", "%d-%m-%Y",
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S",
+    "%d/%m/%y %H:%M", "%d/%m/%y",
+)
+# Header names used by the banks' and e-wallets' exports, lowercased.
+COLUMNS = {
+    "date": ("tanggal transaksi", "tanggal", "tgl", "tgl. transaksi", "date", "transaction date", "waktu", "time"),
+    "description": ("keterangan", "deskripsi", "description", "berita", "remark", "remarks", "catatan", "detail"),
+    "amount": ("jumlah", "nominal", "amount", "mutasi", "nilai"),
+    "credit": ("kredit", "credit", "cr", "masuk", "uang masuk"),
+    "debit": ("debit", "debet", "db", "keluar", "uang keluar"),
+    "direction": ("db/cr", "cr/db", "d/k", "tipe", "type", "jenis"),
+}
+MULTIPLIERS = (("juta", 1_000_000), ("jt", 1_000_000), ("ribu", 1000), ("rb", 1000), ("k", 1000))
+SEPARATORS = re.compile(r"[.,]")
+CURRENCY = re.compile(r"(idr|rp)\.?")
+
+
+def parse_amount(text) -> Optional[int]:
+    """Whole rupiah from a bank or user-typed amount; None if there is no number.
+
+    Accepts "Rp 1.500.000", "Rp. 1.500.000", "1,500,000.00", "1.500.000,00",
+    "150rb", "1,5jt".
+    A separator followed by one or two trailing digits is the decimal point;
+    every other "." or "," groups thousands.
+    """
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return round(text)
+    value = CURRENCY.sub("", text.lower())
+    value = re.sub(r"(cr|db)$", "", re.sub(r"[\s+]", "", value))
+    multiplier = 1
+    for suffix, factor in MULTIPLIERS:
+        if value.endswith(suffix):
+            value, multiplier = value[:-len(suffix)], factor
+            break
+    negative = value.startswith("-") or (value.startswith("(") and value.endswith(")"))
+    value = value.strip("-()")
+    if not value or not value[0].isdigit():
+        return None
+
+    separators = [match.start() for match in SEPARATORS.finditer(value)]
+    if separators and 1 <= len(value) - separators[-1] - 1 <= 2:
+        whole, fraction = value[:separators[-1]], value[separators[-1] + 1:]
+    else:
+        whole, fraction = value, ""
+    try:
+        amount = Decimal(SEPARATORS.sub("", whole) + "." + (fraction or "0")) * multiplier
+    except InvalidOperation:
+        return None
+    amount = amount.to_integral_value()
+    return int(-amount if negative else amount)
+
+
+def _find_columns(header) -> Optional[dict]:
+    names = [cell.strip().lower() for cell in header]
+    columns = {}
+    for key, aliases in COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                columns[key] = names.index(alias)
+                break
+    if "amount" not in columns and "credit" not in columns:
+        return None
+    return columns
+
+
+class _DateParser:
+    """Parses mutation timestamps, remembering the format that worked last."""
+
+    def __init__(self, utc_offset: timedelta):
+        self.tz = timezone(utc_offset)
+        self.last = None
+
+    def __call__(self, text: str):
+        """(start, end) of the period a mutation happened in, as UTC timestamps, or None."""
+        text = text.strip()
+        if not text:
+            return None
+        for fmt in ((self.last,) if self.last else ()) + DATE_FORMATS:
+            try:
+                moment = datetime.strptime(text, fmt).replace(tzinfo=self.tz)
+            except ValueError:
+                continue
+            self.last = fmt
+            start = moment.timestamp()
+            # A date without a time could be any moment of that day.
+            return start, start + (86400 if "%H" not in fmt else 0)
+        return None
+
+
+def read_mutations(lines, utc_offset: timedelta = timedelta(hours=7)):
+    """Yield the credit rows of a mutation CSV as dicts, one at a time.
+
+    Lines before the header row (account number, period, ...) are skipped,
+    the delimiter is detected from the header and times are taken to be in
+    the bank's local `utc_offset`. Yields {"line", "amount", "period",
+    "description"} where "period" is a (start, end) UTC timestamp pair or None.
+    """
+    lines = iter(lines)
+    columns = None
+    number = 0
+    for number, line in enumerate(lines, 1):
+        delimiter = max(";,\t|", key=line.count)
+        header = next(csv.reader([line], delimiter=delimiter))
+        columns = _find_columns(header)
+        if columns:
+            break
+    if not columns:
+        return
+
+    parse_date = _DateParser(utc_offset)
+    width = len(header)
+    for number, row in enumerate(csv.reader(lines, delimiter=delimiter), number + 1):
+        if len(row) < width:
+            row += [""] * (width - len(row))
+        if "credit" in columns:
+            amount = parse_amount(row[columns["credit"]])
+            if not amount:
+                continue
+        else:
+            raw = row[columns["amount"]]
+            amount = parse_amount(raw)
+            direction = row[columns["direction"]].strip().lower() if "direction" in columns else raw.lower()
+            if not amount or amount < 0 or re.search(r"\b(db|d|debit|debet|keluar)\b", direction):
+                continue
+        yield {
+            "line": number,
+            "amount": amount,
+            "period": parse_date(row[columns["date"]]) if "date" in columns else None,
+            "description": row[columns["description"]].strip() if "description" in columns else "",
+        }
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse a PostgREST timestamp with datetime.fromisoformat, on any Python 3.9+.
+
+    Before 3.11 fromisoformat takes neither a "Z" suffix, a bare "+07" offset
+    nor a fraction other than 3 or 6 digits, and Postgres trims trailing zeros
+    from the fraction (".12345").
+    """
+    value = ISO_FRACTION.sub(lambda m: "." + m.group(1)[:6].ljust(6, "0"), value.strip(), count=1)
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(ISO_SHORT_OFFSET.sub(r"\1:00", value))
+
+
+def paid_at(tx: dict) -> float:
+    return parse_timestamp(tx["updated_at"]).timestamp()
+
+
+class PaymentIndex:
+    """Paid transactions by amount, each bucket sorted by when it was marked paid.
+
+    A transfer is made before its proof is uploaded, so a mutation matches a
+    transaction paid up to `before` later or `after` earlier (for clock skew
+    and bank posting delays).
+    """
+
+    def __init__(self, txs, before: timedelta = timedelta(hours=24), after: timedelta = timedelta(hours=1)):
+        self.before = before.total_seconds()
+        self.after = after.total_seconds()
+        self.by_code = {}
+        self.unpriced = []
+        buckets = {}
+        for tx in txs:
+            self.by_code[tx["tx_code"]] = tx
+            amount = parse_amount(tx.get("price"))
+            if amount is None:
+                self.unpriced.append(tx)
+                continue
+            buckets.setdefault(amount, []).append((paid_at(tx), tx["tx_code"], tx))
+        self._times = {}
+        self._txs = {}
+        for amount, entries in buckets.items():
+            entries.sort(key=lambda entry: entry[:2])
+            self._times[amount] = [entry[0] for entry in entries]
+            self._txs[amount] = [entry[2] for entry in entries]
+
+    def __len__(self):
+        return len(self.by_code)
+
+    def candidates(self, amount: int, period=None) -> list:
+        txs = self._txs.get(amount)
+        if not txs or period is None:
+            return list(txs or ())
+        times = self._times[amount]
+        start, end = period
+        low = bisect.bisect_left(times, start - self.after)
+        high = bisect.bisect_right(times, end + self.before)
+        return txs[low:high]
+
+
+def reconcile(mutations, index: PaymentIndex) -> dict:
+    """Sort mutations into matched, ambiguous and unmatched in a single pass.
+
+    A mutation naming a paid transaction's code with the right amount is
+    matched outright; otherwise it needs exactly one paid transaction of
+    that amount in its time window. When two mutations claim the same
+    transaction, neither is trusted and both become ambiguous.
+    Returns {"matched": [(mutation, tx)], "ambiguous": [(mutation, [txs])],
+    "unmatched": [mutation], "unpaid": [txs without a mutation],
+    "unpriced": [txs whose price isn't a number], "rows": n}.
+    """
+    matched = {}
+    ambiguous = []
+    unmatched = []
+    contested = set()
+    rows = 0
+    for mutation in mutations:
+        rows += 1
+        code = TX_CODE_RE.search(mutation["description"])
+        tx = index.by_code.get(code.group().upper()) if code else None
+        if tx is not None and parse_amount(tx.get("price")) == mutation["amount"]:
+            candidates = [tx]
+        else:
+            candidates = index.candidates(mutation["amount"], mutation["period"])
+
+        if not candidates:
+            unmatched.append(mutation)
+            continue
+        if len(candidates) > 1:
+            ambiguous.append((mutation, candidates))
+            continue
+        tx_code = candidates[0]["tx_code"]
+        if tx_code in contested:
+            ambiguous.append((mutation, candidates))
+        elif tx_code in matched:
+            contested.add(tx_code)
+            earlier, tx = matched.pop(tx_code)
+            ambiguous.append((earlier, [tx]))
+            ambiguous.append((mutation, candidates))
+        else:
+            matched[tx_code] = (mutation, candidates[0])
+
+    claimed = matched.keys() | {tx["tx_code"] for _, txs in ambiguous for tx in txs}
+    claimed |= {tx["tx_code"] for tx in index.unpriced}
+    return {
+        "matched": list(matched.values()),
+        "ambiguous": ambiguous,
+        "unmatched": unmatched,
+        "unpaid": [tx for code, tx in index.by_code.items() if code not in claimed],
+        "unpriced": index.unpriced,
+        "rows": rows,
+    }
+
+
+def reconcile_file(path: str, txs, before: timedelta, after: timedelta, utc_offset: timedelta) -> dict:
+    """Stream the mutation CSV at `path` and reconcile it against the paid transactions `txs`."""
+    index = PaymentIndex(txs, before, after)
+    with open(path, encoding="utf-8-sig", errors="replace", newline="") as fh:
+        return reconcile(read_mutations(fh, utc_offset), index)
+
+
+def bench(rows: int = 50000, paid: int = 5000):
+    """Reconcile a synthetic BCA-style export of `rows` credits against `paid` transactions."""
+    import os
+    import random
+    import tempfile
+
+    rng = random.Random(7)
+    now = time.time()
+    wib = timezone(timedelta(hours=7))
+    txs = []
+    lines = ["No. Rekening : 9999999999", "", "Tanggal Transaksi,Keterangan,Cabang,Jumlah,Saldo"]
+    for i in range(paid):
+        amount = rng.randrange(10, 5000) * 1000
+        at = now - rng.uniform(0, 7 * 86400)
+        txs.append({
+            "tx_code": f"RKB{i:014d}",
+            "price": f"Rp {amount:,}".replace(",", "."),
+            "updated_at": datetime.fromtimestamp(at, timezone.utc).isoformat(),
+        })
+        moment = datetime.fromtimestamp(at - rng.uniform(60, 3600), wib).strftime("%d/%m/%Y %H:%M:%S")
+        lines.append(f'{moment},"TRSF E-BANKING CR 9999/FTSCY/WS95031",0000,"{amount:,.2f} CR","0.00"')
+    for _ in range(rows - paid):
+        moment = datetime.fromtimestamp(now - rng.uniform(0, 7 * 86400), wib).strftime("%d/%m/%Y %H:%M:%S")
+        amount = rng.randrange(1, 10_000_000)
+        lines.append(f'{moment},"SWITCHING CR TRANSFER DR 009",0000,"{amount:,.2f} {rng.choice(("CR", "DB"))}","0.00"')
+
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8") as fh:
+        fh.write("\n".join(lines) + "\n")
+    try:
+        started = time.perf_counter()
+        result = reconcile_file(fh.name, txs, timedelta(hours=24), timedelta(hours=1), timedelta(hours=7))
+        elapsed = time.perf_counter() - started
+    finally:
+        os.remove(fh.name)
+    print(
+        f"{result['rows']} credit rows against {paid} paid transactions in {elapsed:.2f} s: "
+        f"{len(result['matched'])} matched, {len(result['ambiguous'])} ambiguous, "
+        f"{len(result['unmatched'])} unmatched, {len(result['unpaid'])} paid without a mutation, "
+        f"{len(result['unpriced'])} unpriced"
+    )
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,177 @@
+import gzip
+import hashlib
+import heapq
+import hmac
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+log = logging.getLogger(__name__)
+
+ID_FIELDS = ("user_id", "chat_id", "sender_chat_id")
+NAME_FIELDS = ("first_name", "last_name", "title", "bio", "phone_number", "vcard", "email")
+TEXT_FIELDS = ("text", "caption", "query")
+FILE_FIELDS = ("file_id", "file_unique_id")
+DROP_FIELDS = ("entities", "caption_entities", "contact", "location", "venue")
+# Objects whose "id" is a Telegram user or chat id.
+PERSON_OBJECTS = ("from", "from_user", "chat", "user", "sender_chat", "forward_from", "forward_from_chat")
+
+_LABEL = re.compile(r"^(\s*[\w ]{1,30}:\s*)(.*)$")
+_USERNAME = re.compile(r"@(\w+)")
+
+
+def read_recording(path: str):
+    """Yield the records of a recording in order; readable while it is still being written."""
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        try:
+            for line in fh:
+                yield json.loads(line)
+        except (EOFError, json.JSONDecodeError):
+            # The last member is cut short if the recorder is mid-flush.
+            return
+
+
+def read_recordings(paths):
+    """Merge several recordings (e.g. one per shard) into a single stream ordered by time."""
+    return heapq.merge(*(read_recording(path) for path in paths), key=lambda record: record["ts"])
+
+
+def shard_path(path: str, index: int) -> str:
+    """`logs/updates.jsonl.gz` -> `logs/updates.shard2.jsonl.gz`, so shards never share a file."""
+    directory, name = os.path.split(path)
+    stem, dot, extension = name.partition(".")
+    return os.path.join(directory, f"{stem}.shard{index}{dot}{extension}")
+
+
+class Anonymizer:
+    """Keyed pseudonymization of updates.
+
+    Ids, usernames and file ids map to stable pseudonyms (the same user is
+    the same pseudonym in every update, so per-user ordering and username
+    lookups still line up). Free text keeps its shape: form labels such as
+    "Harga:" survive, letters become "x", digits "9", and @mentions use the
+    username pseudonym. Callback data is bot-generated and kept as is.
+    """
+
+    def __init__(self, salt: bytes):
+        self.salt = salt
+
+    def _digest(self, value) -> bytes:
+        return hmac.new(self.salt, str(value).encode(), hashlib.sha256).digest()
+
+    def user_id(self, value: int) -> int:
+        pseudonym = int.from_bytes(self._digest(abs(value))[:5], "big") or 1
+        return -pseudonym if value < 0 else pseudonym
+
+    def username(self, value: str) -> str:
+        return "u" + self._digest(value.lower()).hex()[:10]
+
+    def _mask(self, text: str) -> str:
+        parts = _USERNAME.split(text)
+        masked = []
+        for i, part in enumerate(parts):
+            if i % 2:
+                masked.append("@" + self.username(part))
+            else:
+                masked.append(re.sub(r"\d", "9", re.sub(r"[^\W\d_]", "x", part)))
+        return "".join(masked)
+
+    def text(self, value: str) -> str:
+        if value.startswith("/"):
+            command, _, args = value.partition(" ")
+            return f"{command} {self._mask(args)}" if args else command
+        lines = []
+        for line in value.split("\n"):
+            match = _LABEL.match(line)
+            lines.append(match.group(1) + self._mask(match.group(2)) if match else self._mask(line))
+        return "\n".join(lines)
+
+    def scrub(self, value, key: str = None):
+        if isinstance(value, dict):
+            return {
+                k: self._field(k, v, person=key in PERSON_OBJECTS)
+                for k, v in value.items() if k not in DROP_FIELDS
+            }
+        if isinstance(value, list):
+            return [self.scrub(item, key) for item in value]
+        return value
+
+    def _field(self, key: str, value, person: bool):
+        if isinstance(value, int) and not isinstance(value, bool) and (
+            key in ID_FIELDS or (key == "id" and person)
+        ):
+            return self.user_id(value)
+        if isinstance(value, str):
+            if key == "username":
+                return self.username(value)
+            if key in NAME_FIELDS:
+                return "x" * min(len(value), 8)
+            if key in TEXT_FIELDS:
+                return self.text(value)
+            if key in FILE_FIELDS:
+                return self._digest(value).hex()[:24]
+        return self.scrub(value, key)
+
+
+class UpdateRecorder(BaseMiddleware):
+    """Appends every incoming update, anonymized, to a gzip JSON-lines log.
+
+    Each line is {"ts": unix time, "u": update} plus "a": 1 when the sender
+    was an admin, so a replay can restore admin rights. Lines are buffered
+    and written as one gzip member per flush, which keeps the file
+    append-only and readable while the bot is still running. Without a
+    fixed `salt` pseudonyms change on every restart.
+    """
+
+    def __init__(self, path: str, is_admin: Callable[[int], bool], salt: bytes = None,
+                 flush_every: int = 100, flush_interval: float = 5.0):
+        self.path = path
+        self.is_admin = is_admin
+        self.anonymizer = Anonymizer(salt or os.urandom(32))
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self._buffer = []
+        self._flushed_at = time.monotonic()
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            self.record(event, data.get("event_from_user"))
+        except Exception as e:
+            log.error(f"Failed to record update {event.update_id}: {e}")
+        return await handler(event, data)
+
+    def record(self, event: Update, user):
+        update = event.model_dump(mode="json", exclude_none=True, by_alias=True)
+        entry = {"ts": round(time.time(), 3), "u": self.anonymizer.scrub(update)}
+        if user is not None and self.is_admin(user.id):
+            entry["a"] = 1
+        self._buffer.append(json.dumps(entry, ensure_ascii=False, separators=(",", ":")))
+        self.recorded += 1
+        if len(self._buffer) >= self.flush_every or time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._flushed_at = time.monotonic()
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with gzip.open(self.path, "at", encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + "\n")
+
+    def stats(self) -> dict:
+        return {"recorded": self.recorded, "buffered": len(self._buffer)}
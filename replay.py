@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Replay a recorded update log through the bot against fake backends.
+
+Record production traffic by setting RECORD_UPDATES_PATH (and RECORD_SALT for
+pseudonyms that are stable across restarts), then:
+
+    python replay.py logs/updates.jsonl.gz              # as fast as possible
+    python replay.py logs/updates.jsonl.gz --speed 1    # original pacing
+    python replay.py logs/updates.jsonl.gz --db-latency-ms 40 --tg-latency-ms 60 --json before.json
+
+Every update goes through the real dispatcher, middlewares and handlers;
+Supabase and Telegram are the in-memory fakes from fakes.py, seeded with the
+users and transactions the recording refers to. Prints throughput and the
+per-handler latency distribution, measured from when an update is fed to
+when its handler returns.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Awaitable, Callable, Dict
+
+# bot.py reads its configuration at import time.
+os.environ.setdefault("BOT_TOKEN", "42:REPLAY")
+os.environ.setdefault("SUPABASE_URL", "http://replay.invalid")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "replay")
+os.environ["RECORD_UPDATES_PATH"] = ""
+os.environ["IDEMPOTENCY_STATE_PATH"] = ""
+# Replays feed one admin's updates far faster than anyone taps, which would
+# trip the per-lane cap meant for live traffic.
+os.environ.setdefault("MAX_LANE_PENDING", "1000000")
+
+from aiogram import BaseMiddleware  # noqa: E402
+
+import bot as app  # noqa: E402
+from fakes import FakeSupabase, FakeTelegramSession  # noqa: E402
+from idempotency import tx_code_from_callback  # noqa: E402
+from recorder import read_recordings  # noqa: E402
+from tracing import TelegramTracingMiddleware  # noqa: E402
+
+# Status a transaction must have had for each recorded button to make sense.
+SEED_STATUS = {
+    "approve_": "pending",
+    "reject_": "pending",
+    "payment_methods_": "approved",
+    "send_proof_": "approved",
+    "notify_seller_": "paid",
+    "view_proof_": "paid",
+    "seller_sent_": "paid",
+    "buyer_confirm_": "delivered",
+    "buyer_complaint_": "delivered",
+    "release_funds_": "completed",
+}
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class HandlerProbe(BaseMiddleware):
+    """Inner middleware timing each handler call from the moment its update was fed."""
+
+    def __init__(self, fed_at: dict):
+        self.fed_at = fed_at
+        self.latency = defaultdict(list)
+        self.service = defaultdict(list)
+        self.errors = Counter()
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.errors[name] += 1
+            raise
+        finally:
+            done = time.perf_counter()
+            self.service[name].append(done - started)
+            self.latency[name].append(done - self.fed_at.get(data["event_update"].update_id, started))
+
+
+def seed(db: FakeSupabase, records) -> int:
+    """Create the users, payment methods and transactions the recording refers to; return the main admin id."""
+    users = {}
+    admins = Counter()
+    pressed = {}
+    for record in records:
+        update = record["u"]
+        event = update.get("message") or update.get("callback_query") or {}
+        sender = event.get("from")
+        if not sender:
+            continue
+        users.setdefault(sender["id"], sender.get("username"))
+        if record.get("a"):
+            admins[sender["id"]] += 1
+        data = (update.get("callback_query") or {}).get("data") or ""
+        tx_code = tx_code_from_callback(data)
+        if tx_code and tx_code not in pressed:
+            prefix = data[:-len(tx_code)]
+            pressed[tx_code] = (SEED_STATUS.get(prefix, "pending"), None if record.get("a") else sender["id"])
+
+    db.seed("users", [
+        {"id": user_id, "username": username, "full_name": "x", "is_admin": user_id in admins}
+        for user_id, username in users.items()
+    ])
+    db.seed("payment_methods", [
+        {"type": "bank", "name": "BANK", "account_number": "9999999999", "account_name": "xxxx"},
+        {"type": "ewallet", "name": "EWALLET", "account_number": "99999999999", "account_name": "xxxx"},
+    ])
+    regulars = [user_id for user_id in users if user_id not in admins] or [0]
+    db.seed("transactions", [
+        {
+            "tx_code": tx_code,
+            "buyer_id": buyer_id or regulars[i % len(regulars)],
+            "seller_id": regulars[(i + 1) % len(regulars)],
+            "buyer_username": f"@{users.get(buyer_id or regulars[i % len(regulars)])}",
+            "seller_username": f"@{users.get(regulars[(i + 1) % len(regulars)])}",
+            "item_description": "xxxx",
+            "price": "99999",
+            "reference": "-",
+            "status": status,
+        }
+        for i, (tx_code, (status, buyer_id)) in enumerate(pressed.items())
+    ])
+    return admins.most_common(1)[0][0] if admins else app.ADMIN_ID
+
+
+def install_fakes(records, db_latency: float = 0.0, tg_latency: float = 0.0):
+    """Point the bot module at seeded in-memory backends; return (db, session)."""
+    db = FakeSupabase(latency=db_latency)
+    session = FakeTelegramSession(latency=tg_latency)
+    session.middleware(TelegramTracingMiddleware(app.tracer))
+    app.bot.session = session
+    app.supabase = db
+    app.ADMIN_ID = seed(db, records)
+    app.PROOFS_DIR = tempfile.mkdtemp(prefix="replay-proofs-")
+    return db, session
+
+
+async def replay(args) -> dict:
+    records = list(read_recordings(args.recording))
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        sys.exit(f"No updates in {', '.join(args.recording)}")
+
+    db, session = install_fakes(records, args.db_latency_ms / 1000, args.tg_latency_ms / 1000)
+    # The double-tap window is wall-clock based; scale it with the replay
+    # so presses that were seconds apart in production aren't dropped.
+    app.idempotency.callbacks.window = app.idempotency.callbacks.window / args.speed if args.speed else 0
+
+    fed_at = {}
+    probe = HandlerProbe(fed_at)
+    app.router.message.middleware(probe)
+    app.router.callback_query.middleware(probe)
+    app.setup_dispatcher()
+    if not args.speed:
+        # Fed back to back, every press on a transaction would overlap the last one.
+        app.idempotency.tx_busy = lambda tx_code: False
+    await app.warm_up()
+    await app.sync_tx_mirror()
+    await app.proof_pipeline.ready()
+    db.calls.clear()
+    session.calls.clear()
+
+    started = time.perf_counter()
+    offset = 0.0
+    previous = records[0]["ts"]
+    for record in records:
+        if args.speed:
+            offset += min(record["ts"] - previous, args.max_gap)
+            previous = record["ts"]
+            delay = started + offset / args.speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        fed_at[record["u"]["update_id"]] = time.perf_counter()
+        await app.dp.feed_raw_update(app.bot, record["u"])
+    await app.update_scheduler.drain()
+    await asyncio.gather(*app.admin_jobs, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    handled = sum(len(values) for values in probe.latency.values())
+    return {
+        "updates": len(records),
+        "handled": handled,
+        "errors": sum(probe.errors.values()),
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(len(records) / elapsed, 1),
+        "supabase_calls": sum(db.calls.values()),
+        "telegram_calls": sum(session.calls.values()),
+        "idempotency": app.idempotency.stats(),
+        "scheduler": app.update_scheduler.stats(),
+        "handlers": {
+            name: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2),
+                "service_p50_ms": round(percentile(probe.service[name], 0.50) * 1000, 2),
+                "errors": probe.errors[name],
+            }
+            for name, values in sorted(probe.latency.items(), key=lambda item: -len(item[1]))
+        },
+    }
+
+
+def print_report(summary: dict):
+    print(
+        f"Replayed {summary['updates']} updates in {summary['seconds']:.2f} s "
+        f"({summary['updates_per_second']:.1f} updates/s), "
+        f"{summary['idempotency']['dropped']} dropped as duplicates, "
+        f"{summary['updates'] - summary['handled'] - summary['idempotency']['dropped']} unhandled, "
+        f"{summary['errors']} errors"
+    )
+    print(f"Supabase calls: {summary['supabase_calls']}, Telegram calls: {summary['telegram_calls']}")
+    print(f"\n{'handler':32} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'svc p50':>8}  (ms)")
+    for name, stats in summary["handlers"].items():
+        print(
+            f"{name:32} {stats['count']:6} {stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} "
+            f"{stats['p99_ms']:8.1f} {stats['max_ms']:8.1f} {stats['service_p50_ms']:8.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", nargs="+", help="gzip JSON-lines file(s) written by the update recorder")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="1 replays at the recorded pace, 2 twice as fast, 0 (default) as fast as possible")
+    parser.add_argument("--max-gap", type=float, default=60.0,
+                        help="cap idle gaps (e.g. restarts) to this many seconds when pacing")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N updates")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="simulated Supabase round trip")
+    parser.add_argument("--tg-latency-ms", type=float, default=0.0, help="simulated Telegram round trip")
+    parser.add_argument("--json", help="also write the summary to this file for comparing runs")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    summary = asyncio.run(replay(args))
+    print_report(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(summary, fh, indent=2)
+    app.db_transport.shutdown()
+    app.proof_pipeline.shutdown()
+
+
+if __name__ == "__main__":
+    main()
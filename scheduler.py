@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from idempotency import tx_code_from_callback
+
+log = logging.getLogger(__name__)
+
+
+class LaneScheduler:
+    """Run jobs concurrently while keeping jobs that share a lane key in submission order.
+
+    Each job names the lanes it belongs to (e.g. its user and tx_code). At
+    submit time the job is chained behind the current tail of every lane, so
+    it starts only after all earlier jobs on those lanes have finished. Jobs
+    on disjoint lanes run in parallel, up to `max_concurrency` at once.
+    `submit` blocks once `max_pending` jobs are queued or running, which
+    pushes back on whoever is feeding updates in. A job whose lane already
+    holds `max_lane_pending` jobs is refused instead, so a single busy lane
+    can't take every slot.
+    """
+
+    def __init__(self, max_concurrency: int = 32, max_pending: int = 1000, max_lane_pending: int = 20):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.max_lane_pending = max_lane_pending
+        self._running = asyncio.Semaphore(max_concurrency)
+        self._slots = asyncio.Semaphore(max_pending)
+        self._tails = {}
+        self._depth = {}
+        self._tasks = set()
+        self.pending = 0
+        self.running = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.refused = 0
+
+    async def submit(self, keys, job: Callable[[], Awaitable[Any]]) -> bool:
+        """Queue `job` behind its lanes; return False if one of them is full."""
+        keys = tuple(dict.fromkeys(keys))
+        if any(self._depth.get(key, 0) >= self.max_lane_pending for key in keys):
+            self.refused += 1
+            return False
+        await self._slots.acquire()
+
+        done = asyncio.get_running_loop().create_future()
+        waits = []
+        for key in keys:
+            prev = self._tails.get(key)
+            if prev is not None:
+                waits.append(prev)
+            self._tails[key] = done
+            self._depth[key] = self._depth.get(key, 0) + 1
+
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+
+        task = asyncio.create_task(self._run(keys, waits, done, job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, keys, waits, done, job):
+        try:
+            for prev in waits:
+                await asyncio.shield(prev)
+            async with self._running:
+                self.running += 1
+                try:
+                    await job()
+                    self.completed += 1
+                except Exception:
+                    self.failed += 1
+                    log.exception("Scheduled update failed")
+                finally:
+                    self.running -= 1
+        finally:
+            done.set_result(None)
+            for key in keys:
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+                self._depth[key] -= 1
+                if not self._depth[key]:
+                    del self._depth[key]
+            self.pending -= 1
+            self._slots.release()
+
+    def depth(self, key: str) -> int:
+        """Jobs queued or running on lane `key`."""
+        return self._depth.get(key, 0)
+
+    async def drain(self):
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "running": self.running,
+            "peak_pending": self.peak_pending,
+            "lanes": len(self._depth),
+            "max_lane_depth": max(self._depth.values(), default=0),
+            "completed": self.completed,
+            "failed": self.failed,
+            "refused": self.refused,
+        }
+
+
+def update_lanes(event: Update, data: Dict[str, Any]):
+    keys = []
+    user = data.get("event_from_user")
+    if user is not None:
+        keys.append(f"user:{user.id}")
+    callback = event.callback_query
+    if callback is not None and callback.data:
+        tx_code = tx_code_from_callback(callback.data)
+        if tx_code:
+            keys.append(f"tx:{tx_code}")
+    return keys
+
+
+class SchedulerMiddleware(BaseMiddleware):
+    """Hand each update to a LaneScheduler instead of handling it inline.
+
+    Meant for polling with handle_as_tasks=False: the polling loop then waits
+    only for a free scheduler slot, not for the handler itself. The FSM
+    state was read when the update arrived, before earlier jobs in its lane
+    ran, so it is read again once the job starts.
+    """
+
+    def __init__(self, scheduler: LaneScheduler):
+        self.scheduler = scheduler
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        async def job():
+            if "state" in data:
+                data["raw_state"] = await data["state"].get_state()
+            return await handler(event, data)
+
+        keys = update_lanes(event, data)
+        if not await self.scheduler.submit(keys, job):
+            log.warning(f"Update {event.update_id} refused, lane full: {', '.join(keys)}")
+            if event.callback_query is not None:
+                try:
+                    await event.callback_query.answer("⏳ Sedang diproses...")
+                except Exception:
+                    pass
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""Sharded run mode: one polling front process, N bot worker processes.
+
+The front long-polls getUpdates and routes each update by a hash of its
+user id to one worker over a socketpair, so a user's updates always reach
+the same worker in order (their FSM state lives there) while different
+users are handled on different cores. Workers run the normal dispatcher.
+They forward the transaction rows they write, and the front fans them out
+to the other workers so every transaction mirror stays current. Admins
+turning their live dashboard on or off are fanned out the same way, so
+no worker sends per-event messages to an admin who has one.
+
+Run it with BOT_WORKERS=4 python bot.py. To benchmark throughput against
+the replay fakes as the worker count grows:
+
+    python sharding.py bench logs/updates.jsonl.gz --workers 1 2 4 8 --db-latency-ms 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+import zlib
+
+log = logging.getLogger(__name__)
+
+MAX_MESSAGE = 4 * 1024 * 1024
+POLL_TIMEOUT = 30
+WORKER_RESTART_DELAY = 1.0
+MAX_PENDING_UPDATES = 10000
+
+
+def routing_key(update: dict) -> int:
+    """The user an update belongs to (falling back to its chat, then its own id)."""
+    for event in update.values():
+        if not isinstance(event, dict):
+            continue
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+    return update["update_id"]
+
+
+def shard_for(update: dict, workers: int) -> int:
+    return zlib.crc32(str(routing_key(update)).encode()) % workers
+
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+class ShardRouter:
+    """Spawns and supervises the worker processes and moves messages between them.
+
+    Updates routed to a worker while it restarts are held and sent, in
+    order, once it reports ready again.
+    """
+
+    def __init__(self, workers: int, worker_args=()):
+        self.workers = workers
+        self.worker_args = list(worker_args)
+        self.routed = [0] * workers
+        self._procs = [None] * workers
+        self._writers = [None] * workers
+        self._ready = [asyncio.Event() for _ in range(workers)]
+        # Updates routed to a worker that is restarting, sent once it is ready again.
+        self._pending = [[] for _ in range(workers)]
+        self._drained = {}
+        # admin_id -> index of the worker holding that admin's live dashboard
+        self._dashboards = {}
+        self._tasks = []
+        self._closing = False
+
+    async def start(self):
+        for index in range(self.workers):
+            await self._spawn(index)
+        await asyncio.gather(*(event.wait() for event in self._ready))
+
+    async def _spawn(self, index: int):
+        parent, child = socket.socketpair()
+        self._procs[index] = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "worker",
+            "--index", str(index), "--fd", str(child.fileno()), *self.worker_args,
+            pass_fds=(child.fileno(),),
+        )
+        child.close()
+        reader, self._writers[index] = await asyncio.open_unix_connection(sock=parent, limit=MAX_MESSAGE)
+        self._tasks.append(asyncio.create_task(self._read(index, reader)))
+        self._tasks.append(asyncio.create_task(self._supervise(index, self._procs[index])))
+
+    async def _read(self, index: int, reader: asyncio.StreamReader):
+        while line := await reader.readline():
+            message = json.loads(line)
+            if "tx" in message:
+                self._fan_out(index, line)
+            elif "dashboard" in message:
+                admin_id, active = message["dashboard"]
+                if active:
+                    self._dashboards[admin_id] = index
+                else:
+                    self._dashboards.pop(admin_id, None)
+                self._fan_out(index, line)
+            elif "ready" in message:
+                # A (re)started worker learns which admins have a dashboard elsewhere.
+                for admin_id in self._dashboards:
+                    self._writers[index].write(encode({"dashboard": [admin_id, True]}))
+                if self._pending[index]:
+                    log.warning(f"Worker {index} is back, sending {len(self._pending[index])} held update(s)")
+                    self._writers[index].writelines(self._pending[index])
+                    self._pending[index] = []
+                self._ready[index].set()
+            elif "drained" in message:
+                self._drained.pop(index).set_result(message["drained"])
+
+    def _fan_out(self, index: int, line: bytes):
+        for other, writer in enumerate(self._writers):
+            if other != index and writer is not None:
+                writer.write(line)
+
+    async def _supervise(self, index: int, proc):
+        code = await proc.wait()
+        if self._closing:
+            return
+        log.error(f"Worker {index} exited with code {code}, restarting")
+        self._ready[index].clear()
+        self._writers[index] = None
+        # Dashboards lived in the dead worker's memory; those admins get messages again.
+        for admin_id, owner in list(self._dashboards.items()):
+            if owner == index:
+                del self._dashboards[admin_id]
+                self._fan_out(index, encode({"dashboard": [admin_id, False]}))
+        await asyncio.sleep(WORKER_RESTART_DELAY)
+        await self._spawn(index)
+
+    async def dispatch(self, update: dict):
+        index = shard_for(update, self.workers)
+        self.routed[index] += 1
+        line = encode({"update": update})
+        if not self._ready[index].is_set():
+            # Polling has already moved past this update, so hold it for the restarted worker.
+            if len(self._pending[index]) < MAX_PENDING_UPDATES:
+                self._pending[index].append(line)
+                return
+            # Too many held: stop polling (and confirming updates) until the worker is back.
+            log.error(f"Worker {index} is down with {MAX_PENDING_UPDATES} updates held, pausing polling")
+            await self._ready[index].wait()
+        writer = self._writers[index]
+        writer.write(line)
+        # Blocks while the worker's scheduler is full, like polling does.
+        await writer.drain()
+
+    async def drain(self):
+        """Wait until every worker has finished everything routed to it so far."""
+        futures = []
+        for index, writer in enumerate(self._writers):
+            self._drained[index] = asyncio.get_running_loop().create_future()
+            futures.append(self._drained[index])
+            writer.write(encode({"drain": True}))
+        return await asyncio.gather(*futures)
+
+    async def stop(self):
+        self._closing = True
+        for writer in self._writers:
+            if writer is not None:
+                writer.close()
+        await asyncio.gather(*(proc.wait() for proc in self._procs if proc is not None))
+        for task in self._tasks:
+            task.cancel()
+
+
+async def run_front(token: str, workers: int):
+    import aiohttp
+    from aiogram.client.telegram import PRODUCTION
+
+    router = ShardRouter(workers)
+    await router.start()
+    log.info(f"🤖 Sharded front started with {workers} workers")
+
+    url = PRODUCTION.api_url(token=token, method="getUpdates")
+    offset = None
+    backoff = 1
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=POLL_TIMEOUT + 10)) as http:
+            while True:
+                params = {"timeout": POLL_TIMEOUT}
+                if offset is not None:
+                    params["offset"] = offset
+                try:
+                    async with http.get(url, params=params) as response:
+                        payload = await response.json()
+                    if not payload.get("ok"):
+                        raise RuntimeError(payload.get("description"))
+                except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as e:
+                    log.error(f"getUpdates failed: {e}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+                    continue
+                backoff = 1
+                for update in payload["result"]:
+                    offset = update["update_id"] + 1
+                    await router.dispatch(update)
+    finally:
+        await router.stop()
+
+
+async def run_worker(args):
+    if args.recording:
+        # Benchmark worker: same handlers, fake backends.
+        from recorder import read_recordings
+        from replay import install_fakes
+        import bot as app
+
+        install_fakes(list(read_recordings(args.recording)), args.db_latency_ms / 1000, args.tg_latency_ms / 1000)
+        app.idempotency.callbacks.window = 0
+        logging.getLogger().setLevel(logging.WARNING)
+    else:
+        from dotenv import load_dotenv
+        from recorder import shard_path
+
+        load_dotenv()
+        if os.getenv("RECORD_UPDATES_PATH"):
+            os.environ["RECORD_UPDATES_PATH"] = shard_path(os.environ["RECORD_UPDATES_PATH"], args.index)
+        state_path = os.getenv("IDEMPOTENCY_STATE_PATH", "logs/last_update_id.json")
+        if state_path:
+            os.environ["IDEMPOTENCY_STATE_PATH"] = shard_path(state_path, args.index)
+        import bot as app
+
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(logging.Formatter(f"%(levelname)s:shard{args.index}:%(name)s:%(message)s"))
+
+    reader, writer = await asyncio.open_unix_connection(sock=socket.socket(fileno=args.fd), limit=MAX_MESSAGE)
+
+    def broadcast(rows):
+        if rows:
+            writer.write(encode({"tx": rows}))
+
+    def announce_dashboard(admin_id, active):
+        writer.write(encode({"dashboard": [admin_id, active]}))
+
+    app.tx_write_listeners.append(broadcast)
+    app.admin_dashboard.listeners.append(announce_dashboard)
+    app.setup_dispatcher()
+    if args.recording:
+        app.idempotency.tx_busy = lambda tx_code: False
+    await app.warm_up()
+    if args.recording:
+        await app.sync_tx_mirror()
+        await app.proof_pipeline.ready()
+        background_tasks = []
+    else:
+        # The RPC's SKIP LOCKED makes concurrent sweeps safe, but one is enough.
+        background_tasks = app.start_background_tasks(sweep_expired=args.index == 0)
+    writer.write(encode({"ready": args.index}))
+
+    try:
+        while line := await reader.readline():
+            message = json.loads(line)
+            if "update" in message:
+                await app.dp.feed_raw_update(app.bot, message["update"])
+            elif "tx" in message:
+                app.apply_remote_tx_rows(message["tx"])
+            elif "dashboard" in message:
+                app.admin_dashboard.set_remote(*message["dashboard"])
+            elif "drain" in message:
+                await app.update_scheduler.drain()
+                writer.write(encode({"drained": app.update_scheduler.stats()}))
+    finally:
+        await app.shutdown(background_tasks)
+
+
+async def bench(args):
+    from recorder import read_recordings
+
+    records = list(read_recordings(args.recording))
+    if not records:
+        sys.exit(f"No updates in {', '.join(args.recording)}")
+    worker_args = [
+        "--db-latency-ms", str(args.db_latency_ms), "--tg-latency-ms", str(args.tg_latency_ms),
+        "--recording", *args.recording,
+    ]
+
+    print(f"{len(records)} updates, Supabase {args.db_latency_ms:.0f} ms, Telegram {args.tg_latency_ms:.0f} ms\n")
+    print(f"{'workers':>7} {'seconds':>8} {'updates/s':>10} {'speedup':>8}  routed per worker")
+    baseline = None
+    for workers in args.workers:
+        router = ShardRouter(workers, worker_args)
+        await router.start()
+        started = time.perf_counter()
+        for record in records:
+            await router.dispatch(record["u"])
+        await router.drain()
+        elapsed = time.perf_counter() - started
+        await router.stop()
+
+        throughput = len(records) / elapsed
+        baseline = baseline or throughput
+        print(f"{workers:7} {elapsed:8.2f} {throughput:10.1f} {throughput / baseline:7.2f}x  {router.routed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker = commands.add_parser("worker", help="internal: run one shard (spawned by the front)")
+    worker.add_argument("--index", type=int, required=True)
+    worker.add_argument("--fd", type=int, required=True)
+    worker.add_argument("--recording", nargs="+")
+    worker.add_argument("--db-latency-ms", type=float, default=0.0)
+    worker.add_argument("--tg-latency-ms", type=float, default=0.0)
+
+    benchmark = commands.add_parser("bench", help="replay a recording through 1..N workers and compare throughput")
+    benchmark.add_argument("recording", nargs="+")
+    benchmark.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    benchmark.add_argument("--db-latency-ms", type=float, default=0.0)
+    benchmark.add_argument("--tg-latency-ms", type=float, default=0.0)
+
+    args = parser.parse_args()
+    if args.command == "worker":
+        asyncio.run(run_worker(args))
+    else:
+        logging.basicConfig(level=logging.WARNING)
+        asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesce concurrent identical reads into one in-flight call.
+
+    The first caller for a key starts the call; callers arriving while it is
+    still running await the same result instead of issuing their own query.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.hits = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        self.hits += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _, key=key: self._inflight.pop(key, None))
+        # Shield so one cancelled caller does not cancel the read for the others.
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
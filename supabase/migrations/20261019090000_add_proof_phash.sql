@@ -0,0 +1,10 @@
+/*
+  # Perceptual hash of payment proofs
+
+  1. Changes
+    - `transactions`
+      - `proof_phash` (text) - 64-bit difference hash of the proof image, hex encoded.
+        Used to warn admins when the same transfer screenshot is reused.
+*/
+
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS proof_phash text;
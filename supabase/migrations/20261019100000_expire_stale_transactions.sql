@@ -0,0 +1,37 @@
+/*
+  # Batched expiry of stale transactions
+
+  1. New Functions
+    - `expire_stale_transactions(p_status, p_older_than, p_limit)`
+      - Cancels up to `p_limit` transactions still in `p_status` whose
+        `updated_at` is older than `p_older_than`, oldest first.
+      - One set-based UPDATE ... RETURNING; rows locked by another
+        transaction are skipped and picked up by the next batch.
+      - Returns the cancelled rows.
+
+  2. Security
+    - Execute is restricted to the service role.
+*/
+
+CREATE OR REPLACE FUNCTION expire_stale_transactions(p_status text, p_older_than timestamptz, p_limit integer)
+RETURNS SETOF transactions
+LANGUAGE sql
+AS $$
+  UPDATE transactions t
+  SET status = 'cancelled',
+      updated_at = now()
+  WHERE t.id IN (
+    SELECT id
+    FROM transactions
+    WHERE status = p_status
+      AND updated_at < p_older_than
+    ORDER BY updated_at
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  AND t.status = p_status
+  RETURNING t.*;
+$$;
+
+REVOKE EXECUTE ON FUNCTION expire_stale_transactions(text, timestamptz, integer) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION expire_stale_transactions(text, timestamptz, integer) TO service_role;
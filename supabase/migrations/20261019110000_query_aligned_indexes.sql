@@ -0,0 +1,53 @@
+/*
+  # Indexes aligned with the bot's queries
+
+  1. New Indexes
+    - `transactions`
+      - `idx_transactions_active_created` - partial on created_at DESC for the
+        active statuses (admin pending list, dashboard)
+      - `idx_transactions_buyer_created` / `idx_transactions_seller_created` -
+        per-user history (buyer_id OR seller_id ORDER BY created_at DESC)
+      - `idx_transactions_status_updated` - expiry sweeper (status = ? AND updated_at < ?)
+      - `idx_transactions_updated` - incremental catch-up on updated_at
+      - `idx_transactions_created_id` - keyset pagination for exports and the mirror load
+      - `idx_transactions_proof_phash` - partial, proof hash index load
+    - `transaction_logs`
+      - `idx_transaction_logs_created_id` - keyset pagination for exports
+    - `users`
+      - `idx_users_username` - seller lookups by username
+      - `idx_users_admin` - partial, admin set
+    - `payment_methods`
+      - `idx_payment_methods_active` - partial, active methods
+
+  2. Removed Indexes
+    - `idx_transactions_buyer`, `idx_transactions_seller`, `idx_transactions_status`,
+      `idx_transactions_created` - superseded by the composite indexes above
+*/
+
+CREATE INDEX IF NOT EXISTS idx_transactions_active_created
+  ON transactions (created_at DESC)
+  WHERE status IN ('pending', 'approved', 'paid', 'delivered');
+
+CREATE INDEX IF NOT EXISTS idx_transactions_buyer_created ON transactions (buyer_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_seller_created ON transactions (seller_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_status_updated ON transactions (status, updated_at);
+CREATE INDEX IF NOT EXISTS idx_transactions_updated ON transactions (updated_at);
+CREATE INDEX IF NOT EXISTS idx_transactions_created_id ON transactions (created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_proof_phash
+  ON transactions (id)
+  WHERE proof_phash IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_transaction_logs_created_id ON transaction_logs (created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_users_username ON users (username);
+CREATE INDEX IF NOT EXISTS idx_users_admin ON users (id) WHERE is_admin;
+
+CREATE INDEX IF NOT EXISTS idx_payment_methods_active
+  ON payment_methods (type, created_at)
+  WHERE is_active;
+
+DROP INDEX IF EXISTS idx_transactions_buyer;
+DROP INDEX IF EXISTS idx_transactions_seller;
+DROP INDEX IF EXISTS idx_transactions_status;
+DROP INDEX IF EXISTS idx_transactions_created;
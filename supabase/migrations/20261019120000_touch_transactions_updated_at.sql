@@ -0,0 +1,28 @@
+/*
+  # Keep transactions.updated_at current on every write
+
+  1. New Functions
+    - `touch_updated_at()` - trigger function setting `updated_at` to now()
+
+  2. New Triggers
+    - `transactions_touch_updated_at` - BEFORE UPDATE on `transactions`
+      - Every UPDATE bumps `updated_at`, whoever makes it (the bot, the
+        dashboard, SQL run by hand), so the bot's incremental catch-up on
+        `updated_at` sees every changed row.
+*/
+
+CREATE OR REPLACE FUNCTION touch_updated_at()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  NEW.updated_at = now();
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS transactions_touch_updated_at ON transactions;
+CREATE TRIGGER transactions_touch_updated_at
+  BEFORE UPDATE ON transactions
+  FOR EACH ROW
+  EXECUTE FUNCTION touch_updated_at();
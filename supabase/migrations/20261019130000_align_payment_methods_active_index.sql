@@ -0,0 +1,12 @@
+/*
+  # Align the active payment methods index with its query
+
+  1. Changed Indexes
+    - `payment_methods`
+      - `idx_payment_methods_active` - now `(id) WHERE is_active`. The bot
+        reads active methods unordered (`is_active = true`), so the
+        `(type, created_at)` key was never used for ordering or filtering.
+*/
+
+DROP INDEX IF EXISTS idx_payment_methods_active;
+CREATE INDEX idx_payment_methods_active ON payment_methods (id) WHERE is_active;
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Precompiled, auto-escaping message templates.
+
+Every field is HTML-escaped on the way in unless it is `Markup`, so user
+input such as item descriptions or usernames can't break `parse_mode="HTML"`
+sends. A template is parsed once at import into a function that joins its
+literal parts and escaped fields in one go. `python templates.py` runs a
+render micro-benchmark against the f-string code it replaced.
+"""
+import html
+import re
+import string
+import timeit
+
+from aiogram.types import InlineKeyboardMarkup
+from pydantic import ConfigDict
+
+# html.escape(quote=False) inlined into the compiled templates, minus the call.
+ESCAPE = "{}.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')"
+PRECISION = re.compile(r"\.\d+")
+
+
+class Markup(str):
+    """Text that is already HTML and is inserted as is."""
+
+
+class Template:
+    """A message layout in `str.format` syntax whose fields are escaped.
+
+    Fields are plain names with an optional format spec (`{item:.30}`
+    truncates before escaping, so an entity is never cut in half).
+    `fill(mapping)` renders straight from a dict such as a transaction row;
+    keys the layout doesn't use are ignored.
+    """
+
+    __slots__ = ("source", "fields", "fill")
+
+    def __init__(self, source: str):
+        self.source = source
+        parts = []
+        fields = []
+        for literal, name, spec, conversion in string.Formatter().parse(source):
+            if literal:
+                parts.append(repr(literal))
+            if name is None:
+                continue
+            if not name.isidentifier() or conversion:
+                raise ValueError(f"Unsupported template field {{{name}}} in {source[:40]!r}")
+            if PRECISION.fullmatch(spec):
+                # Truncating a str is a slice; format() is only needed for other types.
+                value = f"(v[:{spec[1:]}] if type(v := f[{name!r}]) is str else format(v, {spec!r}))"
+                parts.append(ESCAPE.format(value))
+            else:
+                value = f"format(f[{name!r}], {spec!r})" if spec else f"f[{name!r}]"
+                parts.append(f"(v if type(v := {value}) is Markup else {ESCAPE.format('str(v)')})")
+            fields.append(name)
+        self.fields = tuple(dict.fromkeys(fields))
+        # Compiled once into a single join expression over the fields.
+        namespace = {"Markup": Markup}
+        exec(f"def fill(f):\n    return ''.join(({', '.join(parts or ['str()'])},))", namespace)
+        self.fill = namespace["fill"]
+
+    def render(self, **fields) -> Markup:
+        return Markup(self.fill(fields))
+
+
+def render_list(template: Template, rows, sep: str = "") -> Markup:
+    """Render `template` once per row (a dict of fields) and join the results in one go."""
+    fill = template.fill
+    return Markup(sep.join([fill(row) for row in rows]))
+
+
+class StaticKeyboard(InlineKeyboardMarkup):
+    """An inline keyboard that refuses assignment, so a shared instance can't be changed by one send."""
+
+    model_config = ConfigDict(frozen=True)
+
+
+def static_keyboard(*rows) -> StaticKeyboard:
+    """A keyboard built and validated once at import, then shared by every send."""
+    return StaticKeyboard(inline_keyboard=[list(row) for row in rows])
+
+
+WELCOME = Template(
+    "👋 Selamat datang <b>{full_name}</b>!\n\n"
+    "🛡️ <b>Rekber Bot</b> - Sistem Rekening Bersama yang Aman\n\n"
+    "Silakan pilih menu di bawah:"
+)
+
+JOIN_THANKS = Template("✅ Terima kasih sudah join!\n\n{welcome}")
+
+NEW_TRANSACTION_ADMIN = Template(
+    "🆕 <b>TRANSAKSI BARU</b>\n\n"
+    "📋 Kode: <code>{tx_code}</code>\n"
+    "👤 Seller: {seller_username}\n"
+    "👤 Buyer: {buyer_username}\n"
+    "📦 Barang: {item_description}\n"
+    "💰 Harga: {price}\n"
+    "📝 Ref: {reference}\n\n"
+    "Status: ⏳ Menunggu Persetujuan"
+)
+
+TRANSACTION_CREATED = Template(
+    "✅ <b>Transaksi Berhasil Dibuat!</b>\n\n"
+    "📋 Kode Transaksi: <code>{tx_code}</code>\n\n"
+    "⏳ Menunggu persetujuan admin...\n"
+    "Anda akan mendapat notifikasi setelah admin menyetujui."
+)
+
+BUYER_APPROVED = Template(
+    "✅ <b>TRANSAKSI DISETUJUI</b>\n\n"
+    "📋 Kode: <code>{tx_code}</code>\n"
+    "💰 Harga: {price}\n\n"
+    "📌 Langkah selanjutnya:\n"
+    "1. Lihat metode pembayaran\n"
+    "2. Transfer ke rekening yang ditentukan\n"
+    "3. Kirim bukti transfer ke bot ini\n\n"
+    "Klik tombol di bawah untuk melihat metode pembayaran:"
+)
+
+BUYER_REJECTED = Template(
+    "❌ <b>TRANSAKSI DITOLAK</b>\n\n"
+    "📋 Kode: <code>{tx_code}</code>\n\n"
+    "Transaksi Anda telah ditolak oleh admin.\n"
+    "Silakan hubungi admin untuk informasi lebih lanjut."
+)
+
+BUYER_EXPIRED = Template(
+    "🚫 <b>TRANSAKSI DIBATALKAN</b>\n\n"
+    "📋 Kode: <code>{tx_code}</code>\n\n"
+    "Transaksi dibatalkan otomatis karena tidak ada aktivitas.\n"
+    "Silakan buat transaksi baru jika masih ingin melanjutkan."
+)
+
+PAYMENT_RECEIVED_ADMIN = Template(
+    "💰 <b>PEMBAYARAN DITERIMA</b>\n\n"
+    "📋 Kode: <code>{tx_code}</code>\n"
+    "👤 Seller: {seller_username}\n"
+    "👤 Buyer: {buyer_username}\n"
+    "📦 Barang: {item_description}\n"
+    "💰 Harga: {price}\n\n"
+    "✅ Bukti transfer telah diterima.\n"
+    "Dana sudah aman."
+)
+
+PROOF_REUSED = Template(
+    "\n\n⚠️ <b>KEMUNGKINAN BUKTI DIPAKAI ULANG</b>\n"
+    "Mirip dengan bukti transaksi: {similar}"
+)
+
+PROOF_REUSED_ITEM = Template("<code>{tx_code}</code> (jarak {distance})")
+
+PROOF_RECEIVED = Template(
+    "✅ <b>BUKTI TRANSFER DITERIMA</b>\n\n"
+    "📋 Kode: <code>{tx_code}</code>\n\n"
+    "Bukti transfer Anda telah diterima dan sedang diverifikasi oleh admin.\n"
+    "Dana Anda sudah aman. Seller akan segera mengirimkan barang.\n\n"
+    "Anda akan mendapat notifikasi selanjutnya."
+)
+
+SELLER_FUNDS_SAFE = Template(
+    "📦 <b>DANA SUDAH AMAN</b>\n\n"
+    "📋 Kode: <code>{tx_code}</code>\n"
+    "👤 Buyer: {buyer_username}\n"
+    "📦 Barang: {item_description}\n"
+    "💰 Harga: {price}\n\n"
+    "✅ Pembayaran dari buyer telah diterima dan diverifikasi.\n"
+    "Dana sudah aman di rekber.\n\n"
+    "📌 <b>Langkah selanjutnya:</b>\n"
+    "Silakan kirimkan barang/akun kepada buyer.\n"
+    "Setelah buyer konfirmasi, dana akan ditransfer ke Anda.\n\n"
+    "⚠️ <b>PERHATIAN:</b>\n"
+    "Jika dalam 1 jam buyer tidak konfirmasi setelah Anda kirim barang,\n"
+    "dana otomatis dicairkan ke Anda."
+)
+
+BUYER_ITEM_SENT = Template(
+    "📦 <b>BARANG TELAH DIKIRIM</b>\n\n"
+    "📋 Kode: <code>{tx_code}</code>\n"
+    "👤 Seller: {seller_username}\n"
+    "📦 Barang: {item_description}\n\n"
+    "Seller telah mengirimkan barang kepada Anda.\n"
+    "Silakan cek dan verifikasi barang yang diterima.\n\n"
+    "Jika sudah sesuai, klik tombol konfirmasi di bawah:"
+)
+
+ADMIN_TX_COMPLETED = Template(
+    "✅ <b>TRANSAKSI SELESAI</b>\n\n"
+    "📋 Kode: <code>{tx_code}</code>\n"
+    "👤 Seller: {seller_username}\n"
+    "👤 Buyer: {buyer_username}\n"
+    "💰 Harga: {price}\n\n"
+    "Buyer telah konfirmasi barang diterima dengan baik.\n"
+    "Silakan cairkan dana ke seller."
+)
+
+SELLER_FUNDS_RELEASED = Template(
+    "💸 <b>DANA TELAH DICAIRKAN</b>\n\n"
+    "📋 Kode: <code>{tx_code}</code>\n"
+    "💰 Jumlah: {price}\n\n"
+    "✅ Dana telah ditransfer ke rekening Anda.\n"
+    "Silakan cek mutasi rekening/e-wallet Anda.\n\n"
+    "🎉 Terima kasih telah menggunakan layanan rekber kami!\n"
+    "Selamat bertransaksi kembali! 🔥"
+)
+
+TX_HISTORY = Template("📊 <b>RIWAYAT TRANSAKSI</b>\n\n{items}")
+
+TX_HISTORY_ITEM = Template(
+    "{emoji} <code>{tx_code}</code>\n"
+    "   {item_description:.30}...\n"
+    "   {price} - {status}\n\n"
+)
+
+PAYMENT_METHODS = Template("💳 <b>METODE PEMBAYARAN</b>\n\n{banks}{ewallets}{footer}")
+
+PAYMENT_METHODS_BANKS = Template("🏦 <b>BANK:</b>\n{items}")
+
+PAYMENT_METHODS_EWALLETS = Template("📱 <b>E-WALLET:</b>\n{items}")
+
+PAYMENT_METHOD_ITEM = Template(
+    "• {name}\n"
+    "  {account_number}\n"
+    "  a/n {account_name}\n\n"
+)
+
+PAYMENT_METHODS_FOOTER = Markup(
+    "⚠️ <b>PENTING:</b>\n"
+    "Setelah transfer, segera kirim bukti transfer!"
+)
+
+ACTIVE_TRANSACTIONS = Template("📋 <b>TRANSAKSI AKTIF</b>\n\n{items}")
+
+ACTIVE_TRANSACTION_ITEM = Template(
+    "• <code>{tx_code}</code>\n"
+    "  Status: {status}\n"
+    "  {price}\n\n"
+)
+
+ADMIN_PAYMENT_METHODS = Template("💳 <b>KELOLA METODE PEMBAYARAN</b>\n\n{items}")
+
+ADMIN_PAYMENT_METHOD_ITEM = Template("{active} {type}: {name} - {account_number}\n")
+
+PAYMENT_METHOD_ADDED = Template(
+    "✅ Metode pembayaran berhasil ditambahkan!\n\n"
+    "Type: {type}\n"
+    "Nama: {name}\n"
+    "Nomor: {account_number}\n"
+    "a/n: {account_name}"
+)
+
+RECONCILE_RESULT = Template(
+    "🧾 <b>HASIL REKONSILIASI</b>\n\n"
+    "Mutasi masuk dibaca: {rows}\n"
+    "✅ Cocok: {matched}\n"
+    "⚠️ Ambigu: {ambiguous}\n"
+    "❔ Tidak cocok: {unmatched}\n"
+    "⏳ Dibayar tanpa mutasi: {unpaid}\n"
+    "💬 Harga tak terbaca (cek manual): {unpriced}\n\n"
+    "{details}"
+    "Transaksi yang cocok bisa dikonfirmasi ke seller sekaligus."
+)
+
+RECONCILE_MATCHED_ITEM = Template("✅ <code>{tx_code}</code> {price} ← baris {line}\n")
+
+RECONCILE_AMBIGUOUS_ITEM = Template("⚠️ Baris {line} ({amount:,}): {candidates}\n")
+
+RECONCILE_CONFIRMED = Template(
+    "✅ <b>KONFIRMASI MASSAL SELESAI</b>\n\n"
+    "{confirmed} dari {requested} transaksi dikonfirmasi.\n"
+    "📨 Seller diberitahu: {sent}\n"
+    "⚠️ Seller belum terdaftar di bot: {unregistered}"
+)
+
+
+def bench(number: int = 20000):
+    """Compare rendering a list message with templates against the old concatenation."""
+    txs = [
+        {"tx_code": f"RKB2026101912{i:04d}", "item_description": "Akun game <level 80> & item langka",
+         "price": "Rp 1.500.000", "status": "paid", "emoji": "💰"}
+        for i in range(5)
+    ]
+
+    def concatenated():
+        text = "📊 <b>RIWAYAT TRANSAKSI</b>\n\n"
+        for tx in txs:
+            text += f"{tx['emoji']} <code>{tx['tx_code']}</code>\n"
+            text += f"   {tx['item_description'][:30]}...\n"
+            text += f"   {tx['price']} - {tx['status']}\n\n"
+        return text
+
+    def concatenated_escaped():
+        text = "📊 <b>RIWAYAT TRANSAKSI</b>\n\n"
+        for tx in txs:
+            text += f"{tx['emoji']} <code>{html.escape(tx['tx_code'], quote=False)}</code>\n"
+            text += f"   {html.escape(tx['item_description'][:30], quote=False)}...\n"
+            text += f"   {html.escape(tx['price'], quote=False)} - {html.escape(tx['status'], quote=False)}\n\n"
+        return text
+
+    def templated():
+        return TX_HISTORY.render(items=render_list(TX_HISTORY_ITEM, txs))
+
+    def approved():
+        return BUYER_APPROVED.render(**txs[0])
+
+    assert templated() == concatenated_escaped()
+    print(f"{'case':34} {'µs/render':>10}")
+    for name, func in (
+        ("history: f-string +=, unescaped", concatenated),
+        ("history: f-string +=, escaped", concatenated_escaped),
+        ("history: template + render_list", templated),
+        ("approved notice: template", approved),
+    ):
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print(f"{name:34} {best / number * 1e6:10.2f}")
+
+
+if __name__ == "__main__":
+    bench()
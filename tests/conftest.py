@@ -0,0 +1,78 @@
+import itertools
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import replay  # noqa: E402
+from readmodel import TransactionCache, TransactionMirror  # noqa: E402
+
+app = replay.app
+_update_ids = itertools.count(900001)
+
+
+def callback_update(user: dict, data: str) -> dict:
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": user,
+            "chat_instance": "1",
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": 1760000000,
+                "chat": {"id": user["id"], "type": "private"},
+                "text": "menu",
+            },
+        },
+    }
+
+
+def message_update(user: dict, **content) -> dict:
+    return {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": next(_update_ids),
+            "date": 1760000000,
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            **content,
+        },
+    }
+
+
+async def feed(*updates):
+    # Back to back, like polling does: nothing runs between the two feeds.
+    for update in updates:
+        await app.dp.feed_raw_update(app.bot, update)
+    await app.update_scheduler.drain()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def slow_log(tmp_path_factory):
+    """Keep slow-update traces written during tests out of the working tree."""
+    app.tracer.slow_log_path = str(tmp_path_factory.mktemp("traces") / "slow_updates.jsonl")
+    return app.tracer.slow_log_path
+
+
+@pytest.fixture(scope="session")
+def dispatcher():
+    """The bot's dispatcher with its middlewares installed, set up once per run."""
+    app.setup_dispatcher()
+    return app.dp
+
+
+@pytest.fixture
+def fakes(dispatcher):
+    """Fresh in-memory Supabase and Telegram backends; returns install(records) -> (db, session)."""
+    def install(records):
+        db, session = replay.install_fakes(records)
+        app.tx_mirror = TransactionMirror(retention_days=app.TX_MIRROR_RETENTION_DAYS)
+        app.tx_cache = TransactionCache(max_size=app.TX_CACHE_SIZE)
+        app.admin_cache["loaded_at"] = None
+        return db, session
+
+    return install
@@ -0,0 +1,45 @@
+import asyncio
+
+from conftest import app, callback_update, feed, message_update
+
+ADMIN = {"id": 7101, "is_bot": False, "first_name": "Admin", "username": "admin_bulk"}
+
+
+def test_approve_all_pending_needs_confirmation(fakes):
+    confirm = callback_update(ADMIN, "bulk_all_confirm")
+    db, session = fakes([{"u": confirm, "a": True}])
+    db.seed("transactions", [
+        {"tx_code": f"RKB2026101900040{i}", "buyer_id": 5200 + i, "buyer_username": "@b",
+         "seller_username": "@s", "item_description": "x", "price": "1000", "reference": "-"}
+        for i in range(3)
+    ])
+
+    asyncio.run(feed(confirm))
+    assert {tx["status"] for tx in db.tables["transactions"]} == {"pending"}
+
+    async def approve():
+        await feed(callback_update(ADMIN, "bulk_all_approve"))
+        await asyncio.gather(*app.admin_jobs)
+
+    asyncio.run(approve())
+    assert {tx["status"] for tx in db.tables["transactions"]} == {"approved"}
+
+
+def test_bulk_command_waits_for_confirmation(fakes):
+    command = message_update(ADMIN, text="/bulk reject", entities=[{"type": "bot_command", "offset": 0, "length": 5}])
+    db, session = fakes([{"u": command, "a": True}])
+    db.seed("transactions", [
+        {"tx_code": f"RKB2026101900050{i}", "buyer_id": 5300 + i, "buyer_username": "@b",
+         "seller_username": "@s", "item_description": "x", "price": "1000", "reference": "-"}
+        for i in range(2)
+    ])
+
+    asyncio.run(feed(command))
+    assert {tx["status"] for tx in db.tables["transactions"]} == {"pending"}
+
+    async def confirm():
+        await feed(callback_update(ADMIN, "bulk_command_reject"))
+        await asyncio.gather(*app.admin_jobs)
+
+    asyncio.run(confirm())
+    assert {tx["status"] for tx in db.tables["transactions"]} == {"rejected"}
@@ -0,0 +1,65 @@
+import asyncio
+
+from dashboard import LiveDashboard
+
+
+class RecordingBot:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+def test_mark_during_refresh_gets_another_refresh():
+    async def run():
+        bot = RecordingBot()
+        renders = []
+        dashboard = None
+
+        async def render():
+            renders.append(len(renders))
+            if len(renders) == 1:
+                # A transaction changes while the first refresh is rendering.
+                dashboard.mark_dirty()
+            await asyncio.sleep(0)
+            return f"render {len(renders)}", None
+
+        dashboard = LiveDashboard(bot, render, interval=0.01)
+        dashboard.messages[1] = 10
+        dashboard.mark_dirty()
+        dashboard.mark_dirty()
+        while not dashboard._pending.done():
+            await asyncio.sleep(0.01)
+        return bot.edits
+
+    assert asyncio.run(run()) == ["render 1", "render 2"]
+
+
+class FakeMessage:
+    message_id = 10
+
+
+class AttachingBot(RecordingBot):
+    async def send_message(self, chat_id, text, **kwargs):
+        return FakeMessage()
+
+    async def pin_chat_message(self, chat_id, message_id, **kwargs):
+        pass
+
+
+def test_attach_and_detach_are_announced_to_other_processes():
+    async def render():
+        return "dashboard", None
+
+    async def run():
+        here = LiveDashboard(AttachingBot(), render)
+        elsewhere = LiveDashboard(RecordingBot(), render)
+        here.listeners.append(elsewhere.set_remote)
+
+        await here.attach(1)
+        attached = elsewhere.active_for(1)
+        here.detach(1)
+        return attached, elsewhere.active_for(1)
+
+    assert asyncio.run(run()) == (True, False)
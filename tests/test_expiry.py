@@ -0,0 +1,38 @@
+import asyncio
+
+from conftest import app
+
+OLD = "2026-01-01T00:00:00+00:00"
+
+
+def tx(n: int, status: str, updated_at: str = None) -> dict:
+    row = {"tx_code": f"RKB2026101900060{n}", "buyer_id": 5400 + n, "buyer_username": "@b",
+           "seller_username": "@s", "item_description": "x", "price": "1000", "reference": "-", "status": status}
+    if updated_at:
+        row["updated_at"] = updated_at
+    return row
+
+
+def test_sweeper_cancels_stale_rows_in_batches_and_tells_each_buyer(fakes, monkeypatch):
+    db, session = fakes([])
+    db.seed("transactions", [
+        tx(1, "pending", OLD), tx(2, "pending", OLD), tx(3, "approved", OLD),
+        tx(4, "pending"), tx(5, "paid", OLD),
+    ])
+    monkeypatch.setattr(app, "EXPIRY_BATCH_SIZE", 2)
+    notified = []
+
+    async def spy(make_request, bot, method):
+        if type(method).__name__ == "SendMessage":
+            notified.append(method.chat_id)
+        return await make_request(bot, method)
+
+    session.middleware(spy)
+
+    assert asyncio.run(app.expire_stale_transactions()) == 3
+
+    status = {row["tx_code"][-1]: row["status"] for row in db.tables["transactions"]}
+    assert status == {"1": "cancelled", "2": "cancelled", "3": "cancelled", "4": "pending", "5": "paid"}
+    assert sorted(notified) == [5401, 5402, 5403]
+    assert [log["action"] for log in db.tables["transaction_logs"]] == ["cancelled"] * 3
+    assert app.cached_transaction("RKB20261019000601")["status"] == "cancelled"
@@ -0,0 +1,46 @@
+import asyncio
+import csv
+import gzip
+import json
+
+import export
+from fakes import FakeSupabase
+
+
+def logs(count: int) -> list:
+    # Runs of equal created_at straddle the page boundaries.
+    return [
+        {"id": f"{i:08d}-0000-0000-0000-000000000000", "transaction_id": "t", "action": "created",
+         "created_at": f"2026-10-19T10:00:0{i // 3}+00:00"}
+        for i in range(count)
+    ]
+
+
+def test_keyset_pages_export_every_row_once_in_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORTS_DIR", str(tmp_path))
+    db = FakeSupabase()
+    rows = logs(7)
+    db.seed("transaction_logs", reversed(rows))
+    seen = []
+
+    async def progress(count):
+        seen.append(count)
+
+    path, count = asyncio.run(export.export_table(db, "transaction_logs", "jsonl", progress, page_size=2))
+
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        exported = [json.loads(line)["id"] for line in fh]
+    assert count == 7 and seen == [2, 4, 6, 7]
+    assert exported == [row["id"] for row in rows]
+
+
+def test_csv_export_writes_one_header(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORTS_DIR", str(tmp_path))
+    db = FakeSupabase()
+    db.seed("transaction_logs", logs(4))
+
+    path, count = asyncio.run(export.export_table(db, "transaction_logs", "csv", page_size=3))
+
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as fh:
+        exported = list(csv.DictReader(fh))
+    assert count == 4 and [row["id"] for row in exported] == [row["id"] for row in logs(4)]
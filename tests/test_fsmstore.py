@@ -0,0 +1,60 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+import fsmstore
+from fsmstore import ExpiringMemoryStorage
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+def test_entries_expire_per_state_and_writes_rearm_the_deadline(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(fsmstore.time, "monotonic", lambda: clock[0])
+    storage = ExpiringMemoryStorage(timeouts={"Form:price": 60}, default_timeout=600)
+
+    async def fill():
+        await storage.set_state(key(1), "Form:price")
+        await storage.set_state(key(2), "Form:item")
+        await storage.set_data(key(3), {"bulk_selected": ["RKB1"]})
+
+    asyncio.run(fill())
+
+    assert storage.reap(1030) == []
+    assert [(k.user_id, state) for k, state, _ in storage.reap(1061)] == [(1, "Form:price")]
+
+    # A write halfway through restarts the clock; the stale heap item is skipped.
+    clock[0] = 1300.0
+    asyncio.run(storage.set_data(key(2), {"item": "akun"}))
+    assert storage.reap(1601) == [(key(3), None, {"bulk_selected": ["RKB1"]})]
+    assert storage.reap(1901) == [(key(2), "Form:item", {"item": "akun"})]
+    assert len(storage) == 0 and storage.stats()["expired"] == 3 and storage.stats()["states"] == {}
+
+
+def test_least_recently_used_entry_is_evicted_over_the_cap():
+    storage = ExpiringMemoryStorage(max_entries=2)
+
+    async def run():
+        await storage.set_state(key(1), "Form:item")
+        await storage.set_state(key(2), "Form:item")
+        await storage.get_state(key(1))
+        await storage.set_state(key(3), "Form:item")
+        return [await storage.get_state(key(user_id)) for user_id in (1, 2, 3)]
+
+    assert asyncio.run(run()) == ["Form:item", None, "Form:item"]
+    assert storage.stats()["evicted"] == 1 and storage.stats()["states"] == {"Form:item": 2}
+
+
+def test_reads_and_cleared_conversations_leave_nothing_behind():
+    storage = ExpiringMemoryStorage()
+
+    async def run():
+        assert await storage.get_data(key(1)) == {}
+        await storage.set_state(key(2), "Form:item")
+        await storage.set_state(key(2), None)
+        await storage.set_data(key(2), {})
+
+    asyncio.run(run())
+    assert len(storage) == 0
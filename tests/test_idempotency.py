@@ -0,0 +1,30 @@
+import asyncio
+
+from conftest import app, callback_update, feed
+from idempotency import IdempotencyMiddleware
+
+ADMINS = [{"id": 7000 + i, "is_bot": False, "first_name": "Admin", "username": f"admin{i}"} for i in (1, 2)]
+
+
+def test_concurrent_presses_on_one_transaction_are_dropped(fakes):
+    tx_code = "RKB20261019000201"
+    presses = [callback_update(admin, f"approve_{tx_code}") for admin in ADMINS]
+    db, _ = fakes([{"u": press, "a": True} for press in presses])
+    dropped = app.idempotency.dropped
+
+    asyncio.run(feed(*presses))
+
+    assert app.idempotency.dropped == dropped + 1
+    assert [log["action"] for log in db.tables["transaction_logs"]] == ["approved"]
+
+
+def test_saved_update_id_survives_a_restart(tmp_path):
+    path = str(tmp_path / "last_update_id.json")
+    before = IdempotencyMiddleware()
+    before.last_update_id = 1234
+    before.save(path)
+
+    after = IdempotencyMiddleware()
+    after.load(path)
+
+    assert after.floor == 1234
@@ -0,0 +1,69 @@
+import asyncio
+import random
+
+from conftest import app, callback_update, feed, message_update
+from proofs import HashIndex, hamming
+
+BUYER = {"id": 5101, "is_bot": False, "first_name": "Buyer", "username": "buyer_proof"}
+
+
+def indexed_codes() -> set:
+    return {code for _, code in app.proof_pipeline.index.search(0, 64)}
+
+
+def upload_proof(fakes, tx_code: str, status: str):
+    press = callback_update(BUYER, f"send_proof_{tx_code}")
+    db, session = fakes([{"u": press}])
+    db.seed("transactions", [{
+        "tx_code": tx_code,
+        "buyer_id": BUYER["id"],
+        "buyer_username": "@buyer_proof",
+        "seller_username": "@seller_proof",
+        "item_description": "Akun game",
+        "price": "150000",
+        "reference": "-",
+        "status": status,
+    }])
+    photo = message_update(BUYER, photo=[{"file_id": f"proof-{tx_code}", "file_unique_id": "p", "width": 8, "height": 8}])
+    asyncio.run(feed(press, photo))
+    return db, session
+
+
+def test_refused_upload_is_not_indexed(fakes):
+    upload_proof(fakes, "RKB20261019000301", "completed")
+
+    assert "RKB20261019000301" not in indexed_codes()
+
+
+def test_accepted_upload_is_indexed(fakes):
+    db, _ = upload_proof(fakes, "RKB20261019000302", "approved")
+
+    assert db.tables["transactions"][0]["status"] == "paid"
+    assert "RKB20261019000302" in indexed_codes()
+
+
+def test_admin_gets_the_thumbnail_and_the_original_on_request(fakes):
+    db, session = upload_proof(fakes, "RKB20261019000303", "approved")
+
+    assert session.calls["SendPhoto"] == 1 and session.calls["SendDocument"] == 0
+
+    admin = {"id": app.ADMIN_ID, "is_bot": False, "first_name": "Admin"}
+    asyncio.run(feed(callback_update(admin, "view_proof_RKB20261019000303")))
+    assert session.calls["SendDocument"] == 1
+
+def test_hash_index_matches_a_linear_scan():
+    rng = random.Random(7)
+    base = rng.getrandbits(64)
+    # Near-duplicates of one image plus unrelated hashes, and one exact repeat.
+    hashes = [base ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for _ in range(50)]
+    hashes += [rng.getrandbits(64) for _ in range(200)] + [base, base]
+    index = HashIndex()
+    for i, value in enumerate(hashes):
+        index.add(value, f"RKB{i:014d}")
+
+    for probe, max_distance in ((base, 4), (base, 0), (hashes[60], 10)):
+        expected = sorted(
+            (hamming(probe, value), f"RKB{i:014d}") for i, value in enumerate(hashes)
+            if hamming(probe, value) <= max_distance
+        )
+        assert index.search(probe, max_distance) == expected
@@ -0,0 +1,163 @@
+"""EXPLAIN-based regression check for the bot's production queries.
+
+Creates a scratch database on a local Postgres, applies every migration,
+seeds it with production-like volume, then runs each query the bot issues
+through EXPLAIN (ANALYZE, FORMAT JSON). A query fails when its plan does not
+use the index it was written for, sequentially scans a table it is expected
+to reach by index, or runs slower than its time budget. Skipped unless
+DATABASE_URL points at a Postgres superuser connection (needs `psycopg`).
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="DATABASE_URL is not set")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "supabase", "migrations")
+SCRATCH_DB = "rekber_query_plans"
+ACTIVE_STATUSES = ["pending", "approved", "paid", "delivered"]
+TRANSACTIONS = 200000
+USERS = 50000
+BUDGET_MS = 50.0
+
+SEED_SQL = """
+INSERT INTO users (id, username, full_name, is_admin)
+SELECT i, 'user' || i, 'User ' || i, i <= 3
+FROM generate_series(1, %(users)s) AS i;
+
+INSERT INTO payment_methods (type, name, account_number, account_name, is_active)
+SELECT CASE WHEN i %% 2 = 0 THEN 'bank' ELSE 'ewallet' END, 'PM' || i, '000' || i, 'Owner ' || i, i %% 4 <> 0
+FROM generate_series(1, 20) AS i;
+
+INSERT INTO transactions (tx_code, buyer_id, seller_id, buyer_username, seller_username,
+                          item_description, price, reference, status, proof_phash, created_at, updated_at)
+SELECT 'RKB' || lpad(i::text, 12, '0'),
+       1 + (i::bigint * 7919) %% %(users)s,
+       1 + (i::bigint * 104729) %% %(users)s,
+       '@user' || (1 + (i::bigint * 7919) %% %(users)s),
+       '@user' || (1 + (i::bigint * 104729) %% %(users)s),
+       'Item ' || i,
+       (10000 + i %% 990000)::text,
+       '-',
+       CASE WHEN i %% 100 < 2 THEN 'pending'
+            WHEN i %% 100 < 3 THEN 'approved'
+            WHEN i %% 100 < 4 THEN 'paid'
+            WHEN i %% 100 < 5 THEN 'delivered'
+            WHEN i %% 100 < 85 THEN 'completed'
+            WHEN i %% 100 < 95 THEN 'rejected'
+            ELSE 'cancelled' END,
+       CASE WHEN i %% 3 = 0 THEN lpad(to_hex(i), 16, '0') END,
+       ts,
+       ts + make_interval(hours => i %% 72)
+FROM (
+  SELECT i, now() - make_interval(secs => (%(transactions)s - i) * 60) AS ts
+  FROM generate_series(1, %(transactions)s) AS i
+) AS s;
+
+INSERT INTO transaction_logs (transaction_id, action, actor_id, notes, created_at)
+SELECT id, 'created', buyer_id, 'Transaction created', created_at FROM transactions
+UNION ALL
+SELECT id, status, buyer_id, 'Status change', updated_at FROM transactions;
+
+ANALYZE;
+"""
+
+NOW = datetime.now(timezone.utc)
+RECENT = (NOW - timedelta(hours=1)).isoformat()
+CUTOFF = (NOW - timedelta(hours=48)).isoformat()
+MIDDLE = (NOW - timedelta(days=30)).isoformat()
+WINDOW = (NOW - timedelta(days=7)).isoformat()
+NO_ID = "00000000-0000-0000-0000-000000000000"
+
+# (name, index the plan must use, table that must not be seq-scanned, sql, params)
+QUERIES = [
+    ("admin active list", "idx_transactions_active_created", "transactions",
+     "SELECT * FROM transactions WHERE status = ANY(%s) ORDER BY created_at DESC",
+     (ACTIVE_STATUSES,)),
+    ("user history", "idx_transactions_buyer_created", "transactions",
+     "SELECT * FROM transactions WHERE buyer_id = %s OR seller_id = %s ORDER BY created_at DESC LIMIT 10",
+     (4242, 4242)),
+    ("tx_code lookup", "transactions_tx_code_key", "transactions",
+     "SELECT * FROM transactions WHERE tx_code = %s",
+     ("RKB000000012345",)),
+    ("seller by username", "idx_users_username", "users",
+     "SELECT id FROM users WHERE username = %s",
+     ("user4242",)),
+    ("admin set", "idx_users_admin", "users",
+     "SELECT id FROM users WHERE is_admin = true",
+     ()),
+    # A handful of rows: Postgres rightly prefers a seq scan, so only check
+    # the partial index matches the query once seq scans are ruled out.
+    ("active payment methods", "idx_payment_methods_active", None,
+     "SELECT * FROM payment_methods WHERE is_active = true",
+     ()),
+    ("expiry sweep batch", "idx_transactions_status_updated", "transactions",
+     "SELECT id FROM transactions WHERE status = %s AND updated_at < %s ORDER BY updated_at LIMIT 200",
+     ("pending", CUTOFF)),
+    ("mirror catch-up", "idx_transactions_updated", "transactions",
+     "SELECT * FROM transactions WHERE updated_at >= %s ORDER BY updated_at LIMIT 1000",
+     (RECENT,)),
+    ("mirror load, active", "idx_transactions_active_created", "transactions",
+     "SELECT * FROM transactions WHERE status = ANY(%s) ORDER BY created_at, id LIMIT 1000",
+     (ACTIVE_STATUSES,)),
+    ("mirror load, window", "idx_transactions_updated", "transactions",
+     "SELECT * FROM transactions WHERE updated_at >= %s ORDER BY created_at, id LIMIT 1000",
+     (WINDOW,)),
+    ("export keyset page", "idx_transactions_created_id", "transactions",
+     "SELECT * FROM transactions WHERE created_at >= %s "
+     "AND (created_at > %s OR (created_at = %s AND id > %s)) ORDER BY created_at, id LIMIT 1000",
+     (MIDDLE, MIDDLE, MIDDLE, NO_ID)),
+    ("export logs keyset page", "idx_transaction_logs_created_id", "transaction_logs",
+     "SELECT * FROM transaction_logs WHERE created_at >= %s "
+     "AND (created_at > %s OR (created_at = %s AND id > %s)) ORDER BY created_at, id LIMIT 1000",
+     (MIDDLE, MIDDLE, MIDDLE, NO_ID)),
+    ("proof hash load", "idx_transactions_proof_phash", "transactions",
+     "SELECT tx_code, proof_phash FROM transactions WHERE proof_phash IS NOT NULL ORDER BY id LIMIT 1000",
+     ()),
+]
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from walk(child)
+
+
+@pytest.fixture(scope="module")
+def conn():
+    with psycopg.connect(DATABASE_URL, autocommit=True) as admin:
+        admin.execute(f"DROP DATABASE IF EXISTS {SCRATCH_DB}")
+        admin.execute(f"CREATE DATABASE {SCRATCH_DB}")
+        for role in ("anon", "authenticated", "service_role"):
+            if not admin.execute("SELECT 1 FROM pg_roles WHERE rolname = %s", (role,)).fetchone():
+                admin.execute(f"CREATE ROLE {role} NOLOGIN")
+
+    url = psycopg.conninfo.make_conninfo(DATABASE_URL, dbname=SCRATCH_DB)
+    with psycopg.connect(url, autocommit=True) as conn:
+        for name in sorted(os.listdir(MIGRATIONS_DIR)):
+            if name.endswith(".sql"):
+                with open(os.path.join(MIGRATIONS_DIR, name), encoding="utf-8") as fh:
+                    conn.execute(fh.read())
+        conn.execute(SEED_SQL % {"users": USERS, "transactions": TRANSACTIONS})
+        yield conn
+
+    with psycopg.connect(DATABASE_URL, autocommit=True) as admin:
+        admin.execute(f"DROP DATABASE IF EXISTS {SCRATCH_DB}")
+
+
+@pytest.mark.parametrize("name, index, table, sql, params", QUERIES, ids=[q[0] for q in QUERIES])
+def test_query_uses_its_index(conn, name, index, table, sql, params):
+    cursor = psycopg.ClientCursor(conn)
+    cursor.execute(f"SET enable_seqscan = {'on' if table else 'off'}")
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+    explain = cursor.fetchone()[0][0]
+    cursor.execute("RESET enable_seqscan")
+    nodes = list(walk(explain["Plan"]))
+
+    assert index in {n["Index Name"] for n in nodes if "Index Name" in n}
+    assert table not in [n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan"]
+    assert explain["Execution Time"] <= BUDGET_MS
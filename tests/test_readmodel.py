@@ -0,0 +1,40 @@
+import asyncio
+
+from conftest import app
+from readmodel import TransactionMirror
+
+
+def row(row_id: str, updated_at: str, status: str = "pending") -> dict:
+    return {"id": row_id, "tx_code": f"RKB{row_id:0>14}", "buyer_id": 1, "seller_id": 2,
+            "status": status, "created_at": updated_at, "updated_at": updated_at}
+
+
+def test_own_writes_do_not_move_the_catch_up_cursor():
+    mirror = TransactionMirror()
+    mirror.upsert_many([row("1", "2026-10-19T10:00:00+00:00")], advance_cursor=True)
+
+    # The bot's own write is newer than a change another writer made meanwhile.
+    mirror.upsert(row("2", "2026-10-19T10:05:00+00:00"))
+
+    assert mirror.cursor == "2026-10-19T10:00:00+00:00"
+
+
+def test_first_sync_reads_only_rows_the_mirror_keeps(fakes, monkeypatch):
+    db, _ = fakes([])
+    db.seed("transactions", [
+        row("old-done", "2026-01-01T00:00:00+00:00", "completed"),
+        row("old-open", "2026-01-01T00:00:00+00:00", "paid"),
+        row("new-done", "2099-01-01T00:00:00+00:00", "completed"),
+    ])
+    read = []
+
+    async def db_page(query):
+        result = await app.db_exec(query, idempotent=True)
+        read.extend(r["id"] for r in result.data)
+        return result
+
+    monkeypatch.setattr(app, "db_page", db_page)
+    asyncio.run(app.sync_tx_mirror(page_size=1))
+
+    assert "old-done" not in read
+    assert sorted(app.tx_mirror._by_id) == ["new-done", "old-open"]
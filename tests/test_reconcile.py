@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from reconcile import PaymentIndex, parse_amount, parse_timestamp, read_mutations, reconcile
+
+
+@pytest.mark.parametrize("text, amount", [
+    ("Rp 25.000", 25000),
+    ("Rp. 25.000", 25000),
+    ("Rp.25.000", 25000),
+    ("IDR 1,500,000.00", 1500000),
+    ("1.500.000,00", 1500000),
+    ("150rb", 150000),
+    ("1,5jt", 1500000),
+    ("(25.000)", -25000),
+    ("nego", None),
+])
+def test_parse_amount(text, amount):
+    assert parse_amount(text) == amount
+
+
+def test_unpriced_transactions_are_reported_apart_from_unpaid():
+    paid_at = datetime(2026, 10, 19, 3, 0, tzinfo=timezone.utc).isoformat()
+    txs = [
+        {"tx_code": "RKB20261019000001", "price": "Rp. 25.000", "updated_at": paid_at},
+        {"tx_code": "RKB20261019000002", "price": "nego", "updated_at": paid_at},
+    ]
+    lines = ["Tanggal,Keterangan,Jumlah", '19/10/2026 09:55,TRSF CR,"25.000,00 CR"']
+
+    result = reconcile(read_mutations(lines), PaymentIndex(txs))
+
+    assert [tx["tx_code"] for _, tx in result["matched"]] == ["RKB20261019000001"]
+    assert [tx["tx_code"] for tx in result["unpriced"]] == ["RKB20261019000002"]
+    assert result["unpaid"] == []
+
+
+@pytest.mark.parametrize("value", [
+    "2026-10-19T03:00:00.12345+00:00",
+    "2026-10-19T03:00:00.123450Z",
+    "2026-10-19T10:00:00.1234509+07",
+    "2026-10-19 10:00:00.12345+07:00",
+])
+def test_parse_timestamp_accepts_postgres_output(value):
+    assert parse_timestamp(value) == datetime(2026, 10, 19, 3, 0, 0, 123450, tzinfo=timezone.utc)
@@ -0,0 +1,40 @@
+from conftest import callback_update, message_update
+from recorder import Anonymizer
+
+USER = {"id": 5501, "is_bot": False, "first_name": "Budi", "last_name": "Santoso", "username": "Budi_Seller"}
+
+
+def test_scrub_pseudonymizes_people_and_masks_text():
+    anonymizer = Anonymizer(b"salt")
+    update = message_update(
+        USER,
+        text="Seller: @budi_seller\nHarga: Rp 150.000\nAkun game level 80",
+        entities=[{"type": "mention", "offset": 8, "length": 12}],
+        photo=[{"file_id": "AgACAgQ", "file_unique_id": "AQAD", "width": 8, "height": 8}],
+    )
+
+    message = anonymizer.scrub(update)["message"]
+
+    pseudonym = anonymizer.user_id(USER["id"])
+    assert pseudonym != USER["id"]
+    assert message["from"]["id"] == message["chat"]["id"] == pseudonym
+    assert message["from"]["username"] == anonymizer.username("budi_seller")
+    assert message["from"]["first_name"] == "xxxx" and message["from"]["last_name"] == "xxxxxxx"
+    # Labels survive, mentions line up with the username pseudonym, the rest keeps its shape.
+    assert message["text"] == f"Seller: @{anonymizer.username('budi_seller')}\nHarga: xx 999.999\nxxxx xxxx xxxxx 99"
+    assert "entities" not in message
+    assert message["photo"][0]["file_id"] != "AgACAgQ" and message["photo"][0]["width"] == 8
+
+
+def test_commands_and_callback_data_stay_replayable():
+    anonymizer = Anonymizer(b"salt")
+
+    assert anonymizer.text("/bulk approve Budi") == "/bulk xxxxxxx xxxx"
+    press = anonymizer.scrub(callback_update(USER, "approve_RKB20261019000101"))["callback_query"]
+    assert press["data"] == "approve_RKB20261019000101"
+    assert press["from"]["id"] == anonymizer.user_id(USER["id"])
+
+
+def test_pseudonyms_depend_on_the_salt():
+    assert Anonymizer(b"a").user_id(USER["id"]) != Anonymizer(b"b").user_id(USER["id"])
+    assert Anonymizer(b"a").user_id(-1001) < 0
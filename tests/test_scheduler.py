@@ -0,0 +1,62 @@
+import asyncio
+
+from conftest import callback_update, feed, message_update
+from scheduler import LaneScheduler
+
+BUYER = {"id": 5001, "is_bot": False, "first_name": "Buyer", "username": "buyer_test"}
+
+
+def test_proof_right_after_send_proof_press(fakes):
+    tx_code = "RKB20261019000001"
+    press = callback_update(BUYER, f"send_proof_{tx_code}")
+    db, session = fakes([{"u": press}])
+    db.seed("transactions", [{
+        "tx_code": tx_code,
+        "buyer_id": BUYER["id"],
+        "buyer_username": "@buyer_test",
+        "seller_username": "@seller_test",
+        "item_description": "Akun game",
+        "price": "150000",
+        "reference": "-",
+        "status": "approved",
+    }])
+    photo = message_update(BUYER, photo=[{"file_id": "proof-file", "file_unique_id": "proof", "width": 8, "height": 8}])
+
+    asyncio.run(feed(press, photo))
+
+    assert session.calls["GetFile"] == 1
+    assert db.tables["transactions"][0]["status"] == "paid"
+
+
+def test_format_right_after_new_transaction_press(fakes):
+    user = {**BUYER, "id": 5002, "username": "buyer_format"}
+    press = callback_update(user, "new_transaction")
+    db, _ = fakes([{"u": press}])
+    form = message_update(user, text=(
+        "Username Seller: @seller_test\n"
+        "Username Buyer: @buyer_format\n"
+        "Jenis Barang: Akun game\n"
+        "Harga: 150000\n"
+        "Referensi: -"
+    ))
+
+    asyncio.run(feed(press, form))
+
+    assert [tx["item_description"] for tx in db.tables["transactions"]] == ["Akun game"]
+
+
+def test_full_lane_is_refused_without_blocking_others():
+    async def run():
+        scheduler = LaneScheduler(max_concurrency=4, max_pending=100, max_lane_pending=2)
+        release = asyncio.Event()
+        accepted = [await scheduler.submit(["user:1"], release.wait) for _ in range(3)]
+        other = await scheduler.submit(["user:2"], release.wait)
+        release.set()
+        await scheduler.drain()
+        return accepted, other, scheduler.stats()
+
+    accepted, other, stats = asyncio.run(run())
+
+    assert accepted == [True, True, False]
+    assert other is True
+    assert stats["refused"] == 1 and stats["completed"] == 3
@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from sharding import ShardRouter, encode, shard_for
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.messages = []
+
+    def write(self, line: bytes):
+        self.messages.append(json.loads(line))
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    async def drain(self):
+        pass
+
+
+def test_dashboard_state_reaches_other_and_restarted_workers():
+    async def run():
+        router = ShardRouter(3)
+        router._writers = [RecordingWriter() for _ in range(3)]
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode({"dashboard": [42, True]}))
+        reader.feed_eof()
+        await router._read(0, reader)
+
+        # Worker 2 restarts and announces itself ready.
+        router._writers[2] = RecordingWriter()
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode({"ready": 2}))
+        reader.feed_eof()
+        await router._read(2, reader)
+        return router._writers
+
+    writers = asyncio.run(run())
+
+    assert writers[0].messages == []
+    assert writers[1].messages == [{"dashboard": [42, True]}]
+    assert writers[2].messages == [{"dashboard": [42, True]}]
+
+
+def test_updates_for_a_restarting_worker_are_held_until_it_is_ready():
+    updates = [{"update_id": i, "message": {"from": {"id": 6000 + i}}} for i in range(40)]
+    down = [u for u in updates if shard_for(u, 2) == 1][:3]
+
+    async def run():
+        router = ShardRouter(2)
+        for event in router._ready:
+            event.set()
+        # Worker 1 died: _supervise clears its ready flag and writer.
+        router._ready[1].clear()
+        router._writers = [RecordingWriter(), None]
+        for update in down[:2]:
+            await router.dispatch(update)
+
+        router._writers[1] = RecordingWriter()
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode({"ready": 1}))
+        reader.feed_eof()
+        await router._read(1, reader)
+        await router.dispatch(down[2])
+        return router
+
+    router = asyncio.run(run())
+
+    assert router._writers[1].messages == [{"update": update} for update in down]
+    assert router._pending[1] == [] and router.routed[1] == 3
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_reads_of_one_key_share_a_call():
+    calls = []
+
+    async def read(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return {"key": key}
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do(key, lambda key=key: read(key)) for key in "aaab"))
+        # Done: the next read for the same key is a fresh call.
+        await flight.do("a", lambda: read("a"))
+        return flight, results
+
+    flight, results = asyncio.run(run())
+    assert calls == ["a", "b", "a"]
+    assert results[0] is results[1] is results[2]
+    assert flight.coalesced == 2 and flight.stats()["inflight"] == 0
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_read():
+    async def run():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def read():
+            started.set()
+            await asyncio.sleep(0.01)
+            return "row"
+
+        first = asyncio.ensure_future(flight.do("k", read))
+        await started.wait()
+        second = asyncio.ensure_future(flight.do("k", read))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "row"
@@ -0,0 +1,44 @@
+import pytest
+from aiogram.types import InlineKeyboardButton
+from pydantic import ValidationError
+
+from templates import Markup, Template, render_list, static_keyboard
+
+
+def test_fields_are_escaped_unless_markup():
+    template = Template("<b>{item}</b> {note} {count}")
+
+    text = template.render(item="Akun <VIP> & item", note=Markup("<i>ok</i>"), count=3)
+
+    assert text == "<b>Akun &lt;VIP&gt; &amp; item</b> <i>ok</i> 3"
+    assert isinstance(text, Markup)
+
+
+def test_truncation_happens_before_escaping():
+    template = Template("{item:.6}|{price:,}")
+
+    # Cutting after escaping could leave half an entity such as "&am".
+    assert template.fill({"item": "ab&cdefgh", "price": 1500000}) == "ab&amp;cde|1,500,000"
+    assert template.fill({"item": Markup("<b>bold</b>"), "price": 1}) == "&lt;b&gt;bol|1"
+
+
+def test_render_list_joins_escaped_rows():
+    item = Template("• {name}\n")
+
+    assert render_list(item, [{"name": "A&B"}, {"name": "<C>"}]) == "• A&amp;B\n• &lt;C&gt;\n"
+
+
+@pytest.mark.parametrize("source", ["{0}", "{tx.code}", "{name!r}"])
+def test_unsupported_fields_are_rejected(source):
+    with pytest.raises(ValueError):
+        Template(source)
+
+
+def test_static_keyboard_cannot_be_reassigned():
+    keyboard = static_keyboard([InlineKeyboardButton(text="Menu", callback_data="main_menu")])
+
+    with pytest.raises(ValidationError):
+        keyboard.inline_keyboard = []
+    assert keyboard.model_dump(exclude_none=True) == {
+        "inline_keyboard": [[{"text": "Menu", "callback_data": "main_menu"}]]
+    }
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+from aiogram.types import Update
+
+from conftest import callback_update, message_update
+from tracing import Tracer, describe_update
+
+USER = {"id": 7301, "is_bot": False, "first_name": "Tracer"}
+
+
+@pytest.mark.parametrize("update, name", [
+    (callback_update(USER, "approve_RKB20261019000101"), "callback approve_"),
+    (callback_update(USER, "admin_panel"), "callback admin_panel"),
+    (message_update(USER, text="/bulk approve toko"), "message /bulk"),
+    (message_update(USER, text="halo"), "message text"),
+    (message_update(USER, photo=[{"file_id": "p", "file_unique_id": "p", "width": 1, "height": 1}]), "message photo"),
+])
+def test_span_names_group_updates_by_action(update, name):
+    assert describe_update(Update.model_validate(update)) == name
+
+
+def test_slow_update_is_logged_with_its_span_tree(tmp_path):
+    path = tmp_path / "slow.jsonl"
+    tracer = Tracer("test", slow_ms=0, sample_rate=1.0, slow_log_path=str(path))
+
+    with tracer.trace("update message /start"):
+        with tracer.span("supabase GET /users"):
+            pass
+
+    spans = json.loads(path.read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [span["name"] for span in spans] == ["update message /start", "supabase GET /users"]
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
@@ -0,0 +1,35 @@
+import asyncio
+
+from conftest import app
+
+TX = {
+    "tx_code": "RKB20261019000101",
+    "buyer_id": 6001,
+    "buyer_username": "@buyer_tx",
+    "seller_username": "@seller_tx",
+    "item_description": "Akun game",
+    "price": "150000",
+    "reference": "-",
+}
+
+
+def test_stale_cached_status_does_not_refuse_a_transition(fakes):
+    db, _ = fakes([])
+    db.seed("transactions", [{**TX, "status": "approved"}])
+    # Another process approved it after this one cached it as pending.
+    app.tx_cache.put({**db.tables["transactions"][0], "status": "pending", "updated_at": ""})
+
+    tx, current = asyncio.run(app.transition_transaction(TX["tx_code"], "paid"))
+
+    assert tx is not None and tx["status"] == "paid"
+    assert app.cached_transaction(TX["tx_code"])["status"] == "paid"
+
+
+def test_refusal_stands_when_the_database_agrees(fakes):
+    db, _ = fakes([])
+    db.seed("transactions", [{**TX, "status": "completed"}])
+    app.tx_cache.put(dict(db.tables["transactions"][0]))
+
+    tx, current = asyncio.run(app.transition_transaction(TX["tx_code"], "paid"))
+
+    assert tx is None and current["status"] == "completed"
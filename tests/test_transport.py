@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+
+from transport import CircuitBreaker, DatabaseUnavailableError, DbTransport
+
+
+def failing(code):
+    def call():
+        raise APIError({"message": "boom", "code": code})
+    return call
+
+
+@pytest.mark.parametrize("code, server_side", [
+    (503, True),
+    ("PGRST001", True),
+    ("57014", True),
+    ("23505", False),
+    ("PGRST116", False),
+])
+def test_only_server_errors_count_against_the_breaker(code, server_side):
+    transport = DbTransport(max_connections=1, read_retries=0)
+    transport.breaker.failures = 2
+
+    with pytest.raises(DatabaseUnavailableError if server_side else APIError):
+        asyncio.run(transport.run(failing(code), idempotent=True))
+
+    assert transport.breaker.failures == (3 if server_side else 0)
+    transport.shutdown()
+
+
+def test_timed_out_call_keeps_its_slot_until_the_thread_returns():
+    async def run():
+        transport = DbTransport(max_connections=1, deadline=0.05, read_retries=0)
+        with pytest.raises(DatabaseUnavailableError):
+            await transport.run(lambda: time.sleep(0.3))
+        abandoned = transport.in_flight
+        await asyncio.sleep(0.4)
+        transport.shutdown()
+        return abandoned, transport.in_flight
+
+    assert asyncio.run(run()) == (1, 0)
+
+
+def test_maybe_single_hides_a_5xx_that_still_opens_the_breaker():
+    from postgrest import SyncPostgrestClient
+
+    unavailable = httpx.MockTransport(lambda request: httpx.Response(503, json={"message": "upstream down"}))
+    client = SyncPostgrestClient("http://postgrest.test")
+    client.session = httpx.Client(base_url="http://postgrest.test", transport=unavailable)
+    query = client.from_("banned_users").select("*").eq("user_id", 1).maybe_single()
+
+    transport = DbTransport(max_connections=1, read_retries=0, breaker=CircuitBreaker(failure_threshold=1))
+    with pytest.raises(DatabaseUnavailableError):
+        asyncio.run(transport.run(query.execute, idempotent=True))
+
+    assert transport.breaker.state == "open"
+    transport.shutdown()
@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import Update
+
+log = logging.getLogger(__name__)
+
+_current_span: ContextVar = ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent", "start_ns", "end_ns", "attributes", "children", "error")
+
+    def __init__(self, name: str, trace_id: str, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent = parent
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.children = []
+        self.error = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1 if self.parent is None else 3,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent is not None:
+            span["parentSpanId"] = self.parent.span_id
+        return span
+
+    def render(self, depth: int = 0) -> str:
+        attrs = " ".join(f"{k}={v}" for k, v in self.attributes.items())
+        line = f"{'  ' * depth}{self.name} {self.duration_ms:.1f}ms {attrs}".rstrip()
+        if self.error:
+            line += f" ERROR={self.error}"
+        return "\n".join([line] + [child.render(depth + 1) for child in self.children])
+
+
+class Tracer:
+    """Span-per-update tracing with slow-update capture.
+
+    A fraction `sample_rate` of updates record child spans. Any update slower
+    than `slow_ms` is written to `slow_log_path` as one OTLP/JSON line: with
+    its full span tree if it was sampled, otherwise just the root span.
+    """
+
+    def __init__(self, service: str, slow_ms: float = 2000, sample_rate: float = 0.1, slow_log_path: str = None):
+        self.service = service
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.slow_log_path = slow_log_path
+        self.traces = 0
+        self.slow = 0
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        root = Span(name, f"{random.getrandbits(128):032x}", attributes=attributes)
+        sampled = random.random() < self.sample_rate
+        token = _current_span.set(root if sampled else None)
+        self.traces += 1
+        try:
+            yield root
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            root.end_ns = time.time_ns()
+            if root.duration_ms >= self.slow_ms:
+                self.slow += 1
+                self._dump_slow(root, sampled)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        parent = _current_span.get()
+        if parent is None or parent.end_ns is not None:
+            yield None
+            return
+        span = Span(name, parent.trace_id, parent=parent, attributes=attributes)
+        parent.children.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+
+    def to_otlp(self, root: Span) -> dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service}}]},
+                "scopeSpans": [{
+                    "scope": {"name": self.service},
+                    "spans": [span.to_otlp() for span in root.walk()],
+                }],
+            }]
+        }
+
+    def _dump_slow(self, root: Span, sampled: bool):
+        if not sampled:
+            root.children = []
+        log.warning(f"Slow update ({root.duration_ms:.0f} ms):\n{root.render()}")
+        if not self.slow_log_path:
+            return
+        try:
+            directory = os.path.dirname(self.slow_log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.slow_log_path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(self.to_otlp(root), separators=(",", ":")) + "\n")
+        except OSError as e:
+            log.error(f"Failed to write slow trace: {e}")
+
+    def stats(self) -> dict:
+        return {"traces": self.traces, "slow": self.slow}
+
+
+def describe_update(event: Update) -> str:
+    if event.callback_query is not None:
+        data = event.callback_query.data or ""
+        # Strip the tx_code so spans group by action.
+        return f"callback {data.rstrip('0123456789').removesuffix('RKB') or data}"
+    if event.message is not None:
+        text = event.message.text or ""
+        if text.startswith("/"):
+            return f"message {text.split()[0]}"
+        return f"message {event.message.content_type.value}"
+    return event.event_type
+
+
+class TracingMiddleware(BaseMiddleware):
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        with self.tracer.trace(
+            f"update {describe_update(event)}",
+            update_id=event.update_id,
+            user_id=user.id if user else None,
+        ):
+            return await handler(event, data)
+
+
+class TelegramTracingMiddleware(BaseRequestMiddleware):
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    async def __call__(self, make_request, bot, method):
+        with self.tracer.span(f"telegram {method.__api_method__}"):
+            return await make_request(bot, method)
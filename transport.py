@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from postgrest.exceptions import APIError
+
+log = logging.getLogger(__name__)
+
+# PostgREST's own codes for a database it can't reach or that timed out,
+# and the SQLSTATE classes of server-side trouble: connection, resources,
+# shutdown / statement timeout, system and internal errors.
+SERVER_ERROR_CODES = ("PGRST000", "PGRST001", "PGRST002", "PGRST003")
+SERVER_SQLSTATE_CLASSES = ("08", "53", "57", "58", "XX")
+# maybe_single() swallows whatever error the request raised (other than
+# "0 rows") and re-raises this placeholder instead, so the original status
+# is lost. Anything reaching it failed, so count it as the server's fault.
+MISSING_RESPONSE = ("204", "Missing response")
+
+
+class DatabaseUnavailableError(Exception):
+    pass
+
+
+class CircuitOpenError(DatabaseUnavailableError):
+    pass
+
+
+def is_server_error(error: APIError) -> bool:
+    """Whether a PostgREST error is the server's fault (5xx) rather than the request's."""
+    code = str(error.code or "")
+    if (code, error.message) == MISSING_RESPONSE:
+        return True
+    if len(code) == 3 and code.isdigit():
+        # No JSON body (e.g. a gateway error page): the code is the HTTP status.
+        return int(code) >= 500
+    return code in SERVER_ERROR_CODES or (len(code) == 5 and code[:2] in SERVER_SQLSTATE_CLASSES)
+
+
+class CircuitBreaker:
+    """Fail fast after `failure_threshold` consecutive failures.
+
+    Once open, calls are rejected until `reset_timeout` has passed; the next
+    call is then let through as a probe and closes the circuit on success.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def check(self):
+        state = self.state
+        if state == "open":
+            self.rejected += 1
+            raise CircuitOpenError("Supabase circuit is open")
+        if state == "half_open":
+            # Let this call through as the probe and hold the rest back until it settles.
+            self.opened_at = time.monotonic()
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is None and self.failures >= self.failure_threshold:
+            log.warning(f"Circuit opened after {self.failures} consecutive failure(s)")
+            self.opened_at = time.monotonic()
+        elif self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+class DbTransport:
+    """Run blocking Supabase calls on a dedicated pool with deadlines and a circuit breaker.
+
+    The worker pool is sized to the HTTP connection pool, so a call never
+    waits on a connection inside a thread. Idempotent reads are retried with
+    jittered exponential backoff; writes are attempted once. Timeouts,
+    transport errors and 5xx PostgREST errors count against the breaker.
+    A call that misses its deadline keeps its worker thread until it
+    returns, so it stays in `in_flight` until then.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        deadline: float = 8.0,
+        read_retries: int = 2,
+        backoff: float = 0.2,
+        breaker: CircuitBreaker = None,
+    ):
+        self.max_connections = max_connections
+        self.deadline = deadline
+        self.read_retries = read_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._executor = ThreadPoolExecutor(max_connections, thread_name_prefix="supabase")
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=60.0,
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.deadline, connect=min(self.deadline, 3.0))
+
+    async def run(self, fn, idempotent: bool = False, deadline: float = None):
+        self.breaker.check()
+        attempts = 1 + (self.read_retries if idempotent else 0)
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(attempts):
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            future = loop.run_in_executor(self._executor, fn)
+            future.add_done_callback(self._finished)
+            try:
+                # Shielded: a timeout abandons the call, it can't stop the thread.
+                result = await asyncio.wait_for(asyncio.shield(future), deadline or self.deadline)
+            except APIError as e:
+                if not is_server_error(e):
+                    self.breaker.record_success()
+                    raise
+                error = e
+            except (asyncio.TimeoutError, httpx.TransportError) as e:
+                error = e
+            else:
+                self.breaker.record_success()
+                return result
+
+            self.failures += 1
+            self.breaker.record_failure()
+            if attempt + 1 >= attempts or self.breaker.state == "open":
+                raise DatabaseUnavailableError(f"Supabase call failed: {type(error).__name__}") from error
+            self.retries += 1
+            delay = self.backoff * (2 ** attempt)
+            log.warning(f"Supabase call failed ({type(error).__name__}), retrying in ~{delay:.2f}s")
+            await asyncio.sleep(random.uniform(0, delay))
+
+    def _finished(self, future: asyncio.Future):
+        self.in_flight -= 1
+        if not future.cancelled():
+            # Retrieve the outcome so an abandoned call's error isn't logged as never retrieved.
+            future.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "pool_size": self.max_connections,
+            "utilization": self.in_flight / self.max_connections,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "breaker": self.breaker.state,
+            "rejected": self.breaker.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def install_postgrest_pool(client, transport: DbTransport):
+    """Replace the PostgREST session of a supabase client with a tuned keep-alive pool."""
+    postgrest = client.postgrest
+    old = postgrest.session
+    postgrest.session = type(old)(
+        base_url=old.base_url,
+        headers=old.headers,
+        timeout=transport.timeout(),
+        limits=transport.limits(),
+    )
+    old.close()
+
+
+class InFlightCounter(BaseRequestMiddleware):
+    def __init__(self):
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def __call__(self, make_request, bot, method):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await make_request(bot, method)
+        finally:
+            self.in_flight -= 1
+
+
+class PooledAiohttpSession(AiohttpSession):
+    """aiogram session with an explicit keep-alive pool size and in-flight counter."""
+
+    def __init__(self, limit: int = 100, keepalive_timeout: float = 60.0, **kwargs):
+        super().__init__(**kwargs)
+        self.limit = limit
+        self._connector_init.update(limit=limit, keepalive_timeout=keepalive_timeout)
+        self.counter = InFlightCounter()
+        self.middleware(self.counter)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.counter.in_flight,
+            "peak_in_flight": self.counter.peak_in_flight,
+            "pool_size": self.limit,
+        }